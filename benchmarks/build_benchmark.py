@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2019, NVIDIA CORPORATION. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Build, trace and reload time of an uninstrumented model, a model
+instrumented with NVTXStart/NVTXEnd pairs and one with NVTXWrap layers.
+
+Usage: python benchmarks/build_benchmark.py [--blocks N] [--repeat N]
+"""
+
+import argparse
+import os
+import timeit
+
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
+
+import tensorflow as tf
+
+from tensorflow.keras.layers import Dense
+from tensorflow.keras.layers import Input
+from tensorflow.keras.models import Model
+
+from nvtx.plugins.tf.keras.layers import NVTXEnd
+from nvtx.plugins.tf.keras.layers import NVTXStart
+from nvtx.plugins.tf.keras.layers import NVTXWrap
+
+
+def create_model(num_blocks, instrumentation):
+    inputs = Input((256,))
+    x = inputs
+    for idx in range(num_blocks):
+        dense = Dense(256, activation='relu', name='dense_%d' % idx)
+        if instrumentation == 'start_end':
+            x, marker_id, domain_id = NVTXStart(domain_name='forward')(x)
+            x = dense(x)
+            x = NVTXEnd()([x, marker_id, domain_id])
+        elif instrumentation == 'wrap':
+            x = NVTXWrap(dense, domain_name='forward')(x)
+        else:
+            x = dense(x)
+    return Model(inputs=inputs, outputs=x)
+
+
+def trace(model):
+    tf.function(model).get_concrete_function(
+        tf.TensorSpec((None, 256), tf.float32))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--blocks', type=int, default=64)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print('%-12s %12s %12s %12s' % ('model', 'build (s)', 'trace (s)',
+                                    'reload (s)'))
+    for instrumentation in ('none', 'start_end', 'wrap'):
+        model = create_model(args.blocks, instrumentation)
+        config = model.to_json()
+
+        build = min(timeit.repeat(
+            lambda: create_model(args.blocks, instrumentation),
+            number=1, repeat=args.repeat))
+        traced = min(timeit.repeat(lambda: trace(model), number=1,
+                                   repeat=args.repeat))
+        reload = min(timeit.repeat(
+            lambda: tf.keras.models.model_from_json(config),
+            number=1, repeat=args.repeat))
+        print('%-12s %12.3f %12.3f %12.3f' % (instrumentation, build, traced,
+                                              reload))
+
+
+if __name__ == '__main__':
+    main()
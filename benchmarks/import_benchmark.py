@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2019, NVIDIA CORPORATION. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Startup cost of importing nvtx.plugins.tf in a fresh interpreter.
+
+Usage: python benchmarks/import_benchmark.py [--repeat N]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+STATEMENTS = [
+    ('python', 'pass'),
+    ('import tensorflow', 'import tensorflow'),
+    ('import nvtx.plugins.tf', 'import nvtx.plugins.tf'),
+    ('nvtx.plugins.tf.range',
+     'import nvtx.plugins.tf as nvtx_tf; nvtx_tf.range'),
+    ('nvtx.plugins.tf.ops',
+     'import nvtx.plugins.tf as nvtx_tf; nvtx_tf.ops'),
+    ('nvtx.plugins.tf.estimator',
+     'import nvtx.plugins.tf as nvtx_tf; nvtx_tf.estimator'),
+]
+
+
+def time_statement(statement, repeat):
+    env = dict(os.environ, TF_CPP_MIN_LOG_LEVEL='3')
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.check_call([sys.executable, '-c', statement], env=env)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print('%-28s %12s' % ('statement', 'ms'))
+    for name, statement in STATEMENTS:
+        elapsed = time_statement(statement, args.repeat)
+        print('%-28s %12.1f' % (name, elapsed * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2019, NVIDIA CORPORATION. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Cost of NVTX ranges opened with ops.start / ops.end and with ops.push /
+ops.pop in a tf.function.
+
+Usage: python benchmarks/push_pop_benchmark.py [--iterations N] [--ranges N]
+"""
+
+import argparse
+import os
+import timeit
+
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
+
+import tensorflow as tf
+import nvtx.plugins.tf as nvtx_tf
+
+from nvtx.plugins.tf.strip import NVTX_OP_TYPES
+
+
+def create_function(num_ranges, open_range, close_range):
+    @tf.function
+    def func(x):
+        for idx in range(num_ranges):
+            x, nvtx_context = open_range(x, message='range %d' % idx,
+                                         domain_name='Benchmark')
+            x = x + 1.
+            x = close_range(x, nvtx_context)
+        return x
+    return func
+
+
+def count_output_tensors(concrete_function):
+    """Returns the number of NVTX ops and of the output tensors they produce
+    per run besides the forwarded input, e.g. the marker ids. This counts
+    tensors, not the memory allocations of the runtime."""
+    nvtx_ops = [op for op in concrete_function.graph.get_operations()
+                if op.type in NVTX_OP_TYPES]
+    return len(nvtx_ops), sum(len(op.outputs) - 1 for op in nvtx_ops)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=10000)
+    parser.add_argument('--ranges', type=int, default=16)
+    args = parser.parse_args()
+
+    x = tf.ones((8,))
+
+    benchmarks = [
+        ('no ranges', create_function(
+            args.ranges, lambda x, **kwargs: (x, None),
+            lambda x, nvtx_context: x)),
+        ('ops.start / ops.end', create_function(
+            args.ranges, nvtx_tf.ops.start, nvtx_tf.ops.end)),
+        ('ops.push / ops.pop', create_function(
+            args.ranges, nvtx_tf.ops.push, nvtx_tf.ops.pop)),
+    ]
+
+    print('%-22s %10s %14s %14s' % ('benchmark', 'nvtx ops',
+                                    'output tensors', 'us / range'))
+    for name, func in benchmarks:
+        concrete_function = func.get_concrete_function(x)
+        num_ops, output_tensors = count_output_tensors(concrete_function)
+
+        func(x).numpy()  # warmup
+
+        def run():
+            func(x).numpy()
+
+        elapsed = min(timeit.repeat(run, number=args.iterations, repeat=3))
+        print('%-22s %10d %14d %14.3f' % (
+            name, num_ops, output_tensors,
+            elapsed / args.iterations / args.ranges * 1e6))
+
+
+if __name__ == '__main__':
+    main()
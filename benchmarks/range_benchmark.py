@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2019, NVIDIA CORPORATION. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Per-range cost of NVTX ranges in an eager loop.
+
+Usage: python benchmarks/range_benchmark.py [--iterations N]
+"""
+
+import argparse
+import os
+import timeit
+
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
+
+import tensorflow as tf
+import nvtx.plugins.tf as nvtx_tf
+from nvtx.plugins.tf.native import get_libnvtx
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=100000)
+    args = parser.parse_args()
+
+    libnvtx = get_libnvtx()
+    domain_handle = libnvtx.domain('Benchmark')
+    x = tf.ones((8,))
+
+    # The NVTX C API through ctypes, without the NvtxLibrary wrapper
+    lib = getattr(libnvtx, 'lib', None)
+    attributes = libnvtx.event_attributes('range') if lib else None
+
+    def raw_c_call():
+        lib.nvtxDomainRangePushEx(domain_handle, attributes)
+        lib.nvtxDomainRangePop(domain_handle)
+
+    nvtx_range = nvtx_tf.range('range', domain_name='Benchmark')
+
+    def context_manager():
+        with nvtx_range:
+            pass
+
+    @nvtx_tf.range('range', domain_name='Benchmark')
+    def decorated():
+        pass
+
+    def graph_ops():
+        y, nvtx_context = nvtx_tf.ops.start(x, message='range',
+                                            domain_name='Benchmark')
+        nvtx_tf.ops.end(y, nvtx_context)
+
+    def empty_loop():
+        pass
+
+    benchmarks = [('empty loop', empty_loop)]
+    if lib is not None:
+        benchmarks.append(('raw C call (ctypes)', raw_c_call))
+    benchmarks += [
+        ('nvtx_tf.range context manager', context_manager),
+        ('nvtx_tf.range decorator', decorated),
+        ('nvtx_tf.ops.start / end', graph_ops),
+    ]
+
+    print('%-32s %12s' % ('benchmark', 'us / range'))
+    for name, func in benchmarks:
+        func()  # warmup
+        elapsed = min(timeit.repeat(func, number=args.iterations, repeat=3))
+        print('%-32s %12.3f' % (name, elapsed / args.iterations * 1e6))
+
+
+if __name__ == '__main__':
+    main()
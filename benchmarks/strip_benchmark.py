@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2019, NVIDIA CORPORATION. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Inference throughput of an uninstrumented, an instrumented and a stripped
+model.
+
+Usage: python benchmarks/strip_benchmark.py [--iterations N] [--batch-size N]
+"""
+
+import argparse
+import os
+import tempfile
+import timeit
+
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
+
+import tensorflow as tf
+
+from tensorflow.keras.layers import Dense
+from tensorflow.keras.layers import Input
+from tensorflow.keras.models import Model
+
+from nvtx.plugins.tf.keras.layers import NVTXEnd
+from nvtx.plugins.tf.keras.layers import NVTXStart
+from nvtx.plugins.tf.strip import strip_model
+from nvtx.plugins.tf.strip import strip_saved_model
+
+NUM_BLOCKS = 8
+
+
+def create_model(instrumented):
+    inputs = Input((256,))
+    x = inputs
+    for idx in range(NUM_BLOCKS):
+        if instrumented:
+            x, marker_id, domain_id = NVTXStart(
+                message='Dense %d' % idx, domain_name='forward')(x)
+        x = Dense(256, activation='relu')(x)
+        if instrumented:
+            x = NVTXEnd()([x, marker_id, domain_id])
+    return Model(inputs=inputs, outputs=x)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+
+    baseline = create_model(instrumented=False)
+    instrumented = create_model(instrumented=True)
+    instrumented.set_weights(baseline.get_weights())
+    stripped = strip_model(instrumented)
+
+    export_dir = tempfile.mkdtemp()
+    instrumented_dir = os.path.join(export_dir, 'instrumented')
+    stripped_dir = os.path.join(export_dir, 'stripped')
+    tf.saved_model.save(instrumented, instrumented_dir)
+    strip_saved_model(instrumented_dir, stripped_dir)
+    stripped_saved_model = tf.saved_model.load(stripped_dir)
+
+    x = tf.random.uniform((args.batch_size, 256))
+
+    benchmarks = [
+        ('uninstrumented', tf.function(baseline)),
+        ('instrumented', tf.function(instrumented)),
+        ('strip_model', tf.function(stripped)),
+        ('strip_saved_model', tf.function(stripped_saved_model)),
+    ]
+
+    print('%-20s %16s' % ('model', 'samples / s'))
+    for name, func in benchmarks:
+        func(x).numpy()  # warmup
+
+        def run():
+            func(x).numpy()
+
+        elapsed = min(timeit.repeat(run, number=args.iterations, repeat=3))
+        print('%-20s %16.1f' % (
+            name, args.iterations * args.batch_size / elapsed))
+
+
+if __name__ == '__main__':
+    main()
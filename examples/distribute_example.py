@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2019, NVIDIA CORPORATION. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import numpy as np
+
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
+
+import tensorflow as tf
+
+from tensorflow.keras.models import Sequential
+from tensorflow.keras.layers import Dense
+
+from nvtx.plugins.tf.collectives import trace_collectives
+from nvtx.plugins.tf.keras.callbacks import NVTXCallback
+
+TRAINING_STEPS = 5000
+NUM_REPLICAS = 2
+
+# Split the CPU in logical devices, the example runs on hosts without GPUs
+cpus = tf.config.list_physical_devices('CPU')
+tf.config.set_logical_device_configuration(
+    cpus[0],
+    [tf.config.LogicalDeviceConfiguration()] * NUM_REPLICAS
+)
+
+# load pima indians dataset
+dataset = np.loadtxt('examples/pima-indians-diabetes.data.csv', delimiter=',')
+features = dataset[:, 0:8]
+labels = dataset[:, 8]
+
+strategy = tf.distribute.MirroredStrategy(
+    ['/cpu:%d' % idx for idx in range(NUM_REPLICAS)])
+trace_collectives(strategy)
+
+with strategy.scope():
+    model = Sequential([
+        Dense(512, activation='relu', input_shape=(8,)),
+        Dense(512, activation='relu'),
+        Dense(1, activation='sigmoid'),
+    ])
+    model.compile(optimizer=tf.keras.optimizers.SGD(learning_rate=0.001),
+                  loss='binary_crossentropy',
+                  metrics=['accuracy'])
+
+model.fit(
+    features,
+    labels,
+    batch_size=128,
+    callbacks=[NVTXCallback()],
+    epochs=1,
+    steps_per_epoch=TRAINING_STEPS
+)
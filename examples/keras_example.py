@@ -74,7 +74,7 @@ def DenseBinaryClassificationNet(input_shape=(8,)):
     return model
 
 
-nvtx_callback = NVTXCallback()
+nvtx_callback = NVTXCallback(batch_size=128)
 
 model = DenseBinaryClassificationNet()
 sgd = optimizers.SGD(lr=0.001, momentum=0.9, nesterov=True)
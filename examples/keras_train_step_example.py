@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2019, NVIDIA CORPORATION. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import numpy as np
+
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
+
+from tensorflow.keras import optimizers
+from tensorflow.keras.layers import Input, Dense
+
+from nvtx.plugins.tf.keras.callbacks import NVTXCallback
+from nvtx.plugins.tf.keras.models import NVTXModel
+
+TRAINING_STEPS = 5000
+STEPS_PER_EXECUTION = 10
+
+# load pima indians dataset
+dataset = np.loadtxt('examples/pima-indians-diabetes.data.csv', delimiter=',')
+features = dataset[:, 0:8]
+labels = dataset[:, 8]
+
+
+def DenseBinaryClassificationNet(input_shape=(8,)):
+    inputs = Input(input_shape)
+    x = Dense(1024, activation='relu')(inputs)
+    x = Dense(1024, activation='relu')(x)
+    x = Dense(512, activation='relu')(x)
+    predictions = Dense(1, activation='sigmoid')(x)
+    return NVTXModel(inputs=inputs, outputs=predictions)
+
+
+model = DenseBinaryClassificationNet()
+sgd = optimizers.SGD(learning_rate=0.001, momentum=0.9, nesterov=True)
+model.compile(optimizer=sgd,
+              loss='binary_crossentropy',
+              metrics=['accuracy'],
+              steps_per_execution=STEPS_PER_EXECUTION)
+model.fit(
+    features,
+    labels,
+    batch_size=128,
+    callbacks=[NVTXCallback()],
+    epochs=1,
+    steps_per_epoch=TRAINING_STEPS
+)
@@ -0,0 +1,12 @@
+#!/usr/bin/env bash
+
+nsys profile \
+  -d 60 \
+  -w true \
+  --force-overwrite=true \
+  --sample=cpu \
+  -t 'nvtx' \
+  --stop-on-exit=true \
+  --kill=sigkill \
+  -o examples/distribute_example \
+  python examples/distribute_example.py
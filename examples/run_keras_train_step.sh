@@ -0,0 +1,12 @@
+#!/usr/bin/env bash
+
+nsys profile \
+  -d 60 \
+  -w true \
+  --force-overwrite=true \
+  --sample=cpu \
+  -t 'nvtx,cuda' \
+  --stop-on-exit=true \
+  --kill=sigkill \
+  -o examples/keras_train_step_example \
+  python examples/keras_train_step_example.py
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2019, NVIDIA CORPORATION. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import numpy as np
+
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
+
+import tensorflow as tf
+
+from tensorflow.keras.models import Model
+from tensorflow.keras.layers import Input, Dense
+
+from nvtx.plugins.tf.keras.layers import NVTXStart, NVTXEnd
+from nvtx.plugins.tf.serving import REQUEST_ID_NAME
+from nvtx.plugins.tf.serving import serving_function
+
+NUM_REQUESTS = 20000
+
+
+def DenseBinaryClassificationNet(input_shape=(8,)):
+    inputs = Input(input_shape)
+
+    x = inputs
+    x, marker_id, domain_id = NVTXStart(message='Dense 1',
+                                        domain_name='forward')(x)
+    x = Dense(1024, activation='relu')(x)
+    x = NVTXEnd()([x, marker_id, domain_id])
+
+    x, marker_id, domain_id = NVTXStart(message='Dense 2',
+                                        domain_name='forward')(x)
+    x = Dense(1, activation='sigmoid')(x)
+    x = NVTXEnd()([x, marker_id, domain_id])
+
+    return Model(inputs=inputs, outputs=x)
+
+
+model = DenseBinaryClassificationNet()
+serve = serving_function(
+    lambda x: {'predictions': model(x)},
+    [tf.TensorSpec([None, 8], tf.float32, name='x')])
+
+export_dir = os.path.join(tempfile.mkdtemp(), 'model')
+tf.saved_model.save(model, export_dir,
+                    signatures={'serving_default': serve})
+
+# The layers round-trip through their config
+model = tf.keras.models.load_model(export_dir)
+model.summary()
+
+loaded = tf.saved_model.load(export_dir)
+infer = loaded.signatures['serving_default']
+
+features = tf.constant(np.random.rand(32, 8), dtype=tf.float32)
+for request_id in range(1, NUM_REQUESTS + 1):
+    infer(x=features, **{REQUEST_ID_NAME: tf.constant(request_id, tf.int64)})
@@ -14,194 +14,336 @@ See the License for the specific language governing permissions and
 limitations under the License.
 */
 
-#include <map>
-
 #include "tensorflow/core/framework/op_kernel.h"
 #include "tensorflow/core/framework/register_types.h"
 #include "tensorflow/core/public/version.h"
 
-#include "nvToolsExt.h"
-
-
-#define NVTX_DEFAULT_DOMAIN nullptr
+#include "nvtx_runtime.h"
 
 using namespace tensorflow;
 
-class DomainRegistry {
- public:
-  DomainRegistry()
-#ifdef NEED_NVTX_INIT
- : initialized(false)
+namespace {
+
+void ForwardInput(OpKernelContext* context) {
+  // Ouput 0: Input => Output
+  if (IsRefType(context->input_dtype(0))) {
+    context->forward_ref_input_to_ref_output(0, 0);
+  } else {
+    context->set_output(0, context->input(0));
+  }
+}
+
+Status GetScalarString(OpKernelContext* context, const char* name,
+                       string* value) {
+  const Tensor* value_t;
+  TF_RETURN_IF_ERROR(context->input(name, &value_t));
+  if (!TensorShapeUtils::IsScalar(value_t->shape())) {
+    return errors::InvalidArgument(name, " must be scalar, but received ",
+                                   value_t->shape().DebugString());
+  }
+#if TF_MAJOR_VERSION > 2 || (TF_MAJOR_VERSION == 2 && TF_MINOR_VERSION >= 2)
+  *value = value_t->flat<tstring>()(0);
+#else
+  *value = value_t->flat<std::string>()(0);
 #endif
-  {
+  return Status::OK();
+}
+
+// Reads the optional scalar payload of NvtxStart
+Status GetPayload(OpKernelContext* context, nvtx_plugins::Payload* payload) {
+  OpInputList payload_list;
+  TF_RETURN_IF_ERROR(context->input_list("payload", &payload_list));
+  if (payload_list.size() == 0) {
+    return Status::OK();
+  }
+  if (payload_list.size() > 1) {
+    return errors::InvalidArgument("At most one payload is supported, but ",
+                                   "received ", payload_list.size());
   }
 
-  ~DomainRegistry() {
-    for (auto domain : domains) {
-      nvtxDomainDestroy(domain.second);
-    }
+  const Tensor& payload_t = payload_list[0];
+  if (!TensorShapeUtils::IsScalar(payload_t.shape())) {
+    return errors::InvalidArgument("payload must be scalar, but received ",
+                                   payload_t.shape().DebugString());
   }
+  if (payload_t.dtype() == DT_DOUBLE) {
+    *payload = nvtx_plugins::Payload(payload_t.scalar<double>()());
+  } else {
+    *payload = nvtx_plugins::Payload(
+        static_cast<int64_t>(payload_t.scalar<int64>()()));
+  }
+  return Status::OK();
+}
+
+void StartRange(OpKernelContext* context,
+                const nvtx_plugins::Message& message,
+                const nvtx_plugins::Payload& payload =
+                    nvtx_plugins::Payload()) {
+  uint64_t marker_id = nvtx_plugins::StartRange(message, payload);
+  int64_t domain_handle = message.domain_handle;
+
+  // push marker_id and domain_handle to outputs 1 and 2
+  Tensor *output_marker_id = nullptr, *output_domain_handle = nullptr;
+  OP_REQUIRES_OK(context,
+                 context->allocate_output("marker_id",
+                                          TensorShape({}),
+                                          &output_marker_id)
+                );
+  OP_REQUIRES_OK(context,
+                 context->allocate_output("domain_handle",
+                                          TensorShape({}),
+                                          &output_domain_handle)
+                );
+  output_marker_id->scalar<int64>()() = marker_id;
+  output_domain_handle->scalar<int64>()() = domain_handle;
+}
+
+void EndRange(OpKernelContext* context) {
+  // Close NVTX range
+  const Tensor *marker_t, *domain_t;
+  OP_REQUIRES_OK(context, context->input("marker_id", &marker_t));
+  OP_REQUIRES_OK(context, context->input("domain_handle", &domain_t));
+  nvtx_plugins::EndRange(marker_t->scalar<int64>()(),
+                         domain_t->scalar<int64>()());
+
+  Tensor *output_null_output = nullptr;
+  OP_REQUIRES_OK(context,
+                 context->allocate_output("null_output",
+                                          TensorShape({}),
+                                          &output_null_output)
+                );
+}
+
+}  // namespace
 
-  nvtxDomainHandle_t Register(const string &domain_name) {
-#ifdef NEED_NVTX_INIT
-    if (!initialized) {
-      nvtxInitializationAttributes_t initAttribs = {};
-      initAttribs.version = NVTX_VERSION;
-      initAttribs.size = NVTX_INITIALIZATION_ATTRIB_STRUCT_SIZE;
 
-      nvtxInitialize(&initAttribs);
-      initialized = true;
-    }
-#endif
+template <typename T>
+class NvtxStartOp : public OpKernel {
+ public:
+  explicit NvtxStartOp(OpKernelConstruction* context) : OpKernel(context) {}
+
+  void Compute(OpKernelContext* context) override {
+    ForwardInput(context);
+
+    // Inputs 2,3: message and domain_name
+    string message, domain_name;
+    OP_REQUIRES_OK(context, GetScalarString(context, "message", &message));
+    OP_REQUIRES_OK(context,
+                   GetScalarString(context, "domain_name", &domain_name));
 
-    auto it = domains.find(domain_name);
-    if (it != domains.end()) {
-      return it->second;
-    }
+    nvtx_plugins::Payload payload;
+    OP_REQUIRES_OK(context, GetPayload(context, &payload));
 
-    domains[domain_name] = nvtxDomainCreateA(domain_name.c_str());
-    return domains[domain_name];
+    nvtx_plugins::Message resolved;
+    StartRange(context, message_cache_.Get(message, domain_name, &resolved),
+               payload);
   }
 
+  bool IsExpensive() override { return false; }
+
  private:
-  std::map<string, nvtxDomainHandle_t> domains;
-#ifdef NEED_NVTX_INIT
-  bool initialized;
-#endif
+  // The message inputs are usually constant, they are resolved once
+  nvtx_plugins::MessageCache message_cache_;
 };
 
-static DomainRegistry domain_registry;
+template <typename T>
+class NvtxEndOp : public OpKernel {
+ public:
+  explicit NvtxEndOp(OpKernelConstruction* context) : OpKernel(context) {}
+
+  void Compute(OpKernelContext* context) override {
+    ForwardInput(context);
+    EndRange(context);
+  }
 
+  bool IsExpensive() override { return false; }
+};
 
+// NvtxStartV2 takes the message and domain name as attributes
 template <typename T>
-class NvtxStartOp : public OpKernel {
+class NvtxStartV2Op : public OpKernel {
  public:
-  explicit NvtxStartOp(OpKernelConstruction* context) : OpKernel(context) {}
+  explicit NvtxStartV2Op(OpKernelConstruction* context) : OpKernel(context) {
+    string message, domain_name;
+    OP_REQUIRES_OK(context, context->GetAttr("message", &message));
+    OP_REQUIRES_OK(context, context->GetAttr("domain_name", &domain_name));
+    message_ = nvtx_plugins::ResolveMessage(message, domain_name);
+  }
 
   void Compute(OpKernelContext* context) override {
-    // Ouput 0: Input => Output
-    if (IsRefType(context->input_dtype(0))) {
-      context->forward_ref_input_to_ref_output(0, 0);
-    } else {
-      context->set_output(0, context->input(0));
-    }
-
-    // Inputs 1,2: message and domain_name
-    const Tensor *message_t, *domain_t;
-    OP_REQUIRES_OK(context, context->input("message", &message_t));
-    OP_REQUIRES(context, TensorShapeUtils::IsScalar(message_t->shape()),
-                errors::InvalidArgument("message must be scalar, but received ",
-                                        message_t->shape().DebugString()));
-    OP_REQUIRES_OK(context, context->input("domain_name", &domain_t));
-    OP_REQUIRES(context, TensorShapeUtils::IsScalar(domain_t->shape()),
-                errors::InvalidArgument("domain_name must be scalar, ",
-                                        "but received ",
-                                        domain_t->shape().DebugString()));
+    ForwardInput(context);
+    StartRange(context, message_);
+  }
 
-#if TF_MAJOR_VERSION > 2 || (TF_MAJOR_VERSION == 2 && TF_MINOR_VERSION >= 2)
-    const string message = message_t->flat<tstring>()(0);
-    const string domain_name = domain_t->flat<tstring>()(0);
-#else
-    const string message = message_t->flat<std::string>()(0);
-    const string domain_name = domain_t->flat<std::string>()(0);
-#endif
+  bool IsExpensive() override { return false; }
 
-    // get domain handle (create one if necessary)
-    nvtxDomainHandle_t domain_handle = NVTX_DEFAULT_DOMAIN;
-    if (!domain_name.empty()) {
-      domain_handle = domain_registry.Register(domain_name);
-    }
-
-    // create nvtx marker
-    nvtxRangeId_t marker_id;
-    if (domain_handle != NVTX_DEFAULT_DOMAIN) {
-      nvtxEventAttributes_t attr = {};
-      attr.version = NVTX_VERSION;
-      // TODO(ahmadki): feature - ability to set the marker color
-      attr.size = NVTX_EVENT_ATTRIB_STRUCT_SIZE;
-      attr.messageType = NVTX_MESSAGE_TYPE_ASCII;
-      attr.message.ascii = message.c_str();
-
-      marker_id = nvtxDomainRangeStartEx(domain_handle, &attr);
-    } else {
-      marker_id = nvtxRangeStart(message.c_str());
-    }
-
-    // push marker_id and domain_handle to outputs 1 and 2
-    Tensor *output_marker_id = nullptr, *output_domain_handle = nullptr;
-    OP_REQUIRES_OK(context,
-                   context->allocate_output("marker_id",
-                                            TensorShape({}),
-                                            &output_marker_id)
-                  );
-    OP_REQUIRES_OK(context,
-                   context->allocate_output("domain_handle",
-                                            TensorShape({}),
-                                            &output_domain_handle)
-                  );
-    output_marker_id->scalar<int64>()() = marker_id;
-    output_domain_handle->scalar<int64>()() = (int64)domain_handle;
+ private:
+  nvtx_plugins::Message message_;
+};
+
+// NvtxPush and NvtxPop resolve the domain once and allocate no output
+template <typename T>
+class NvtxPushOp : public OpKernel {
+ public:
+  explicit NvtxPushOp(OpKernelConstruction* context) : OpKernel(context) {
+    string message, domain_name;
+    OP_REQUIRES_OK(context, context->GetAttr("message", &message));
+    OP_REQUIRES_OK(context, context->GetAttr("domain_name", &domain_name));
+    message_ = nvtx_plugins::ResolveMessage(message, domain_name);
+  }
+
+  void Compute(OpKernelContext* context) override {
+    ForwardInput(context);
+    nvtx_plugins::PushRange(message_);
   }
 
   bool IsExpensive() override { return false; }
+
+ private:
+  nvtx_plugins::Message message_;
 };
 
 template <typename T>
-class NvtxEndOp : public OpKernel {
+class NvtxPopOp : public OpKernel {
  public:
-  explicit NvtxEndOp(OpKernelConstruction* context) : OpKernel(context) {}
+  explicit NvtxPopOp(OpKernelConstruction* context) : OpKernel(context) {
+    string domain_name;
+    OP_REQUIRES_OK(context, context->GetAttr("domain_name", &domain_name));
+    domain_handle_ = nvtx_plugins::GetDomainHandle(domain_name);
+  }
 
   void Compute(OpKernelContext* context) override {
-    // Ouput 0: Input => Output
-    if (IsRefType(context->input_dtype(0))) {
-      context->forward_ref_input_to_ref_output(0, 0);
-    } else {
-      context->set_output(0, context->input(0));
-    }
-
-    // Close NVTX range
-    const Tensor *marker_t, *domain_t;
-    OP_REQUIRES_OK(context, context->input("marker_id", &marker_t));
-    OP_REQUIRES_OK(context, context->input("domain_handle", &domain_t));
-    auto marker_id = marker_t->scalar<int64>()();
-    auto domain_handle = reinterpret_cast<nvtxDomainHandle_t>(
-      marker_t->scalar<int64>()());
-
-    if (domain_handle != NVTX_DEFAULT_DOMAIN) {
-      nvtxDomainRangeEnd(domain_handle, marker_id);
-    } else {
-      nvtxRangeEnd(marker_id);
-    }
-
-    Tensor *output_null_output = nullptr;
-    OP_REQUIRES_OK(context,
-                   context->allocate_output("null_output",
-                                            TensorShape({}),
-                                            &output_null_output)
-                  );
+    ForwardInput(context);
+    nvtx_plugins::PopRange(domain_handle_);
+  }
+
+  bool IsExpensive() override { return false; }
+
+ private:
+  int64_t domain_handle_;
+};
+
+template <typename T>
+class NvtxMarkOp : public OpKernel {
+ public:
+  explicit NvtxMarkOp(OpKernelConstruction* context) : OpKernel(context) {
+    string message, domain_name;
+    OP_REQUIRES_OK(context, context->GetAttr("message", &message));
+    OP_REQUIRES_OK(context, context->GetAttr("domain_name", &domain_name));
+    message_ = nvtx_plugins::ResolveMessage(message, domain_name);
+  }
+
+  void Compute(OpKernelContext* context) override {
+    ForwardInput(context);
+
+    nvtx_plugins::Payload payload;
+    OP_REQUIRES_OK(context, GetPayload(context, &payload));
+    nvtx_plugins::Mark(message_, payload);
   }
 
   bool IsExpensive() override { return false; }
+
+ private:
+  nvtx_plugins::Message message_;
 };
 
 
-#define REGISTER_GPU_KERNEL(type)                                 \
+#define REGISTER_GPU_KERNEL_WITH(type, host_io)                   \
   REGISTER_KERNEL_BUILDER(Name("NvtxStart")                       \
-                              .Device(DEVICE_GPU)                 \
+                              .Device(DEVICE_GPU) host_io         \
                               .HostMemory("message")              \
                               .HostMemory("domain_name")          \
+                              .HostMemory("payload")              \
                               .HostMemory("marker_id")            \
                               .HostMemory("domain_handle")        \
                               .TypeConstraint<type>("T"),         \
                           NvtxStartOp<type>);                     \
   REGISTER_KERNEL_BUILDER(Name("NvtxEnd")                         \
-                              .Device(DEVICE_GPU)                 \
+                              .Device(DEVICE_GPU) host_io         \
                               .HostMemory("marker_id")            \
                               .HostMemory("domain_handle")        \
                               .HostMemory("grad_message")         \
                               .HostMemory("grad_domain_name")     \
                               .TypeConstraint<type>("T"),         \
-                          NvtxEndOp<type>);
+                          NvtxEndOp<type>);                       \
+  REGISTER_KERNEL_BUILDER(Name("NvtxStartV2")                     \
+                              .Device(DEVICE_GPU) host_io         \
+                              .HostMemory("marker_id")            \
+                              .HostMemory("domain_handle")        \
+                              .TypeConstraint<type>("T"),         \
+                          NvtxStartV2Op<type>);                   \
+  REGISTER_KERNEL_BUILDER(Name("NvtxEndV2")                       \
+                              .Device(DEVICE_GPU) host_io         \
+                              .HostMemory("marker_id")            \
+                              .HostMemory("domain_handle")        \
+                              .TypeConstraint<type>("T"),         \
+                          NvtxEndOp<type>);                       \
+  REGISTER_KERNEL_BUILDER(Name("NvtxPush")                        \
+                              .Device(DEVICE_GPU) host_io         \
+                              .TypeConstraint<type>("T"),         \
+                          NvtxPushOp<type>);                      \
+  REGISTER_KERNEL_BUILDER(Name("NvtxPop")                         \
+                              .Device(DEVICE_GPU) host_io         \
+                              .TypeConstraint<type>("T"),         \
+                          NvtxPopOp<type>);                       \
+  REGISTER_KERNEL_BUILDER(Name("NvtxMark")                        \
+                              .Device(DEVICE_GPU) host_io         \
+                              .HostMemory("payload")              \
+                              .TypeConstraint<type>("T"),         \
+                          NvtxMarkOp<type>);
+
+#define REGISTER_GPU_KERNEL(type) REGISTER_GPU_KERNEL_WITH(type, )
+
+// Strings and resource handles live in host memory, the ranges around
+// preprocessing and resource ops are placed next to them on the host.
+#define HOST_IO .HostMemory("inputs").HostMemory("output")
+#define REGISTER_GPU_HOST_KERNEL(type) REGISTER_GPU_KERNEL_WITH(type, HOST_IO)
 
 TF_CALL_NUMBER_TYPES(REGISTER_GPU_KERNEL);
+TF_CALL_bool(REGISTER_GPU_KERNEL);
+TF_CALL_variant(REGISTER_GPU_KERNEL);
+#if TF_MAJOR_VERSION > 2 || (TF_MAJOR_VERSION == 2 && TF_MINOR_VERSION >= 2)
+TF_CALL_tstring(REGISTER_GPU_HOST_KERNEL);
+#else
+TF_CALL_string(REGISTER_GPU_HOST_KERNEL);
+#endif
+TF_CALL_resource(REGISTER_GPU_HOST_KERNEL);
+#undef REGISTER_GPU_HOST_KERNEL
+#undef HOST_IO
 #undef REGISTER_GPU_KERNEL
+#undef REGISTER_GPU_KERNEL_WITH
+
+// CPU kernels, used by CPU-only and multi-CPU-device tf.distribute setups
+#define REGISTER_CPU_KERNEL(type)                                 \
+  REGISTER_KERNEL_BUILDER(Name("NvtxStart")                       \
+                              .Device(DEVICE_CPU)                 \
+                              .TypeConstraint<type>("T"),         \
+                          NvtxStartOp<type>);                     \
+  REGISTER_KERNEL_BUILDER(Name("NvtxEnd")                         \
+                              .Device(DEVICE_CPU)                 \
+                              .TypeConstraint<type>("T"),         \
+                          NvtxEndOp<type>);                       \
+  REGISTER_KERNEL_BUILDER(Name("NvtxStartV2")                     \
+                              .Device(DEVICE_CPU)                 \
+                              .TypeConstraint<type>("T"),         \
+                          NvtxStartV2Op<type>);                   \
+  REGISTER_KERNEL_BUILDER(Name("NvtxEndV2")                       \
+                              .Device(DEVICE_CPU)                 \
+                              .TypeConstraint<type>("T"),         \
+                          NvtxEndOp<type>);                       \
+  REGISTER_KERNEL_BUILDER(Name("NvtxPush")                        \
+                              .Device(DEVICE_CPU)                 \
+                              .TypeConstraint<type>("T"),         \
+                          NvtxPushOp<type>);                      \
+  REGISTER_KERNEL_BUILDER(Name("NvtxPop")                         \
+                              .Device(DEVICE_CPU)                 \
+                              .TypeConstraint<type>("T"),         \
+                          NvtxPopOp<type>);                       \
+  REGISTER_KERNEL_BUILDER(Name("NvtxMark")                        \
+                              .Device(DEVICE_CPU)                 \
+                              .TypeConstraint<type>("T"),         \
+                          NvtxMarkOp<type>);
+
+// Numbers, bool, strings, resource handles and variants, e.g. datasets
+TF_CALL_ALL_TYPES(REGISTER_CPU_KERNEL);
+#undef REGISTER_CPU_KERNEL
@@ -19,6 +19,8 @@ limitations under the License.
 
 using namespace tensorflow;
 
+// All the ops are stateful: their inputs are mostly constants, Grappler would
+// otherwise fold them at optimization time or merge identical ranges.
 // TODO(ahmadki): marker_id and domain handle should be uint64, but int64
 // might cause op placement issues.
 REGISTER_OP("NvtxStart")
@@ -26,10 +28,13 @@ REGISTER_OP("NvtxStart")
     .Input("null_input: float32")
     .Input("message: string")
     .Input("domain_name: string")
+    .Input("payload: Tpayload")
     .Output("output: T")
     .Output("marker_id: int64")
     .Output("domain_handle: int64")
     .Attr("T: type")
+    .Attr("Tpayload: list({int64, double}) >= 0 = []")
+    .SetIsStateful()
     .SetShapeFn([](shape_inference::InferenceContext* c) {
       c->set_output(0, c->input(0));
       auto* handle_data = c->input_handle_shapes_and_types(0);
@@ -50,6 +55,8 @@ Arguments
                 calculation. The tesnor is not used inside the op.
     message: A `String` message associated with this op.
     domain_name: A `String` domain name associated with this op.
+    payload: An optional scalar `int64` or `double` payload of the range,
+             e.g. a number of bytes.
 
 Output
     output: The input `Tensor` passed to the output.
@@ -66,6 +73,7 @@ REGISTER_OP("NvtxEnd")
     .Output("output: T")
     .Output("null_output: float32")
     .Attr("T: type")
+    .SetIsStateful()
     .SetShapeFn([](shape_inference::InferenceContext* c) {
       c->set_output(0, c->input(0));
       auto* handle_data = c->input_handle_shapes_and_types(0);
@@ -91,3 +99,196 @@ Output
     null_output: A `float32 Tensor` object used as a trick to force gradient
                  calculation. The tesnor is not used inside the op.
 )doc");
+
+REGISTER_OP("NvtxStartV2")
+    .Input("inputs: T")
+    .Input("null_input: float32")
+    .Output("output: T")
+    .Output("marker_id: int64")
+    .Output("domain_handle: int64")
+    .Attr("T: type")
+    .Attr("message: string")
+    .Attr("domain_name: string = ''")
+    .SetIsStateful()
+    .SetShapeFn([](shape_inference::InferenceContext* c) {
+      c->set_output(0, c->input(0));
+      auto* handle_data = c->input_handle_shapes_and_types(0);
+      if (handle_data != nullptr) {
+        c->set_output_handle_shapes_and_types(0, *handle_data);
+      }
+      c->set_output(1, c->Scalar());
+      c->set_output(2, c->Scalar());
+      return Status::OK();
+    })
+    .Doc(R"doc(
+An identity graph node with a side effect of opening an NVTX marker.
+
+Same as `NvtxStart` but the message and domain name are attributes, which
+allows the op to be compiled with XLA.
+
+
+Arguments
+    inputs: A `Tensor` object that will be passed to `output`.
+    null_input: A `float32 Tensor` object used as a trick to force gradient
+                calculation. The tesnor is not used inside the op.
+
+Attributes
+    message: A `String` message associated with this op.
+    domain_name: A `String` domain name associated with this op.
+
+Output
+    output: The input `Tensor` passed to the output.
+    marker_id: An NVTX marker id that is passed to `NvtxEndV2`.
+    domain_handle: An NVTX domain handler that is passed to `NvtxEndV2`.
+)doc");
+
+REGISTER_OP("NvtxEndV2")
+    .Input("inputs: T")
+    .Input("marker_id: int64")
+    .Input("domain_handle: int64")
+    .Output("output: T")
+    .Output("null_output: float32")
+    .Attr("T: type")
+    .Attr("grad_message: string = ''")
+    .Attr("grad_domain_name: string = ''")
+    .Attr("domain_name: string = ''")
+    .SetIsStateful()
+    .SetShapeFn([](shape_inference::InferenceContext* c) {
+      c->set_output(0, c->input(0));
+      auto* handle_data = c->input_handle_shapes_and_types(0);
+      if (handle_data != nullptr) {
+        c->set_output_handle_shapes_and_types(0, *handle_data);
+      }
+      c->set_output(1, c->Scalar());
+      return Status::OK();
+    })
+    .Doc(R"doc(
+An identity graph node with a side effect of closing an NVTX marker.
+
+Same as `NvtxEnd` but the gradient message and domain name are attributes,
+which allows the op to be compiled with XLA.
+
+
+Arguments
+    inputs: A `Tensor` object that will be passed to `output`.
+    marker_id: An NVTX marker id that is recived from `NvtxStartV2`.
+    domain_handle: An NVTX domain handler that is recived from `NvtxStartV2`.
+
+Attributes
+    grad_message: A `String` message associated with this op gradient.
+    grad_domain_name: A `String` domain name associated with this op gradient.
+    domain_name: The `String` domain name of the `NvtxStartV2` op. Used by the
+                 XLA GPU lowering which can not read the domain handle.
+
+Output
+    output: The input `Tensor` passed to the output.
+    null_output: A `float32 Tensor` object used as a trick to force gradient
+                 calculation. The tesnor is not used inside the op.
+)doc");
+
+REGISTER_OP("NvtxPush")
+    .Input("inputs: T")
+    .Output("output: T")
+    .Attr("T: type")
+    .Attr("message: string")
+    .Attr("domain_name: string = ''")
+    .Attr("grad_domain_name: string = ''")
+    .SetIsStateful()
+    .SetShapeFn([](shape_inference::InferenceContext* c) {
+      c->set_output(0, c->input(0));
+      auto* handle_data = c->input_handle_shapes_and_types(0);
+      if (handle_data != nullptr) {
+        c->set_output_handle_shapes_and_types(0, *handle_data);
+      }
+      return Status::OK();
+    })
+    .Doc(R"doc(
+An identity graph node with a side effect of pushing an NVTX range on the
+range stack of the executing thread.
+
+Unlike `NvtxStart` no marker id or domain handle is returned, the range is
+closed by the next `NvtxPop` of the same domain. An `NvtxPop` executed by
+another thread hands the pop over to the pushing thread, which pops the range
+before its next push or pop in the domain. Best suited for strictly nested
+regions executed by a single thread.
+
+
+Arguments
+    inputs: A `Tensor` object that will be passed to `output`.
+
+Attributes
+    message: A `String` message associated with this op.
+    domain_name: A `String` domain name associated with this op.
+    grad_domain_name: A `String` domain name of the `NvtxPop` gradient.
+
+Output
+    output: The input `Tensor` passed to the output.
+)doc");
+
+REGISTER_OP("NvtxPop")
+    .Input("inputs: T")
+    .Output("output: T")
+    .Attr("T: type")
+    .Attr("domain_name: string = ''")
+    .Attr("grad_message: string = ''")
+    .Attr("grad_domain_name: string = ''")
+    .SetIsStateful()
+    .SetShapeFn([](shape_inference::InferenceContext* c) {
+      c->set_output(0, c->input(0));
+      auto* handle_data = c->input_handle_shapes_and_types(0);
+      if (handle_data != nullptr) {
+        c->set_output_handle_shapes_and_types(0, *handle_data);
+      }
+      return Status::OK();
+    })
+    .Doc(R"doc(
+An identity graph node with a side effect of popping the NVTX range pushed by
+`NvtxPush`, by the thread which pushed it.
+
+
+Arguments
+    inputs: A `Tensor` object that will be passed to `output`.
+
+Attributes
+    domain_name: The `String` domain name of the `NvtxPush` op.
+    grad_message: A `String` message associated with this op gradient.
+    grad_domain_name: A `String` domain name associated with this op gradient.
+
+Output
+    output: The input `Tensor` passed to the output.
+)doc");
+
+REGISTER_OP("NvtxMark")
+    .Input("inputs: T")
+    .Input("payload: Tpayload")
+    .Output("output: T")
+    .Attr("T: type")
+    .Attr("Tpayload: list({int64, double}) >= 0 = []")
+    .Attr("message: string")
+    .Attr("domain_name: string = ''")
+    .SetIsStateful()
+    .SetShapeFn([](shape_inference::InferenceContext* c) {
+      c->set_output(0, c->input(0));
+      auto* handle_data = c->input_handle_shapes_and_types(0);
+      if (handle_data != nullptr) {
+        c->set_output_handle_shapes_and_types(0, *handle_data);
+      }
+      return Status::OK();
+    })
+    .Doc(R"doc(
+An identity graph node with a side effect of marking an instantaneous NVTX
+event.
+
+
+Arguments
+    inputs: A `Tensor` object that will be passed to `output`.
+    payload: An optional scalar `int64` or `double` payload of the event,
+             e.g. a learning rate.
+
+Attributes
+    message: A `String` message associated with this op.
+    domain_name: A `String` domain name associated with this op.
+
+Output
+    output: The input `Tensor` passed to the output.
+)doc");
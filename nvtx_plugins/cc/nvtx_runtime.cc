@@ -0,0 +1,939 @@
+/*
+Copyright (c) 2019, NVIDIA CORPORATION. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+*/
+
+#include "nvtx_runtime.h"
+
+#include <algorithm>
+#include <atomic>
+#include <chrono>
+#include <cstdlib>
+#include <cstring>
+#include <iterator>
+#include <sstream>
+
+// NVTX v3 is header-only: every call goes through a table of function
+// pointers filled by the tool injected at runtime (e.g. Nsight Systems), and
+// is a null pointer check when no tool is attached.
+#include "nvtx3/nvToolsExt.h"
+
+#define NVTX_DEFAULT_DOMAIN nullptr
+
+namespace nvtx_plugins {
+
+namespace {
+
+// Messages are registered with NVTX up to this number of messages, the
+// following ones are passed as ASCII strings.
+const size_t kMaxRegisteredStrings = 4096;
+
+class DomainRegistry {
+ public:
+  DomainRegistry()
+#ifdef NEED_NVTX_INIT
+ : initialized(false)
+#endif
+  {
+  }
+
+  ~DomainRegistry() {
+    for (auto domain : domains) {
+      nvtxDomainDestroy(domain.second);
+    }
+  }
+
+  nvtxDomainHandle_t Register(const std::string &domain_name) {
+    if (domain_name.empty()) {
+      return NVTX_DEFAULT_DOMAIN;
+    }
+
+    std::lock_guard<std::mutex> lock(mutex);
+
+#ifdef NEED_NVTX_INIT
+    if (!initialized) {
+      nvtxInitializationAttributes_t initAttribs = {};
+      initAttribs.version = NVTX_VERSION;
+      initAttribs.size = NVTX_INITIALIZATION_ATTRIB_STRUCT_SIZE;
+
+      nvtxInitialize(&initAttribs);
+      initialized = true;
+    }
+#endif
+
+    auto it = domains.find(domain_name);
+    if (it != domains.end()) {
+      return it->second;
+    }
+
+    nvtxDomainHandle_t domain = nvtxDomainCreateA(domain_name.c_str());
+    domains[domain_name] = domain;
+
+    // Without a tool attached NVTX returns null domains, the domains are
+    // then told apart by odd handles which are never valid pointers.
+    int64_t handle = reinterpret_cast<int64_t>(domain);
+    if (domain == NVTX_DEFAULT_DOMAIN) {
+      handle = next_detached_handle;
+      next_detached_handle += 2;
+    }
+    handles[domain_name] = handle;
+    names[handle] = domain_name;
+    return domain;
+  }
+
+  // Returns the int64 handle of a domain passed between the ops, 0 for the
+  // default domain.
+  int64_t Handle(const std::string &domain_name) {
+    if (domain_name.empty()) {
+      return 0;
+    }
+    Register(domain_name);
+
+    std::lock_guard<std::mutex> lock(mutex);
+    return handles[domain_name];
+  }
+
+  // Returns the name of the domain of a handle, empty for the default
+  // domain.
+  std::string Name(int64_t handle) {
+    std::lock_guard<std::mutex> lock(mutex);
+    auto it = names.find(handle);
+    return it != names.end() ? it->second : std::string();
+  }
+
+  // Per-process string table: the tool receives a handle instead of a copy
+  // of the message for every event. Returns nullptr when the table is full.
+  nvtxStringHandle_t RegisterString(nvtxDomainHandle_t domain,
+                                    const std::string &message) {
+    std::lock_guard<std::mutex> lock(mutex);
+
+    auto key = std::make_pair(domain, message);
+    auto it = strings.find(key);
+    if (it != strings.end()) {
+      return it->second;
+    }
+    if (strings.size() >= kMaxRegisteredStrings) {
+      return nullptr;
+    }
+
+    nvtxStringHandle_t handle =
+        nvtxDomainRegisterStringA(domain, message.c_str());
+    strings[key] = handle;
+    return handle;
+  }
+
+ private:
+  std::mutex mutex;
+  std::map<std::string, nvtxDomainHandle_t> domains;
+  std::map<std::string, int64_t> handles;
+  std::map<int64_t, std::string> names;
+  int64_t next_detached_handle = 1;
+  std::map<std::pair<nvtxDomainHandle_t, std::string>, nvtxStringHandle_t>
+      strings;
+#ifdef NEED_NVTX_INIT
+  bool initialized;
+#endif
+};
+
+DomainRegistry& GetDomainRegistry() {
+  static DomainRegistry domain_registry;
+  return domain_registry;
+}
+
+nvtxDomainHandle_t ToNvtxDomain(int64_t domain_handle) {
+  if (domain_handle & 1) {
+    return NVTX_DEFAULT_DOMAIN;
+  }
+  return reinterpret_cast<nvtxDomainHandle_t>(domain_handle);
+}
+
+nvtxEventAttributes_t MessageAttributes(const Message& message,
+                                        const Payload& payload = Payload()) {
+  nvtxEventAttributes_t attr = {};
+  attr.version = NVTX_VERSION;
+  // TODO(ahmadki): feature - ability to set the marker color
+  attr.size = NVTX_EVENT_ATTRIB_STRUCT_SIZE;
+
+  if (message.registered != nullptr) {
+    attr.messageType = NVTX_MESSAGE_TYPE_REGISTERED;
+    attr.message.registered =
+        reinterpret_cast<nvtxStringHandle_t>(message.registered);
+  } else {
+    attr.messageType = NVTX_MESSAGE_TYPE_ASCII;
+    attr.message.ascii = message.text.c_str();
+  }
+
+  switch (payload.type) {
+    case Payload::kInt64:
+      attr.payloadType = NVTX_PAYLOAD_TYPE_INT64;
+      attr.payload.llValue = payload.int64_value;
+      break;
+    case Payload::kDouble:
+      attr.payloadType = NVTX_PAYLOAD_TYPE_DOUBLE;
+      attr.payload.dValue = payload.double_value;
+      break;
+    default:
+      break;
+  }
+  return attr;
+}
+
+bool DebugEnabledFromEnv() {
+  const char* value = std::getenv("NVTX_PLUGINS_DEBUG");
+  return value != nullptr && value[0] != '\0' && std::strcmp(value, "0") != 0;
+}
+
+std::atomic<bool>& DebugFlag() {
+  static std::atomic<bool> debug_flag(DebugEnabledFromEnv());
+  return debug_flag;
+}
+
+std::atomic<bool>& RecorderFlag() {
+  static std::atomic<bool> recorder_flag(false);
+  return recorder_flag;
+}
+
+std::atomic<bool>& BufferingFlag() {
+  static std::atomic<bool> buffering_flag(false);
+  return buffering_flag;
+}
+
+int64_t NowNs() {
+  return std::chrono::duration_cast<std::chrono::nanoseconds>(
+      std::chrono::steady_clock::now().time_since_epoch()).count();
+}
+
+uint64_t ThreadId() {
+  return std::hash<std::thread::id>()(std::this_thread::get_id());
+}
+
+// Whether the ranges pushed by the calling thread while a tracing switch was
+// used were emitted, to pop them the same way.
+std::vector<bool>& PushedRanges(int64_t domain_handle) {
+  static thread_local std::map<int64_t, std::vector<bool>> pushed_ranges;
+  return pushed_ranges[domain_handle];
+}
+
+}  // namespace
+
+Message ResolveMessage(const std::string& message,
+                       const std::string& domain_name) {
+  Message resolved;
+  resolved.text = message;
+  resolved.domain_name = domain_name;
+  // get domain handle (create one if necessary)
+  resolved.domain_handle = GetDomainRegistry().Handle(domain_name);
+
+  nvtxDomainHandle_t domain = ToNvtxDomain(resolved.domain_handle);
+  if (domain != NVTX_DEFAULT_DOMAIN) {
+    resolved.registered = GetDomainRegistry().RegisterString(domain, message);
+  }
+  return resolved;
+}
+
+const Message& MessageCache::Get(const std::string& message,
+                                 const std::string& domain_name,
+                                 Message* resolved) {
+  const Message* cached = cached_.load(std::memory_order_acquire);
+  if (cached != nullptr && cached->text == message &&
+      cached->domain_name == domain_name) {
+    return *cached;
+  }
+
+  *resolved = ResolveMessage(message, domain_name);
+  if (cached == nullptr) {
+    Message* first = new Message(*resolved);
+    Message* expected = nullptr;
+    if (!cached_.compare_exchange_strong(expected, first,
+                                         std::memory_order_release)) {
+      delete first;
+    }
+  }
+  return *resolved;
+}
+
+uint64_t StartRange(const std::string& message, const std::string& domain_name,
+                    int64_t* domain_handle, const Payload& payload) {
+  Message resolved = ResolveMessage(message, domain_name);
+  *domain_handle = resolved.domain_handle;
+  return StartRange(resolved, payload);
+}
+
+uint64_t StartRange(const Message& message, const Payload& payload) {
+  nvtxDomainHandle_t domain = ToNvtxDomain(message.domain_handle);
+
+  if (!GetTracingSwitches().ShouldEmit(message.domain_handle)) {
+    return TracingSwitches::kSkippedRangeBit;
+  }
+
+  // create nvtx marker
+  nvtxRangeId_t marker_id;
+  if (BufferingEnabled()) {
+    marker_id = GetRangeBuffer().Open(message.text, message.domain_name,
+                                      payload);
+  } else if (domain != NVTX_DEFAULT_DOMAIN) {
+    nvtxEventAttributes_t attr = MessageAttributes(message, payload);
+    marker_id = nvtxDomainRangeStartEx(domain, &attr);
+  } else if (payload.type != Payload::kNone) {
+    nvtxEventAttributes_t attr = MessageAttributes(message, payload);
+    marker_id = nvtxRangeStartEx(&attr);
+  } else {
+    marker_id = nvtxRangeStart(message.text.c_str());
+  }
+
+  // in debug mode the marker id is a token of the range tracker
+  if (DebugEnabled()) {
+    marker_id = GetRangeTracker().Open(marker_id, message.domain_handle,
+                                       message.domain_name, message.text);
+  }
+
+  if (RecorderEnabled()) {
+    GetFlightRecorder().Record('b', message.text, message.domain_handle,
+                               marker_id);
+  }
+  return marker_id;
+}
+
+void EndRange(uint64_t marker_id, int64_t domain_handle) {
+  if (marker_id & TracingSwitches::kSkippedRangeBit) {
+    return;
+  }
+
+  if (RecorderEnabled()) {
+    GetFlightRecorder().Record('e', std::string(), domain_handle, marker_id);
+  }
+
+  // in debug mode unknown ranges are reported instead of being ended
+  if (DebugEnabled() &&
+      !GetRangeTracker().Close(marker_id, domain_handle, &marker_id)) {
+    return;
+  }
+
+  // ranges opened while buffering was enabled are closed in the buffer
+  if (marker_id & RangeBuffer::kBufferedRangeBit) {
+    GetRangeBuffer().Close(marker_id);
+    return;
+  }
+
+  nvtxDomainHandle_t domain = ToNvtxDomain(domain_handle);
+  if (domain != NVTX_DEFAULT_DOMAIN) {
+    nvtxDomainRangeEnd(domain, marker_id);
+  } else {
+    nvtxRangeEnd(marker_id);
+  }
+}
+
+void PushRange(const std::string& message, const std::string& domain_name) {
+  PushRange(message, GetDomainHandle(domain_name));
+}
+
+void PopRange(const std::string& domain_name) {
+  PopRange(GetDomainHandle(domain_name));
+}
+
+int64_t GetDomainHandle(const std::string& domain_name) {
+  return GetDomainRegistry().Handle(domain_name);
+}
+
+void PushRange(const std::string& message, int64_t domain_handle) {
+  PushRange(ResolveMessage(message, GetDomainRegistry().Name(domain_handle)));
+}
+
+namespace {
+
+// Pops a range pushed by the calling thread.
+void PopThreadRange(int64_t domain_handle) {
+  // ranges pushed before a switch was used are popped
+  if (GetTracingSwitches().Used()) {
+    std::vector<bool>& pushed = PushedRanges(domain_handle);
+    if (!pushed.empty()) {
+      bool emitted = pushed.back();
+      pushed.pop_back();
+      if (!emitted) {
+        return;
+      }
+    }
+  }
+
+  if (RecorderEnabled()) {
+    GetFlightRecorder().Record('E', std::string(), domain_handle, 0);
+  }
+
+  // ranges pushed before buffering was enabled are popped from NVTX
+  if (BufferingEnabled() && GetRangeBuffer().Pop(domain_handle)) {
+    return;
+  }
+
+  nvtxDomainHandle_t domain = ToNvtxDomain(domain_handle);
+  if (domain != NVTX_DEFAULT_DOMAIN) {
+    nvtxDomainRangePop(domain);
+  } else {
+    nvtxRangePop();
+  }
+}
+
+// Pops the ranges of the calling thread popped by other threads.
+void PopHandedOver(int64_t domain_handle) {
+  for (int i = GetPushedRangeOwners().TakeHandedOver(domain_handle); i > 0;
+       --i) {
+    PopThreadRange(domain_handle);
+  }
+}
+
+}  // namespace
+
+void PushRange(const Message& message) {
+  int64_t domain_handle = message.domain_handle;
+  PopHandedOver(domain_handle);
+  GetPushedRangeOwners().Push(domain_handle);
+
+  TracingSwitches& switches = GetTracingSwitches();
+  if (switches.Used()) {
+    bool emit = switches.ShouldEmit(domain_handle);
+    PushedRanges(domain_handle).push_back(emit);
+    if (!emit) {
+      return;
+    }
+  }
+
+  if (RecorderEnabled()) {
+    GetFlightRecorder().Record('B', message.text, domain_handle, 0);
+  }
+
+  if (BufferingEnabled()) {
+    GetRangeBuffer().Push(message.text, domain_handle);
+    return;
+  }
+
+  nvtxDomainHandle_t domain = ToNvtxDomain(domain_handle);
+  if (domain != NVTX_DEFAULT_DOMAIN) {
+    nvtxEventAttributes_t attr = MessageAttributes(message);
+    nvtxDomainRangePushEx(domain, &attr);
+  } else {
+    nvtxRangePushA(message.text.c_str());
+  }
+}
+
+void PopRange(int64_t domain_handle) {
+  PopHandedOver(domain_handle);
+  if (GetPushedRangeOwners().Pop(domain_handle)) {
+    PopThreadRange(domain_handle);
+  }
+}
+
+void Mark(const std::string& message, int64_t domain_handle,
+          const Payload& payload) {
+  Mark(ResolveMessage(message, GetDomainRegistry().Name(domain_handle)),
+       payload);
+}
+
+void Mark(const Message& message, const Payload& payload) {
+  if (!GetTracingSwitches().ShouldEmit(message.domain_handle)) {
+    return;
+  }
+
+  if (RecorderEnabled()) {
+    GetFlightRecorder().Record('i', message.text, message.domain_handle, 0);
+  }
+
+  nvtxDomainHandle_t domain = ToNvtxDomain(message.domain_handle);
+  nvtxEventAttributes_t attr = MessageAttributes(message, payload);
+  if (domain != NVTX_DEFAULT_DOMAIN) {
+    nvtxDomainMarkEx(domain, &attr);
+  } else {
+    nvtxMarkEx(&attr);
+  }
+}
+
+bool DebugEnabled() {
+  return DebugFlag().load(std::memory_order_relaxed);
+}
+
+std::string RangeTracker::Describe(const OpenRange& range) {
+  std::ostringstream description;
+  description << "'" << range.message << "'";
+  if (!range.domain_name.empty()) {
+    description << " (domain '" << range.domain_name << "')";
+  }
+  return description.str();
+}
+
+uint64_t RangeTracker::Open(uint64_t range_id, int64_t domain_handle,
+                            const std::string& domain_name,
+                            const std::string& message) {
+  std::lock_guard<std::mutex> lock(mutex_);
+
+  uint64_t token = next_token_++;
+  OpenRange range = {range_id, domain_handle, domain_name, message};
+  open_ranges_[token] = range;
+  return token;
+}
+
+bool RangeTracker::Close(uint64_t token, int64_t domain_handle,
+                         uint64_t* range_id) {
+  std::lock_guard<std::mutex> lock(mutex_);
+
+  auto it = open_ranges_.find(token);
+  if (it == open_ranges_.end()) {
+    std::ostringstream problem;
+    problem << "NvtxEnd received marker id " << token
+            << " which does not belong to an open range (the range was "
+            << "already closed or was never opened)";
+    problems_.push_back(problem.str());
+    return false;
+  }
+
+  const OpenRange range = it->second;
+  open_ranges_.erase(it);
+
+  if (range.domain_handle != domain_handle) {
+    std::ostringstream problem;
+    problem << "Range " << Describe(range) << " was opened with domain "
+            << "handle " << range.domain_handle << " but closed with domain "
+            << "handle " << domain_handle;
+    problems_.push_back(problem.str());
+  }
+
+  *range_id = range.range_id;
+  return true;
+}
+
+std::vector<std::string> RangeTracker::Report(bool reset) {
+  std::lock_guard<std::mutex> lock(mutex_);
+
+  std::vector<std::string> report = problems_;
+  for (const auto& open_range : open_ranges_) {
+    report.push_back("Range " + Describe(open_range.second) +
+                     " was never closed");
+  }
+
+  if (reset) {
+    problems_.clear();
+    open_ranges_.clear();
+  }
+  return report;
+}
+
+RangeTracker& GetRangeTracker() {
+  static RangeTracker range_tracker;
+  return range_tracker;
+}
+
+bool BufferingEnabled() {
+  return BufferingFlag().load(std::memory_order_relaxed);
+}
+
+uint64_t RangeBuffer::Open(const std::string& message,
+                           const std::string& domain_name,
+                           const Payload& payload) {
+  BufferedRange range = {message, domain_name, NowNs(), 0, ThreadId(),
+                         payload};
+
+  std::lock_guard<std::mutex> lock(mutex_);
+  uint64_t range_id = next_id_++ | kBufferedRangeBit;
+  open_ranges_[range_id] = range;
+  return range_id;
+}
+
+void RangeBuffer::Close(uint64_t range_id) {
+  int64_t end_ns = NowNs();
+
+  std::lock_guard<std::mutex> lock(mutex_);
+  auto it = open_ranges_.find(range_id);
+  if (it == open_ranges_.end()) {
+    return;
+  }
+  it->second.end_ns = end_ns;
+  if (ranges_.size() < kMaxRanges) {
+    ranges_.push_back(it->second);
+  } else {
+    dropped_++;
+  }
+  open_ranges_.erase(it);
+}
+
+void RangeBuffer::Push(const std::string& message, int64_t domain_handle) {
+  uint64_t range_id =
+      Open(message, GetDomainRegistry().Name(domain_handle), Payload());
+
+  std::lock_guard<std::mutex> lock(mutex_);
+  stacks_[StackKey(std::this_thread::get_id(), domain_handle)].push_back(
+      range_id);
+}
+
+bool RangeBuffer::Pop(int64_t domain_handle) {
+  uint64_t range_id;
+  {
+    std::lock_guard<std::mutex> lock(mutex_);
+    auto it = stacks_.find(StackKey(std::this_thread::get_id(),
+                                    domain_handle));
+    if (it == stacks_.end() || it->second.empty()) {
+      return false;
+    }
+    range_id = it->second.back();
+    it->second.pop_back();
+  }
+  Close(range_id);
+  return true;
+}
+
+void RangeBuffer::Take(size_t max_ranges, std::vector<BufferedRange>* ranges) {
+  std::lock_guard<std::mutex> lock(mutex_);
+  size_t num_ranges = std::min(max_ranges, ranges_.size());
+  ranges->insert(ranges->end(), ranges_.begin(),
+                 ranges_.begin() + num_ranges);
+  ranges_.erase(ranges_.begin(), ranges_.begin() + num_ranges);
+}
+
+size_t RangeBuffer::Clear() {
+  std::lock_guard<std::mutex> lock(mutex_);
+  size_t dropped = dropped_;
+  ranges_.clear();
+  dropped_ = 0;
+  return dropped;
+}
+
+RangeBuffer& GetRangeBuffer() {
+  static RangeBuffer range_buffer;
+  return range_buffer;
+}
+
+bool RecorderEnabled() {
+  return RecorderFlag().load(std::memory_order_relaxed);
+}
+
+size_t FlightRecorder::Enable(size_t capacity) {
+  std::lock_guard<std::mutex> lock(mutex_);
+  if (capacity_ == 0) {
+    capacity_ = capacity;
+  }
+  RecorderFlag().store(capacity_ > 0);
+  return capacity_;
+}
+
+void FlightRecorder::Disable() {
+  RecorderFlag().store(false);
+}
+
+FlightRecorder::Ring* FlightRecorder::ThreadRing() {
+  // rings outlive their thread, the events of a finished thread are dumped
+  static thread_local Ring* ring = nullptr;
+  if (ring == nullptr) {
+    std::unique_ptr<Ring> new_ring(new Ring());
+    new_ring->thread_id = ThreadId();
+    new_ring->head.store(0);
+
+    std::lock_guard<std::mutex> lock(mutex_);
+    new_ring->events.resize(capacity_);
+    ring = new_ring.get();
+    rings_.push_back(std::move(new_ring));
+  }
+  return ring;
+}
+
+void FlightRecorder::Record(char phase, const std::string& message,
+                            int64_t domain_handle, uint64_t id) {
+  Ring* ring = ThreadRing();
+  if (ring->events.empty()) {
+    return;
+  }
+
+  uint64_t head = ring->head.load(std::memory_order_relaxed);
+  RecordedEvent& event = ring->events[head % ring->events.size()];
+  event.ts_ns = NowNs();
+  event.id = id;
+  event.domain_handle = domain_handle;
+  event.phase = phase;
+  size_t length = std::min(message.size(), sizeof(event.message) - 1);
+  std::memcpy(event.message, message.data(), length);
+  event.message[length] = '\0';
+  ring->head.store(head + 1, std::memory_order_release);
+}
+
+void FlightRecorder::Snapshot(
+    std::vector<std::pair<uint64_t, RecordedEvent>>* events) {
+  std::lock_guard<std::mutex> lock(mutex_);
+  for (const auto& ring : rings_) {
+    uint64_t head = ring->head.load(std::memory_order_acquire);
+    uint64_t size = ring->events.size();
+    uint64_t first = head > size ? head - size : 0;
+    for (uint64_t i = first; i < head; ++i) {
+      events->push_back(
+          std::make_pair(ring->thread_id, ring->events[i % size]));
+    }
+  }
+}
+
+FlightRecorder& GetFlightRecorder() {
+  static FlightRecorder flight_recorder;
+  return flight_recorder;
+}
+
+void TracingSwitches::SetTracing(bool enabled) {
+  tracing_.store(enabled);
+  used_.store(true);
+}
+
+void TracingSwitches::SetDomainEnabled(int64_t domain_handle, bool enabled) {
+  std::lock_guard<std::mutex> lock(mutex_);
+  if (enabled) {
+    disabled_domains_.erase(domain_handle);
+  } else {
+    disabled_domains_.insert(domain_handle);
+  }
+  domains_disabled_.store(!disabled_domains_.empty());
+  used_.store(true);
+}
+
+bool TracingSwitches::ShouldEmitSlow(int64_t domain_handle) {
+  if (!tracing_.load(std::memory_order_relaxed)) {
+    return false;
+  }
+  if (!domains_disabled_.load(std::memory_order_relaxed)) {
+    return true;
+  }
+  std::lock_guard<std::mutex> lock(mutex_);
+  return disabled_domains_.count(domain_handle) == 0;
+}
+
+TracingSwitches& GetTracingSwitches() {
+  static TracingSwitches tracing_switches;
+  return tracing_switches;
+}
+
+void PushedRangeOwners::Push(int64_t domain_handle) {
+  std::lock_guard<std::mutex> lock(mutex_);
+  pushers_[domain_handle].push_back(std::this_thread::get_id());
+}
+
+bool PushedRangeOwners::Pop(int64_t domain_handle) {
+  std::lock_guard<std::mutex> lock(mutex_);
+  std::vector<std::thread::id>& pushers = pushers_[domain_handle];
+  if (pushers.empty()) {
+    // unbalanced pop, left to NVTX
+    return true;
+  }
+
+  auto it = std::find(pushers.rbegin(), pushers.rend(),
+                      std::this_thread::get_id());
+  if (it != pushers.rend()) {
+    pushers.erase(std::next(it).base());
+    return true;
+  }
+
+  handed_over_[StackKey(pushers.back(), domain_handle)]++;
+  handed_over_any_.store(true);
+  pushers.pop_back();
+  return false;
+}
+
+int PushedRangeOwners::TakeHandedOver(int64_t domain_handle) {
+  if (!handed_over_any_.load(std::memory_order_relaxed)) {
+    return 0;
+  }
+
+  std::lock_guard<std::mutex> lock(mutex_);
+  auto it = handed_over_.find(StackKey(std::this_thread::get_id(),
+                                       domain_handle));
+  if (it == handed_over_.end()) {
+    return 0;
+  }
+  int num_pops = it->second;
+  handed_over_.erase(it);
+  handed_over_any_.store(!handed_over_.empty());
+  return num_pops;
+}
+
+PushedRangeOwners& GetPushedRangeOwners() {
+  static PushedRangeOwners pushed_range_owners;
+  return pushed_range_owners;
+}
+
+}  // namespace nvtx_plugins
+
+extern "C" {
+
+void NvtxPluginsSetDebug(int enabled) {
+  nvtx_plugins::DebugFlag().store(enabled != 0);
+}
+
+int NvtxPluginsGetDebug() {
+  return nvtx_plugins::DebugEnabled() ? 1 : 0;
+}
+
+int NvtxPluginsDebugReport(char* buffer, size_t buffer_size, int reset) {
+  std::vector<std::string> report =
+      nvtx_plugins::GetRangeTracker().Report(reset != 0);
+
+  std::string joined;
+  for (const auto& problem : report) {
+    joined += problem + "\n";
+  }
+
+  if (buffer != nullptr && buffer_size > 0) {
+    std::strncpy(buffer, joined.c_str(), buffer_size - 1);
+    buffer[buffer_size - 1] = '\0';
+  }
+  return static_cast<int>(report.size());
+}
+
+void NvtxPluginsSetBuffering(int enabled) {
+  nvtx_plugins::BufferingFlag().store(enabled != 0);
+}
+
+int NvtxPluginsGetBuffering() {
+  return nvtx_plugins::BufferingEnabled() ? 1 : 0;
+}
+
+int NvtxPluginsTakeBufferedRanges(NvtxPluginsBufferedRange* ranges,
+                                  int max_ranges) {
+  if (ranges == nullptr || max_ranges <= 0) {
+    return 0;
+  }
+
+  std::vector<nvtx_plugins::BufferedRange> taken;
+  nvtx_plugins::GetRangeBuffer().Take(static_cast<size_t>(max_ranges),
+                                      &taken);
+
+  for (size_t i = 0; i < taken.size(); ++i) {
+    const nvtx_plugins::BufferedRange& range = taken[i];
+    NvtxPluginsBufferedRange* out = &ranges[i];
+    std::memset(out, 0, sizeof(*out));
+    std::strncpy(out->message, range.message.c_str(),
+                 sizeof(out->message) - 1);
+    std::strncpy(out->domain_name, range.domain_name.c_str(),
+                 sizeof(out->domain_name) - 1);
+    out->start_ns = range.start_ns;
+    out->end_ns = range.end_ns;
+    out->thread_id = range.thread_id;
+    switch (range.payload.type) {
+      case nvtx_plugins::Payload::kInt64:
+        out->payload_type = 1;
+        out->int64_payload = range.payload.int64_value;
+        break;
+      case nvtx_plugins::Payload::kDouble:
+        out->payload_type = 2;
+        out->double_payload = range.payload.double_value;
+        break;
+      default:
+        break;
+    }
+  }
+  return static_cast<int>(taken.size());
+}
+
+int NvtxPluginsClearBufferedRanges() {
+  return static_cast<int>(nvtx_plugins::GetRangeBuffer().Clear());
+}
+
+void NvtxPluginsSetTracing(int enabled) {
+  nvtx_plugins::GetTracingSwitches().SetTracing(enabled != 0);
+}
+
+int NvtxPluginsGetTracing() {
+  return nvtx_plugins::GetTracingSwitches().Tracing() ? 1 : 0;
+}
+
+void NvtxPluginsSetDomainEnabled(const char* domain_name, int enabled) {
+  nvtx_plugins::GetTracingSwitches().SetDomainEnabled(
+      nvtx_plugins::GetDomainHandle(domain_name ? domain_name : ""),
+      enabled != 0);
+}
+
+int NvtxPluginsSetRecorder(int capacity) {
+  if (capacity > 0) {
+    return static_cast<int>(nvtx_plugins::GetFlightRecorder().Enable(
+        static_cast<size_t>(capacity)));
+  }
+  nvtx_plugins::GetFlightRecorder().Disable();
+  return 0;
+}
+
+int NvtxPluginsRecorderSnapshot(NvtxPluginsRecordedEvent* events,
+                                int max_events) {
+  std::vector<std::pair<uint64_t, nvtx_plugins::RecordedEvent>> recorded;
+  nvtx_plugins::GetFlightRecorder().Snapshot(&recorded);
+  if (events == nullptr) {
+    return static_cast<int>(recorded.size());
+  }
+
+  int num_events = std::min(static_cast<int>(recorded.size()), max_events);
+  for (int i = 0; i < num_events; ++i) {
+    const nvtx_plugins::RecordedEvent& event = recorded[i].second;
+    NvtxPluginsRecordedEvent* out = &events[i];
+    std::memset(out, 0, sizeof(*out));
+    std::memcpy(out->message, event.message, sizeof(event.message));
+    std::string domain_name =
+        nvtx_plugins::GetDomainRegistry().Name(event.domain_handle);
+    std::strncpy(out->domain_name, domain_name.c_str(),
+                 sizeof(out->domain_name) - 1);
+    out->ts_ns = event.ts_ns;
+    out->id = event.id;
+    out->thread_id = recorded[i].first;
+    out->phase = event.phase;
+  }
+  return num_events;
+}
+
+// NVTX C API used by the python callbacks and ranges, so that they share the
+// NVTX injection of the op library and do not need libnvToolsExt.so.
+nvtxDomainHandle_t NvtxPlugins_nvtxDomainCreateA(const char* name) {
+  return nvtxDomainCreateA(name);
+}
+
+int NvtxPlugins_nvtxRangePushEx(const nvtxEventAttributes_t* attr) {
+  return nvtxRangePushEx(attr);
+}
+
+int NvtxPlugins_nvtxRangePop() {
+  return nvtxRangePop();
+}
+
+int NvtxPlugins_nvtxDomainRangePushEx(nvtxDomainHandle_t domain,
+                                      const nvtxEventAttributes_t* attr) {
+  return nvtxDomainRangePushEx(domain, attr);
+}
+
+int NvtxPlugins_nvtxDomainRangePop(nvtxDomainHandle_t domain) {
+  return nvtxDomainRangePop(domain);
+}
+
+nvtxRangeId_t NvtxPlugins_nvtxRangeStartEx(const nvtxEventAttributes_t* attr) {
+  return nvtxRangeStartEx(attr);
+}
+
+nvtxRangeId_t NvtxPlugins_nvtxDomainRangeStartEx(
+    nvtxDomainHandle_t domain, const nvtxEventAttributes_t* attr) {
+  return nvtxDomainRangeStartEx(domain, attr);
+}
+
+void NvtxPlugins_nvtxRangeEnd(nvtxRangeId_t id) {
+  nvtxRangeEnd(id);
+}
+
+void NvtxPlugins_nvtxDomainRangeEnd(nvtxDomainHandle_t domain,
+                                    nvtxRangeId_t id) {
+  nvtxDomainRangeEnd(domain, id);
+}
+
+void NvtxPlugins_nvtxMarkEx(const nvtxEventAttributes_t* attr) {
+  nvtxMarkEx(attr);
+}
+
+void NvtxPlugins_nvtxDomainMarkEx(nvtxDomainHandle_t domain,
+                                  const nvtxEventAttributes_t* attr) {
+  nvtxDomainMarkEx(domain, attr);
+}
+
+}
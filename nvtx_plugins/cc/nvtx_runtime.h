@@ -0,0 +1,414 @@
+/*
+Copyright (c) 2019, NVIDIA CORPORATION. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+*/
+
+#ifndef NVTX_PLUGINS_CC_NVTX_RUNTIME_H_
+#define NVTX_PLUGINS_CC_NVTX_RUNTIME_H_
+
+#include <atomic>
+#include <cstddef>
+#include <cstdint>
+#include <map>
+#include <memory>
+#include <mutex>
+#include <set>
+#include <string>
+#include <thread>
+#include <unordered_map>
+#include <utility>
+#include <vector>
+
+namespace nvtx_plugins {
+
+// Optional scalar attached to an NVTX event, e.g. a number of bytes.
+struct Payload {
+  enum Type { kNone, kInt64, kDouble };
+
+  Payload() : type(kNone), int64_value(0) {}
+  explicit Payload(int64_t value) : type(kInt64), int64_value(value) {}
+  explicit Payload(double value) : type(kDouble), double_value(value) {}
+
+  Type type;
+  union {
+    int64_t int64_value;
+    double double_value;
+  };
+};
+
+// A message resolved once for a domain: the domain handle and the message
+// registered in the string table of the domain. Kernels with a constant
+// message resolve it when they are constructed, their events then take no
+// lock and do no lookup.
+struct Message {
+  Message() : domain_handle(0), registered(nullptr) {}
+
+  std::string text;
+  std::string domain_name;
+  int64_t domain_handle;
+  // nvtxStringHandle_t of `text` in the domain, nullptr if not registered.
+  void* registered;
+};
+
+// Resolves `message` in `domain_name`, or in the default domain if empty.
+Message ResolveMessage(const std::string& message,
+                       const std::string& domain_name);
+
+// Caches the resolved message of an op taking the message and domain name as
+// string inputs. The first message is kept, an op whose message changes
+// resolves it for every event.
+class MessageCache {
+ public:
+  MessageCache() : cached_(nullptr) {}
+  ~MessageCache() { delete cached_.load(); }
+
+  // Returns the cached message if it matches, otherwise resolves it into
+  // `resolved` and returns it.
+  const Message& Get(const std::string& message,
+                     const std::string& domain_name, Message* resolved);
+
+ private:
+  std::atomic<Message*> cached_;
+};
+
+// Opens an NVTX range in `domain_name`, or in the default domain if empty.
+// Returns the marker id to pass to EndRange and sets `domain_handle`.
+uint64_t StartRange(const std::string& message, const std::string& domain_name,
+                    int64_t* domain_handle,
+                    const Payload& payload = Payload());
+
+// Same as above with a resolved message, the domain handle to pass to
+// EndRange is `message.domain_handle`.
+uint64_t StartRange(const Message& message,
+                    const Payload& payload = Payload());
+
+// Closes a range opened with StartRange.
+void EndRange(uint64_t marker_id, int64_t domain_handle);
+
+// Pushes and pops a range of the calling thread in `domain_name`.
+void PushRange(const std::string& message, const std::string& domain_name);
+void PopRange(const std::string& domain_name);
+
+// Returns the handle of `domain_name` (creating the domain if necessary), 0
+// for the default domain.
+int64_t GetDomainHandle(const std::string& domain_name);
+
+// Same as above with a domain handle returned by GetDomainHandle.
+void PushRange(const std::string& message, int64_t domain_handle);
+void PopRange(int64_t domain_handle);
+
+// Same as above with a resolved message.
+void PushRange(const Message& message);
+
+// Marks an instantaneous event in the domain of `domain_handle`.
+void Mark(const std::string& message, int64_t domain_handle,
+          const Payload& payload = Payload());
+void Mark(const Message& message, const Payload& payload = Payload());
+
+// Debug mode is enabled by setting NVTX_PLUGINS_DEBUG=1 in the environment or
+// by calling NvtxPluginsSetDebug(1).
+bool DebugEnabled();
+
+// Keeps track of the ranges opened by NvtxStart and closed by NvtxEnd when
+// debug mode is enabled.
+//
+// NVTX returns a zero range id when no tool is attached, so in debug mode the
+// kernels hand out tracker tokens as marker ids and map them back to the real
+// NVTX range id when the range is closed.
+//
+// Start/end ranges may overlap and be closed on any thread, so they are not
+// required to be closed in the reverse order of opening.
+class RangeTracker {
+ public:
+  RangeTracker() : next_token_(1) {}
+
+  // Registers a new range and returns the token to use as marker id.
+  uint64_t Open(uint64_t range_id, int64_t domain_handle,
+                const std::string& domain_name, const std::string& message);
+
+  // Closes the range associated with `token` and sets `range_id` to the NVTX
+  // range id to end. Returns false if the range must not be ended, e.g. if
+  // the token is unknown.
+  bool Close(uint64_t token, int64_t domain_handle, uint64_t* range_id);
+
+  // Appends leaks (ranges that are still open) to the problems found so far
+  // and returns them. If `reset` is true the tracker state is cleared.
+  std::vector<std::string> Report(bool reset);
+
+ private:
+  struct OpenRange {
+    uint64_t range_id;
+    int64_t domain_handle;
+    std::string domain_name;
+    std::string message;
+  };
+
+  static std::string Describe(const OpenRange& range);
+
+  std::mutex mutex_;
+  uint64_t next_token_;
+  std::unordered_map<uint64_t, OpenRange> open_ranges_;
+  std::vector<std::string> problems_;
+};
+
+RangeTracker& GetRangeTracker();
+
+// Tail latency capture keeps the ranges of the ops in memory instead of
+// emitting them, enabled by calling NvtxPluginsSetBuffering(1). The python
+// side decides at the end of every step whether they are flushed or dropped.
+bool BufferingEnabled();
+
+// A range kept by the RangeBuffer, timestamps are steady_clock nanoseconds.
+struct BufferedRange {
+  std::string message;
+  std::string domain_name;
+  int64_t start_ns;
+  int64_t end_ns;
+  uint64_t thread_id;
+  Payload payload;
+};
+
+// Records the ranges opened while buffering is enabled. Range ids handed out
+// by the buffer have the kBufferedRangeBit set.
+class RangeBuffer {
+ public:
+  static const uint64_t kBufferedRangeBit = 1ULL << 63;
+  // Ranges beyond this number of completed ranges are dropped until the
+  // buffer is taken or cleared.
+  static const size_t kMaxRanges = 65536;
+
+  RangeBuffer() : next_id_(1), dropped_(0) {}
+
+  uint64_t Open(const std::string& message, const std::string& domain_name,
+                const Payload& payload);
+  void Close(uint64_t range_id);
+
+  // Same as above for the ranges pushed and popped by the calling thread.
+  void Push(const std::string& message, int64_t domain_handle);
+  // Returns false if the thread has no buffered range to pop in the domain.
+  bool Pop(int64_t domain_handle);
+
+  // Moves up to `max_ranges` completed ranges to `ranges`.
+  void Take(size_t max_ranges, std::vector<BufferedRange>* ranges);
+
+  // Drops the completed ranges, ranges that are still open are kept. Returns
+  // the number of ranges dropped because the buffer was full since the last
+  // call.
+  size_t Clear();
+
+ private:
+  typedef std::pair<std::thread::id, int64_t> StackKey;
+
+  std::mutex mutex_;
+  uint64_t next_id_;
+  size_t dropped_;
+  std::unordered_map<uint64_t, BufferedRange> open_ranges_;
+  std::map<StackKey, std::vector<uint64_t>> stacks_;
+  std::vector<BufferedRange> ranges_;
+};
+
+RangeBuffer& GetRangeBuffer();
+
+// Flight recorder: a fixed-size ring of the most recent events of every
+// thread, dumped by the python side on a signal, an exception or on demand.
+// Enabled by calling NvtxPluginsSetRecorder(capacity).
+bool RecorderEnabled();
+
+// An event of the flight recorder, timestamps are steady_clock nanoseconds.
+struct RecordedEvent {
+  int64_t ts_ns;
+  // marker id of start/end ranges, 0 otherwise
+  uint64_t id;
+  int64_t domain_handle;
+  // 'b'/'e' start/end range, 'B'/'E' push/pop range, 'i' mark
+  char phase;
+  char message[63];
+};
+
+class FlightRecorder {
+ public:
+  FlightRecorder() : capacity_(0) {}
+
+  // The capacity of the rings is set the first time the recorder is
+  // enabled, the rings are never reallocated. Returns the capacity of the
+  // rings, which differs from `capacity` if it was already set.
+  size_t Enable(size_t capacity);
+  void Disable();
+
+  // A few stores into the ring of the calling thread, the oldest event of
+  // the ring is overwritten when it is full.
+  void Record(char phase, const std::string& message, int64_t domain_handle,
+              uint64_t id);
+
+  // Appends the events of every ring, oldest first, with the thread ids.
+  // Events written while the snapshot is taken may be torn.
+  void Snapshot(std::vector<std::pair<uint64_t, RecordedEvent>>* events);
+
+ private:
+  struct Ring {
+    uint64_t thread_id;
+    std::vector<RecordedEvent> events;
+    std::atomic<uint64_t> head;
+  };
+
+  Ring* ThreadRing();
+
+  std::mutex mutex_;
+  size_t capacity_;
+  std::vector<std::unique_ptr<Ring>> rings_;
+};
+
+FlightRecorder& GetFlightRecorder();
+
+// Live tracing control: the ops stop emitting ranges, globally or in some
+// domains, while the process runs. Set from python by nvtx.plugins.tf.control
+// through NvtxPluginsSetTracing and NvtxPluginsSetDomainEnabled.
+class TracingSwitches {
+ public:
+  // Range ids of the ranges that were not emitted have this bit set.
+  static const uint64_t kSkippedRangeBit = 1ULL << 62;
+
+  TracingSwitches() : used_(false), tracing_(true), domains_disabled_(false) {}
+
+  // A single relaxed load until a switch is used.
+  bool ShouldEmit(int64_t domain_handle) {
+    if (!used_.load(std::memory_order_relaxed)) {
+      return true;
+    }
+    return ShouldEmitSlow(domain_handle);
+  }
+
+  void SetTracing(bool enabled);
+  void SetDomainEnabled(int64_t domain_handle, bool enabled);
+  bool Used() { return used_.load(std::memory_order_relaxed); }
+  bool Tracing() { return tracing_.load(std::memory_order_relaxed); }
+
+ private:
+  bool ShouldEmitSlow(int64_t domain_handle);
+
+  std::atomic<bool> used_;
+  std::atomic<bool> tracing_;
+  std::atomic<bool> domains_disabled_;
+  std::mutex mutex_;
+  std::set<int64_t> disabled_domains_;
+};
+
+TracingSwitches& GetTracingSwitches();
+
+// NVTX range stacks are per thread, but the inter-op thread pool may run the
+// op popping a range on another thread than the op which pushed it. The
+// threads which pushed the open ranges are recorded per domain: a thread
+// popping a range it did not push hands the pop over to the thread which
+// pushed the latest range of the domain, which pops it before its next push
+// or pop in that domain.
+class PushedRangeOwners {
+ public:
+  PushedRangeOwners() : handed_over_any_(false) {}
+
+  // Records a range pushed by the calling thread.
+  void Push(int64_t domain_handle);
+  // Returns false if the pop was handed over to another thread.
+  bool Pop(int64_t domain_handle);
+  // Returns the number of pops handed over to the calling thread in the
+  // domain and forgets them, a single relaxed load if there are none.
+  int TakeHandedOver(int64_t domain_handle);
+
+ private:
+  typedef std::pair<std::thread::id, int64_t> StackKey;
+
+  std::atomic<bool> handed_over_any_;
+  std::mutex mutex_;
+  // the pushing thread of every open range, in push order
+  std::map<int64_t, std::vector<std::thread::id>> pushers_;
+  std::map<StackKey, int> handed_over_;
+};
+
+PushedRangeOwners& GetPushedRangeOwners();
+
+}  // namespace nvtx_plugins
+
+extern "C" {
+
+void NvtxPluginsSetDebug(int enabled);
+
+int NvtxPluginsGetDebug();
+
+// Writes the debug report, one problem per line, to `buffer` (truncated to
+// `buffer_size`) and returns the number of problems found.
+int NvtxPluginsDebugReport(char* buffer, size_t buffer_size, int reset);
+
+void NvtxPluginsSetBuffering(int enabled);
+
+int NvtxPluginsGetBuffering();
+
+// A completed range of the RangeBuffer, the strings are truncated.
+struct NvtxPluginsBufferedRange {
+  char message[256];
+  char domain_name[64];
+  int64_t start_ns;
+  int64_t end_ns;
+  uint64_t thread_id;
+  // 0: no payload, 1: int64_payload, 2: double_payload
+  int32_t payload_type;
+  int64_t int64_payload;
+  double double_payload;
+};
+
+// Moves up to `max_ranges` completed ranges to `ranges` and returns their
+// number.
+int NvtxPluginsTakeBufferedRanges(NvtxPluginsBufferedRange* ranges,
+                                  int max_ranges);
+
+// Drops the completed ranges and returns the number of ranges dropped
+// because the buffer was full.
+int NvtxPluginsClearBufferedRanges();
+
+// Enables or disables the ranges of the ops, ranges that are open when the
+// tracing is disabled are still closed.
+void NvtxPluginsSetTracing(int enabled);
+
+int NvtxPluginsGetTracing();
+
+// Enables or disables the ranges of the ops in one domain, the default domain
+// is the empty string.
+void NvtxPluginsSetDomainEnabled(const char* domain_name, int enabled);
+
+// Enables the flight recorder with rings of `capacity` events per thread, or
+// disables it if `capacity` is 0. Returns the capacity of the rings, set by
+// the first call enabling the recorder.
+int NvtxPluginsSetRecorder(int capacity);
+
+// An event of the flight recorder, the strings are truncated.
+struct NvtxPluginsRecordedEvent {
+  char message[64];
+  char domain_name[64];
+  int64_t ts_ns;
+  uint64_t id;
+  uint64_t thread_id;
+  int32_t phase;
+};
+
+// Copies up to `max_events` recorded events to `events`, oldest first per
+// thread, and returns their number. Returns the number of recorded events if
+// `events` is null.
+int NvtxPluginsRecorderSnapshot(NvtxPluginsRecordedEvent* events,
+                                int max_events);
+
+// The NVTX C API is exported with a NvtxPlugins_ prefix, e.g.
+// NvtxPlugins_nvtxRangePushEx, see nvtx_runtime.cc. It is loaded with ctypes
+// by nvtx.plugins.tf.native.
+
+}
+
+#endif  // NVTX_PLUGINS_CC_NVTX_RUNTIME_H_
@@ -0,0 +1,191 @@
+/*
+Copyright (c) 2019, NVIDIA CORPORATION. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+*/
+
+// XLA lowering of NvtxStartV2 and NvtxEndV2.
+//
+// The ops are lowered to side-effecting custom calls so that functions with
+// NVTX ranges can be compiled with XLA without splitting the clusters. The
+// XLA symbols are resolved at load time against the TensorFlow python
+// extension, which is loaded with RTLD_GLOBAL.
+
+#ifdef NVTX_PLUGINS_WITH_XLA
+
+#include <cstring>
+#include <string>
+#include <vector>
+
+#include "tensorflow/compiler/tf2xla/xla_op_kernel.h"
+#include "tensorflow/compiler/tf2xla/xla_op_registry.h"
+
+#if __has_include("xla/client/xla_builder.h")
+#include "xla/client/xla_builder.h"
+#include "xla/service/custom_call_target_registry.h"
+#include "xla/shape_util.h"
+#else
+#include "tensorflow/compiler/xla/client/xla_builder.h"
+#include "tensorflow/compiler/xla/service/custom_call_target_registry.h"
+#include "tensorflow/compiler/xla/shape_util.h"
+#endif
+
+#ifdef HAVE_CUDA
+#include <cuda_runtime.h>
+#endif
+
+#include "nvtx_runtime.h"
+
+namespace {
+
+// Host custom calls: the message and domain name are passed as NUL
+// terminated u8 operands, the marker id and domain handle are returned.
+void NvtxRangeStartHost(void* out, const void** in) {
+  const char* message = reinterpret_cast<const char*>(in[1]);
+  const char* domain_name = reinterpret_cast<const char*>(in[2]);
+
+  int64_t domain_handle;
+  uint64_t marker_id = nvtx_plugins::StartRange(message, domain_name,
+                                                &domain_handle);
+
+  int64_t* output = reinterpret_cast<int64_t*>(out);
+  output[0] = marker_id;
+  output[1] = domain_handle;
+}
+
+void NvtxRangeEndHost(void* out, const void** in) {
+  nvtx_plugins::EndRange(*reinterpret_cast<const int64_t*>(in[1]),
+                         *reinterpret_cast<const int64_t*>(in[2]));
+  *reinterpret_cast<int64_t*>(out) = 0;
+}
+
+XLA_REGISTER_CUSTOM_CALL_TARGET_WITH_SYM("NvtxPluginsRangeStart",
+                                         NvtxRangeStartHost, "Host");
+XLA_REGISTER_CUSTOM_CALL_TARGET_WITH_SYM("NvtxPluginsRangeEnd",
+                                         NvtxRangeEndHost, "Host");
+
+#ifdef HAVE_CUDA
+// GPU custom calls run on the host when the computation is enqueued and can
+// not read device buffers, the ranges are pushed and popped using the names
+// passed in `opaque` and the outputs are zeroed.
+void NvtxRangeStartGpu(cudaStream_t stream, void** buffers,
+                       const char* opaque, size_t opaque_len) {
+  const std::string domain_name(opaque);
+  const std::string message(opaque + domain_name.size() + 1,
+                            opaque_len - domain_name.size() - 1);
+
+  nvtx_plugins::PushRange(message, domain_name);
+  cudaMemsetAsync(buffers[3], 0, 2 * sizeof(int64_t), stream);
+}
+
+void NvtxRangeEndGpu(cudaStream_t stream, void** buffers,
+                     const char* opaque, size_t opaque_len) {
+  nvtx_plugins::PopRange(std::string(opaque, opaque_len));
+  cudaMemsetAsync(buffers[3], 0, sizeof(int64_t), stream);
+}
+
+XLA_REGISTER_CUSTOM_CALL_TARGET_WITH_SYM("NvtxPluginsRangeStart",
+                                         NvtxRangeStartGpu, "CUDA");
+XLA_REGISTER_CUSTOM_CALL_TARGET_WITH_SYM("NvtxPluginsRangeEnd",
+                                         NvtxRangeEndGpu, "CUDA");
+#endif
+
+xla::XlaOp StringOperand(xla::XlaBuilder* builder, const std::string& value) {
+  std::vector<uint8_t> bytes(value.begin(), value.end());
+  bytes.push_back(0);
+  return xla::ConstantR1<uint8_t>(builder, bytes);
+}
+
+}  // namespace
+
+namespace tensorflow {
+
+class NvtxStartXlaOp : public XlaOpKernel {
+ public:
+  explicit NvtxStartXlaOp(OpKernelConstruction* context)
+      : XlaOpKernel(context) {
+    OP_REQUIRES_OK(context, context->GetAttr("message", &message_));
+    OP_REQUIRES_OK(context, context->GetAttr("domain_name", &domain_name_));
+  }
+
+  void Compile(XlaOpKernelContext* context) override {
+    xla::XlaBuilder* builder = context->builder();
+    xla::XlaOp input = context->Input(0);
+
+    std::string opaque = domain_name_;
+    opaque.push_back('\0');
+    opaque += message_;
+
+    xla::XlaOp range = xla::CustomCall(
+        builder, "NvtxPluginsRangeStart",
+        {input, StringOperand(builder, message_),
+         StringOperand(builder, domain_name_)},
+        xla::ShapeUtil::MakeShape(xla::S64, {2}), opaque,
+        /*has_side_effect=*/true);
+
+    // The consumers of the output must wait for the range to be opened
+    xla::XlaOp barrier = xla::OptimizationBarrier(
+        xla::Tuple(builder, {input, range}));
+    xla::XlaOp ids = xla::GetTupleElement(barrier, 1);
+
+    context->SetOutput(0, xla::GetTupleElement(barrier, 0));
+    context->SetOutput(1, xla::Reshape(xla::SliceInDim(ids, 0, 1, 1, 0), {}));
+    context->SetOutput(2, xla::Reshape(xla::SliceInDim(ids, 1, 2, 1, 0), {}));
+  }
+
+ private:
+  std::string message_;
+  std::string domain_name_;
+};
+
+class NvtxEndXlaOp : public XlaOpKernel {
+ public:
+  explicit NvtxEndXlaOp(OpKernelConstruction* context)
+      : XlaOpKernel(context) {
+    OP_REQUIRES_OK(context, context->GetAttr("domain_name", &domain_name_));
+  }
+
+  void Compile(XlaOpKernelContext* context) override {
+    xla::XlaBuilder* builder = context->builder();
+    xla::XlaOp input = context->Input(0);
+
+    xla::XlaOp done = xla::CustomCall(
+        builder, "NvtxPluginsRangeEnd",
+        {input, context->Input(1), context->Input(2)},
+        xla::ShapeUtil::MakeShape(xla::S64, {}), domain_name_,
+        /*has_side_effect=*/true);
+
+    // The consumers of the output must wait for the range to be closed
+    xla::XlaOp barrier = xla::OptimizationBarrier(
+        xla::Tuple(builder, {input, done}));
+
+    context->SetOutput(0, xla::GetTupleElement(barrier, 0));
+    context->SetOutput(1, xla::ConstantR0<float>(builder, 0.f));
+  }
+
+ private:
+  std::string domain_name_;
+};
+
+#ifdef HAVE_CUDA
+REGISTER_XLA_OP(Name("NvtxStartV2"), NvtxStartXlaOp);
+REGISTER_XLA_OP(Name("NvtxEndV2"), NvtxEndXlaOp);
+#else
+REGISTER_XLA_OP(Name("NvtxStartV2").Device(DEVICE_CPU_XLA_JIT),
+                NvtxStartXlaOp);
+REGISTER_XLA_OP(Name("NvtxEndV2").Device(DEVICE_CPU_XLA_JIT), NvtxEndXlaOp);
+#endif
+
+}  // namespace tensorflow
+
+#endif  // NVTX_PLUGINS_WITH_XLA
@@ -30,6 +30,50 @@ from .package_info import __description__
 from .package_info import __license__
 from .package_info import __keywords__
 
-import nvtx.plugins.tf.ops
-import nvtx.plugins.tf.estimator
-import nvtx.plugins.tf.keras
+import importlib
+import sys
+
+# The submodules load TensorFlow, the op library and the Estimator API, they
+# are imported on first access to keep `import nvtx.plugins.tf` cheap.
+_SUBMODULES = frozenset([
+    'base_callbacks', 'checkpoints', 'collectives', 'control', 'counters',
+    'debug', 'distributed', 'estimator', 'ext_utils', 'flight_recorder',
+    'keras', 'naming', 'native', 'ops', 'ranges', 'serving', 'strip',
+    'tail_latency', 'tools',
+])
+
+_ATTRIBUTES = {
+    'counter': 'counters',
+    'mark': 'ranges',
+    'range': 'ranges',
+}
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module('.' + name, __name__)
+
+    if name in _ATTRIBUTES:
+        module = importlib.import_module('.' + _ATTRIBUTES[name], __name__)
+        value = getattr(module, name)
+        # Cache the attribute, later lookups do not go through __getattr__
+        globals()[name] = value
+        return value
+
+    raise AttributeError(
+        "module '%s' has no attribute '%s'" % (__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | _SUBMODULES | set(_ATTRIBUTES))
+
+
+if sys.version_info < (3, 7):
+    # Module level __getattr__ (PEP 562) requires python 3.7
+    import nvtx.plugins.tf.ops
+    import nvtx.plugins.tf.estimator
+    import nvtx.plugins.tf.keras
+
+    from nvtx.plugins.tf.counters import counter
+    from nvtx.plugins.tf.ranges import mark
+    from nvtx.plugins.tf.ranges import range
@@ -15,26 +15,96 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import ctypes
+from nvtx.plugins.tf import control
+from nvtx.plugins.tf import debug as nvtx_debug
+from nvtx.plugins.tf import flight_recorder
+from nvtx.plugins.tf.counters import COUNTERS_DOMAIN_NAME
+from nvtx.plugins.tf.distributed import rank_domain_name
+from nvtx.plugins.tf.distributed import should_emit
+from nvtx.plugins.tf.native import get_libnvtx
 
-# TODO(ahmadki): support domain names
 # TODO(ahmadki): move nvtx functionality to nvtx.plugins module ?
 
+# Message prefix of the markers used to align the clocks of several processes
+SYNC_MARKER_PREFIX = 'nvtx_plugins sync '
+
 
 class BaseCallback(object):
-    def __init__(self):
-        # TODO(ahmadki): try except OSError
-        self.libnvtx = ctypes.cdll.LoadLibrary('libnvToolsExt.so')
+    def __init__(self, domain_name=None, sync_every_n_steps=0, debug=None):
+        # A no-op library if libnvToolsExt is missing
+        self.libnvtx = get_libnvtx()
+        self.domain_name = rank_domain_name(domain_name or '')
+        self.domain_handle = self.libnvtx.domain(self.domain_name)
+        self.counters_domain_name = rank_domain_name(COUNTERS_DOMAIN_NAME)
+        self.counters_domain_handle = self.libnvtx.domain(
+            self.counters_domain_name)
         self.marker_ids = {}
+        self.sync_every_n_steps = sync_every_n_steps
+
+        if debug is None:
+            debug = nvtx_debug.is_enabled()
+        self.range_tracker = nvtx_debug.RangeTracker() if debug else None
 
-    def open_marker(self, message):
+    def open_marker(self, message, detailed=False):
+        if not self.libnvtx.available or (detailed and not should_emit()):
+            return
+        if self.range_tracker is not None:
+            self.range_tracker.open(message, self.domain_name)
         if self.marker_ids.get(message, None) is None:
             self.marker_ids[message] = []
-        marker = self.libnvtx.nvtxRangeStartW(message)
+        # Ranges disabled by the live control are closed as no-ops
+        marker = None
+        if control.should_emit(self.domain_name, detailed):
+            flight_recorder.record('B', message, self.domain_name)
+            marker = self.libnvtx.start(message, self.domain_handle)
         self.marker_ids[message].append(marker)
 
-    def close_marker(self, message):
+    def close_marker(self, message, detailed=False):
+        if not self.libnvtx.available or (detailed and not should_emit()):
+            return
+        if self.range_tracker is not None:
+            self.range_tracker.close(message, self.domain_name)
         if self.marker_ids.get(message, None) is not None:
-            self.libnvtx.nvtxRangeEnd(self.marker_ids[message].pop())
+            marker = self.marker_ids[message].pop()
+            if marker is not None:
+                flight_recorder.record('E', message, self.domain_name)
+                self.libnvtx.end(marker, self.domain_handle)
             if len(self.marker_ids[message]) == 0:
                 del self.marker_ids[message]
+
+    def mark(self, message, payload=None, detailed=False):
+        """Marks an instantaneous event, e.g. a checkpoint or an epoch
+        metric, ``payload`` is an optional integer or floating point
+        number."""
+        if not self.libnvtx.available or (detailed and not should_emit()) or \
+                not control.should_emit(self.domain_name, detailed):
+            return
+        flight_recorder.record('i', message, self.domain_name)
+        self.libnvtx.mark(message, self.domain_handle, payload=payload)
+
+    def counter(self, name, value):
+        """Emits a sample of the counter ``name``, see
+        :mod:`nvtx.plugins.tf.counters`. Samples are taken every step, they
+        are detailed events."""
+        if not self.libnvtx.available or not should_emit() or \
+                not control.should_emit(self.counters_domain_name,
+                                        detailed=True):
+            return
+        self.libnvtx.mark(name, self.counters_domain_handle,
+                          payload=float(value))
+
+    def sync_marker(self, step, num_steps=1):
+        """Marks the end of a synchronous step, used to align the clocks of
+        the processes of a distributed job when merging their traces.
+
+        ``num_steps`` is the number of steps that ran since the previous
+        call, e.g. with Keras ``steps_per_execution``."""
+        n = self.sync_every_n_steps if self.libnvtx.available else 0
+        if n and step // n > (step - num_steps) // n:
+            self.libnvtx.mark(SYNC_MARKER_PREFIX + str(step))
+
+    def check_ranges(self):
+        """Raises a ``RuntimeError`` if debug mode is enabled and leaked,
+        unknown or mismatched ranges were found."""
+        if self.range_tracker is not None:
+            nvtx_debug.check_ranges(self.range_tracker)
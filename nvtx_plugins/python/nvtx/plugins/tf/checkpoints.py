@@ -0,0 +1,246 @@
+# ! /usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2019, NVIDIA CORPORATION. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""NVTX ranges around checkpoint writes.
+"""
+
+import functools
+import threading
+import warnings
+
+import tensorflow as tf
+
+from tensorflow.python.framework.func_graph import FuncGraph
+
+from nvtx.plugins.tf.counters import COUNTERS_DOMAIN_NAME
+from nvtx.plugins.tf.distributed import rank_domain_name
+from nvtx.plugins.tf.native import get_libnvtx
+
+__all__ = ['DEFAULT_DOMAIN_NAME', 'trace_checkpoints', 'untrace_checkpoints']
+
+
+DEFAULT_DOMAIN_NAME = 'Checkpoints'
+
+# Counter sample of the number of bytes of a checkpoint
+BYTES_COUNTER_NAME = 'checkpoint bytes'
+
+# (class, method name) -> original method, while the checkpoints are traced
+_originals = {}
+
+# The checkpoint being written by this thread, its phases are added to it
+_current = threading.local()
+
+
+def _multi_device_saver_class():
+    """Returns the private class writing the files of ``tf.train.Checkpoint``,
+    ``None`` if it is not found."""
+    try:
+        from tensorflow.python.checkpoint import functional_saver
+    except ImportError:
+        try:
+            from tensorflow.python.training.saving import functional_saver
+        except ImportError:
+            return None
+    return getattr(functional_saver, 'MultiDeviceSaver', None)
+
+
+def _checkpoint_bytes(file_prefix):
+    """Returns the size of the files of a checkpoint, ``None`` if unknown."""
+    if file_prefix is None:
+        return None
+    if isinstance(file_prefix, tf.Tensor):
+        if not tf.executing_eagerly():
+            return None
+        file_prefix = file_prefix.numpy()
+    if isinstance(file_prefix, bytes):
+        file_prefix = file_prefix.decode('utf-8')
+
+    # The files are named <prefix>.index and <prefix>.data-*, the files of
+    # other checkpoints in the same directory, e.g. ckpt-10, are not matched
+    try:
+        return sum(tf.io.gfile.stat(path).length
+                   for path in tf.io.gfile.glob(file_prefix + '.*'))
+    except tf.errors.OpError:
+        return None
+
+
+class _CheckpointRange(object):
+    """The range of a checkpoint and of the phase it is in.
+
+    The phases are consecutive ranges, not nested in each other, a phase ends
+    when the next one starts."""
+
+    def __init__(self, message, libnvtx, domain_handle):
+        self.message = message
+        self.libnvtx = libnvtx
+        self.domain_handle = domain_handle
+        self._phase_id = None
+
+    def phase(self, message):
+        self.end_phase()
+        self._phase_id = self.libnvtx.start(message, self.domain_handle)
+
+    def end_phase(self):
+        if self._phase_id is not None:
+            self.libnvtx.end(self._phase_id, self.domain_handle)
+            self._phase_id = None
+
+
+def _traced(method, message, domain_name, first_phase, file_prefix):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        libnvtx = get_libnvtx()
+        if not libnvtx.available or \
+                isinstance(tf.compat.v1.get_default_graph(), FuncGraph):
+            return method(*args, **kwargs)
+
+        # e.g. a Checkpoint range in a ModelCheckpoint range, but not in
+        # another Checkpoint range when save calls write
+        parent = getattr(_current, 'checkpoint', None)
+        if parent is not None and parent.message == message:
+            return method(*args, **kwargs)
+        domain_handle = libnvtx.domain(rank_domain_name(domain_name))
+        checkpoint = _CheckpointRange(message, libnvtx, domain_handle)
+        _current.checkpoint = checkpoint
+        libnvtx.push(message, domain_handle)
+        try:
+            if first_phase:
+                checkpoint.phase(first_phase)
+            outputs = method(*args, **kwargs)
+            checkpoint.end_phase()
+
+            num_bytes = _checkpoint_bytes(file_prefix(outputs))
+            if num_bytes is not None:
+                libnvtx.mark(
+                    BYTES_COUNTER_NAME,
+                    libnvtx.domain(rank_domain_name(COUNTERS_DOMAIN_NAME)),
+                    payload=float(num_bytes))
+            return outputs
+        finally:
+            checkpoint.end_phase()
+            libnvtx.pop(domain_handle)
+            _current.checkpoint = parent
+
+    return wrapper
+
+
+def _phase(method, message):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        checkpoint = getattr(_current, 'checkpoint', None)
+        if checkpoint is None:
+            return method(*args, **kwargs)
+
+        checkpoint.phase(message)
+        try:
+            return method(*args, **kwargs)
+        finally:
+            checkpoint.end_phase()
+
+    return wrapper
+
+
+def _returned_prefix(outputs):
+    return outputs
+
+
+def _no_prefix(outputs):
+    return None
+
+
+def _patch(cls, method_name, wrap, description):
+    method = None if cls is None else cls.__dict__.get(method_name)
+    if method is None:
+        warnings.warn('%s can not be traced with this version of TensorFlow'
+                      % description, RuntimeWarning)
+        return
+    if (cls, method_name) in _originals:
+        return
+    _originals[(cls, method_name)] = method
+    setattr(cls, method_name, wrap(method))
+
+
+def trace_checkpoints(domain_name=DEFAULT_DOMAIN_NAME):
+    """Wraps the checkpoint writes in NVTX ranges.
+
+    The following writes are traced:
+
+        - ``tf.train.Checkpoint.write`` and ``save`` in a ``Checkpoint``
+          range split in a ``serialize`` phase, gathering the values to save,
+          and a ``write`` phase, writing the files.
+        - ``tf.compat.v1.train.Saver.save``, used by the Estimator API, in a
+          ``Saver`` range split in a ``write`` phase and a ``serialize`` phase
+          exporting the meta graph.
+        - The saves of ``tf.keras.callbacks.ModelCheckpoint`` in a
+          ``ModelCheckpoint`` range.
+
+    NVTX ranges take their payload when they start, the number of bytes of a
+    checkpoint is only known once it is written. The size of the files of the
+    checkpoint is emitted as a ``checkpoint bytes`` sample in the
+    ``Counters`` domain, see :mod:`nvtx.plugins.tf.counters`, before the
+    range closes.
+
+    Note:
+        Checkpoints written inside a ``tf.function`` are not traced. The
+        phases of the ``Checkpoint`` range and the ``ModelCheckpoint`` range
+        rely on TensorFlow internals, a ``RuntimeWarning`` is issued when
+        they are not found and the range is left out.
+
+    Example:
+        .. highlight:: python
+        .. code-block:: python
+
+            nvtx.plugins.tf.checkpoints.trace_checkpoints()
+            model.fit(dataset, callbacks=[
+                NVTXCallback(), tf.keras.callbacks.ModelCheckpoint(path)])
+
+    Arguments:
+        domain_name: An optional ``string`` domain name of the ranges.
+            Defaults to ``Checkpoints``.
+
+    """
+    if not get_libnvtx().available:
+        return
+    domain_name = domain_name or ''
+
+    for method_name in ('write', 'save'):
+        _patch(tf.train.Checkpoint, method_name, lambda method: _traced(
+            method, 'Checkpoint', domain_name, 'serialize', _returned_prefix),
+            'tf.train.Checkpoint.%s' % method_name)
+    _patch(_multi_device_saver_class(), 'save',
+           lambda method: _phase(method, 'write'),
+           'The write phase of tf.train.Checkpoint')
+
+    _patch(tf.compat.v1.train.Saver, 'save', lambda method: _traced(
+        method, 'Saver', domain_name, 'write', _returned_prefix),
+        'tf.compat.v1.train.Saver.save')
+    _patch(tf.compat.v1.train.Saver, 'export_meta_graph',
+           lambda method: _phase(method, 'serialize'),
+           'The serialize phase of tf.compat.v1.train.Saver')
+
+    _patch(tf.keras.callbacks.ModelCheckpoint, '_save_model',
+           lambda method: _traced(method, 'ModelCheckpoint', domain_name,
+                                  None, _no_prefix),
+           'tf.keras.callbacks.ModelCheckpoint')
+
+
+def untrace_checkpoints():
+    """Removes the ranges added by :func:`trace_checkpoints
+    <trace_checkpoints>`."""
+    for (cls, method_name), method in _originals.items():
+        setattr(cls, method_name, method)
+    _originals.clear()
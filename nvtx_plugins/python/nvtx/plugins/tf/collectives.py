@@ -0,0 +1,250 @@
+# ! /usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2019, NVIDIA CORPORATION. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""NVTX ranges around the collectives of ``tf.distribute`` strategies.
+"""
+
+import functools
+import threading
+
+import tensorflow as tf
+
+from tensorflow.python.framework.func_graph import FuncGraph
+
+from nvtx.plugins.tf import ops as nvtx_ops
+from nvtx.plugins.tf.distributed import rank_domain_name
+from nvtx.plugins.tf.distributed import should_emit
+from nvtx.plugins.tf.native import get_libnvtx
+
+__all__ = ['DEFAULT_DOMAIN_NAME', 'trace_collectives', 'untrace_collectives']
+
+
+DEFAULT_DOMAIN_NAME = 'Collectives'
+
+# Holds the original methods of a traced strategy.extended object
+_ORIGINALS_ATTR = '_nvtx_plugins_collectives'
+
+# Collectives can be implemented on top of each other, only the outermost one
+# opens a range
+_nesting = threading.local()
+
+
+def _reduce_op_name(reduce_op):
+    return str(getattr(reduce_op, 'value', reduce_op))
+
+
+def _describe_reduce(reduce_op, value, *args, **kwargs):
+    return 'AllReduce %s' % _reduce_op_name(reduce_op), [value]
+
+
+def _describe_batch_reduce(reduce_op, value_destination_pairs,
+                           *args, **kwargs):
+    values = [value for value, _ in value_destination_pairs]
+    message = 'AllReduce %s (%d tensors)' % (_reduce_op_name(reduce_op),
+                                             len(values))
+    return message, values
+
+
+def _describe_broadcast(tensor, *args, **kwargs):
+    return 'Broadcast', [tensor]
+
+
+# Methods of ``strategy.extended`` every cross-replica reduction and broadcast
+# goes through, including ``ReplicaContext.all_reduce`` and the gradient
+# aggregation of the optimizers.
+_COLLECTIVES = (
+    ('_reduce_to', _describe_reduce),
+    ('_batch_reduce_to', _describe_batch_reduce),
+    ('_broadcast_to', _describe_broadcast),
+)
+
+
+def _local_components(strategy, values):
+    components = []
+    for value in tf.nest.flatten(values):
+        for component in strategy.experimental_local_results(value):
+            if isinstance(component, tf.IndexedSlices):
+                component = component.values
+            components.append(component)
+    return components
+
+
+def _replica_bytes(strategy, values):
+    """Returns the number of bytes one replica contributes to the collective.
+    """
+    num_bytes = 0
+    dynamic_sizes = []
+    for value in values:
+        components = _local_components(strategy, value)
+        if not components or not hasattr(components[0], 'dtype'):
+            continue
+
+        component = components[0]
+        if component.shape.is_fully_defined():
+            num_bytes += component.shape.num_elements() * component.dtype.size
+        else:
+            dynamic_sizes.append(
+                tf.size(component, out_type=tf.int64) * component.dtype.size)
+
+    if dynamic_sizes:
+        return tf.add_n(dynamic_sizes) + num_bytes
+    return num_bytes
+
+
+def _trace_eagerly(method, message, domain_name, num_bytes, args, kwargs):
+    libnvtx = get_libnvtx()
+    domain_handle = libnvtx.domain(rank_domain_name(domain_name))
+    libnvtx.push(message, domain_handle, payload=num_bytes)
+    try:
+        return method(*args, **kwargs)
+    finally:
+        libnvtx.pop(domain_handle)
+
+
+def _trace_graph(strategy, method, message, domain_name, values, num_bytes,
+                 args, kwargs):
+    graph = tf.compat.v1.get_default_graph()
+
+    # The range opens once the inputs are ready and the collective starts
+    # after the range is opened. The first input is passed through the range
+    # rather than a constant, the start op can't run ahead of it.
+    inputs = [t for t in _local_components(strategy, values)
+              if isinstance(t, tf.Tensor)]
+    with graph.control_dependencies(inputs[1:]):
+        token, nvtx_context = nvtx_ops.start(
+            inputs[0] if inputs else tf.constant(0.), message=message,
+            domain_name=domain_name, payload=num_bytes)
+    if nvtx_context is None:
+        return method(*args, **kwargs)
+
+    with graph.control_dependencies([nvtx_context[0]]):
+        outputs = method(*args, **kwargs)
+
+    # The range is closed once the results are available
+    results = [t for t in _local_components(strategy, outputs)
+               if isinstance(t, tf.Tensor)]
+    with graph.control_dependencies(results):
+        token = nvtx_ops.end(token, nvtx_context)
+
+    # Nothing consumes the closing op, make sure it is not pruned
+    graph.control_outputs.append(token.op)
+    return outputs
+
+
+def _traced(strategy, method, describe, domain_name):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        graph_mode = not tf.executing_eagerly()
+        if getattr(_nesting, 'active', False) or not should_emit() or \
+                (graph_mode and not isinstance(
+                    tf.compat.v1.get_default_graph(), FuncGraph)):
+            return method(*args, **kwargs)
+
+        message, values = describe(*args, **kwargs)
+        num_bytes = _replica_bytes(strategy, values)
+
+        _nesting.active = True
+        try:
+            if graph_mode:
+                return _trace_graph(strategy, method, message, domain_name,
+                                    values, num_bytes, args, kwargs)
+            return _trace_eagerly(method, message, domain_name, num_bytes,
+                                  args, kwargs)
+        finally:
+            _nesting.active = False
+
+    return wrapper
+
+
+def trace_collectives(strategy=None, domain_name=DEFAULT_DOMAIN_NAME):
+    """Wraps the cross-replica reductions and broadcasts of a
+    ``tf.distribute`` strategy in NVTX ranges.
+
+    The ranges are named after the collective, e.g. ``AllReduce SUM (12
+    tensors)``, and carry the number of bytes contributed by one replica as
+    an ``int64`` payload. In a ``tf.function`` the range opens when the
+    inputs of the collective are ready and closes when its results are
+    available, so the overlap of communication and computation shows up on
+    the timeline.
+
+    Note:
+        The collectives are traced eagerly and inside ``tf.function``, TF1
+        graphs are not supported.
+
+    Example:
+        .. highlight:: python
+        .. code-block:: python
+
+            strategy = tf.distribute.MirroredStrategy()
+            nvtx.plugins.tf.collectives.trace_collectives(strategy)
+
+            with strategy.scope():
+                model = create_model()
+            model.fit(dataset, callbacks=[NVTXCallback()])
+
+    Arguments:
+        strategy: An optional ``tf.distribute.Strategy``. If not provided the
+            current strategy is used.
+        domain_name: An optional ``string`` domain name of the ranges.
+            Defaults to ``Collectives``.
+
+    Returns:
+        The traced strategy.
+
+    """
+    strategy = strategy or tf.distribute.get_strategy()
+    extended = strategy.extended
+    if getattr(extended, _ORIGINALS_ATTR, None) is not None:
+        return strategy
+    if not nvtx_ops.is_available() and not get_libnvtx().available:
+        return strategy
+
+    originals = {}
+    for method_name, describe in _COLLECTIVES:
+        method = getattr(extended, method_name, None)
+        if method is None:
+            continue
+        originals[method_name] = method
+        setattr(extended, method_name,
+                _traced(strategy, method, describe, domain_name or ''))
+
+    setattr(extended, _ORIGINALS_ATTR, originals)
+    return strategy
+
+
+def untrace_collectives(strategy=None):
+    """Removes the ranges added by :func:`trace_collectives
+    <trace_collectives>`.
+
+    Note:
+        Functions traced while the collectives were wrapped keep their
+        ranges.
+
+    Arguments:
+        strategy: An optional ``tf.distribute.Strategy``. If not provided the
+            current strategy is used.
+
+    """
+    strategy = strategy or tf.distribute.get_strategy()
+    extended = strategy.extended
+    originals = getattr(extended, _ORIGINALS_ATTR, None)
+    if originals is None:
+        return
+
+    for method_name in originals:
+        delattr(extended, method_name)
+    delattr(extended, _ORIGINALS_ATTR)
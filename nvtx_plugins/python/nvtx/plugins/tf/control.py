@@ -0,0 +1,429 @@
+# ! /usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2019, NVIDIA CORPORATION. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Live control of the tracing of a running process.
+
+The tracing is controlled with one command per line, sent to a Unix domain
+socket or written to a watched control file:
+
+    - ``enable`` and ``disable``: enables or disables all the ranges.
+    - ``sample N``: emits the detailed ranges, e.g. the batch ranges and the
+      ranges of the ops, every ``N`` steps only. ``sample 1`` emits them
+      every step.
+    - ``domain NAME on`` and ``domain NAME off``: enables or disables the
+      ranges of a domain, quote names with spaces and use ``""`` for the
+      default domain.
+    - ``dump [PATH]``: dumps the flight recorder, see
+      :mod:`nvtx.plugins.tf.flight_recorder`.
+    - ``status``: returns the current state.
+
+Ranges that are open when their tracing is disabled are still closed.
+"""
+
+import ctypes
+import os
+import shlex
+import socket
+import stat
+import sys
+import threading
+import warnings
+
+from nvtx.plugins.tf.distributed import rank_domain_name
+
+__all__ = ['set_tracing', 'is_tracing', 'set_sampling', 'set_domain_enabled',
+           'should_emit', 'begin_step', 'execute', 'start', 'stop']
+
+
+# Interval between two checks of the control file and of the stop request of
+# the socket server, in seconds
+_POLL_INTERVAL = 0.5
+
+_state = {
+    'tracing': True,
+    'sample_every_n_steps': 1,
+    'step_sampled': True,
+    'disabled_domains': frozenset(),
+}
+_lock = threading.Lock()
+
+# State of the switches of the op library, None until they are set
+_op_state = {
+    'tracing': None,
+    'disabled_domains': frozenset(),
+}
+
+_channels = []
+
+_op_runtime = None
+
+
+def _get_op_runtime():
+    global _op_runtime
+
+    if _op_runtime is None:
+        # Loaded on first use, ext_utils imports TensorFlow
+        from nvtx.plugins.tf.ext_utils import load_ctypes_library
+        from nvtx.plugins.tf.ext_utils import get_ext_suffix
+
+        _op_runtime = load_ctypes_library('lib/nvtx_ops' + get_ext_suffix())
+        _op_runtime.NvtxPluginsSetTracing.argtypes = [ctypes.c_int]
+        _op_runtime.NvtxPluginsSetDomainEnabled.argtypes = [ctypes.c_char_p,
+                                                            ctypes.c_int]
+
+    return _op_runtime
+
+
+def _op_library_loaded():
+    ops = sys.modules.get('nvtx.plugins.tf.ops')
+    return ops is not None and ops.nvtx_tf_ops is not None
+
+
+def _sync_op_library():
+    """Feeds the state into the switches of the op library, only the
+    switches that changed are set."""
+    if not _op_library_loaded():
+        return
+
+    with _lock:
+        tracing = _state['tracing'] and _state['step_sampled']
+        disabled_domains = _state['disabled_domains']
+
+        # Until a switch is used the ops only pay for an atomic load
+        if _op_state['tracing'] is None and tracing and not disabled_domains:
+            return
+
+        runtime = _get_op_runtime()
+        if tracing != _op_state['tracing']:
+            runtime.NvtxPluginsSetTracing(int(tracing))
+            _op_state['tracing'] = tracing
+        for domain_name in disabled_domains ^ _op_state['disabled_domains']:
+            runtime.NvtxPluginsSetDomainEnabled(
+                domain_name.encode('utf-8'),
+                int(domain_name not in disabled_domains))
+        _op_state['disabled_domains'] = disabled_domains
+
+
+def set_tracing(enabled):
+    """Enables or disables all the NVTX ranges of the process.
+
+    Arguments:
+        enabled: ``bool``, if ``False`` no new range is opened by the ops,
+            layers and callbacks.
+
+    """
+    _state['tracing'] = bool(enabled)
+    _sync_op_library()
+
+
+def is_tracing():
+    """Returns ``True`` if the tracing is enabled."""
+    return _state['tracing']
+
+
+def set_sampling(every_n_steps):
+    """Emits the detailed ranges every ``every_n_steps`` steps only.
+
+    The steps are counted by the callbacks and hooks, see :func:`begin_step
+    <begin_step>`.
+
+    Arguments:
+        every_n_steps: ``int``, 1 to emit the detailed ranges every step.
+
+    Raises:
+        ValueError: If ``every_n_steps`` is not positive.
+
+    """
+    every_n_steps = int(every_n_steps)
+    if every_n_steps < 1:
+        raise ValueError('The sampling rate must be positive, got %s'
+                         % every_n_steps)
+    _state['sample_every_n_steps'] = every_n_steps
+
+
+def set_domain_enabled(domain_name, enabled):
+    """Enables or disables the NVTX ranges of a domain.
+
+    Arguments:
+        domain_name: ``string``, the domain name, the empty string for the
+            default domain. The rank is added to the name if enabled by the
+            rank policy, see :mod:`nvtx.plugins.tf.distributed`.
+        enabled: ``bool``, if ``False`` no new range is opened in the domain.
+
+    """
+    domain_name = rank_domain_name(domain_name or '')
+    with _lock:
+        if enabled:
+            _state['disabled_domains'] -= {domain_name}
+        else:
+            _state['disabled_domains'] |= {domain_name}
+    _sync_op_library()
+
+
+def should_emit(domain_name='', detailed=False):
+    """Returns ``True`` if a range of ``domain_name`` should be opened.
+
+    Arguments:
+        domain_name: ``string``, the domain name labeled with the rank.
+        detailed: ``bool``, ``True`` for the ranges of every step, which are
+            sampled.
+
+    """
+    return (_state['tracing'] and
+            (not detailed or _state['step_sampled']) and
+            domain_name not in _state['disabled_domains'])
+
+
+def begin_step(step):
+    """Called by the callbacks and hooks at the beginning of a step, decides
+    if the detailed ranges of the step are emitted."""
+    _state['step_sampled'] = step % _state['sample_every_n_steps'] == 0
+    _sync_op_library()
+
+
+def _status():
+    domains = ' '.join(shlex.quote(domain_name)
+                       for domain_name in sorted(_state['disabled_domains']))
+    return 'tracing {}, sample every {} steps, disabled domains: {}'.format(
+        'on' if _state['tracing'] else 'off', _state['sample_every_n_steps'],
+        domains or 'none')
+
+
+def execute(command):
+    """Executes a control command, see :mod:`nvtx.plugins.tf.control`.
+
+    Example:
+        .. highlight:: python
+        .. code-block:: python
+
+            nvtx.plugins.tf.control.execute('domain "Input pipeline" off')
+
+    Arguments:
+        command: ``string``, the command.
+
+    Returns:
+        The ``string`` result of the command.
+
+    Raises:
+        ValueError: If the command is invalid.
+
+    """
+    args = shlex.split(command)
+    if not args:
+        raise ValueError('Empty control command')
+    name, args = args[0], args[1:]
+
+    if name in ('enable', 'disable') and not args:
+        set_tracing(name == 'enable')
+    elif name == 'sample' and len(args) == 1:
+        try:
+            set_sampling(args[0])
+        except ValueError:
+            raise ValueError('Invalid sampling rate: %s' % args[0])
+    elif name == 'domain' and len(args) == 2 and args[1] in ('on', 'off'):
+        set_domain_enabled(args[0], args[1] == 'on')
+    elif name == 'dump' and len(args) <= 1:
+        from nvtx.plugins.tf import flight_recorder
+
+        path = flight_recorder.dump(*args)
+        if path is None:
+            raise ValueError('The flight recorder is not enabled')
+        return 'dumped ' + path
+    elif name != 'status' or args:
+        raise ValueError('Invalid control command: %s' % command)
+    return _status()
+
+
+def _execute_line(line):
+    try:
+        return 'ok ' + execute(line)
+    except ValueError as e:
+        return 'error ' + str(e)
+
+
+def _remove_stale_socket(path):
+    """Removes the socket file left at ``path`` by a process that exited
+    without closing it.
+
+    Raises:
+        RuntimeError: If a server still accepts connections on ``path``.
+
+    """
+    try:
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            return
+    except OSError:
+        return
+
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except ConnectionRefusedError:
+        os.unlink(path)
+        return
+    except OSError:
+        return
+    finally:
+        probe.close()
+    raise RuntimeError('The control socket %s is used by another process'
+                       % path)
+
+
+class _SocketServer(object):
+    """Executes the commands of the clients of a Unix domain socket, one
+    result line per command."""
+
+    def __init__(self, path):
+        self.path = path
+        self._stop = threading.Event()
+        _remove_stale_socket(path)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.bind(path)
+        # The dump command writes files, only the owner of the process may
+        # connect. No client can connect before listen is called.
+        os.chmod(path, stat.S_IRUSR | stat.S_IWUSR)
+        self._socket.listen(1)
+        self._socket.settimeout(_POLL_INTERVAL)
+        self._thread = threading.Thread(target=self._serve,
+                                        name='nvtx-control-socket')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _serve(self):
+        while not self._stop.is_set():
+            try:
+                connection, _ = self._socket.accept()
+            except socket.timeout:
+                continue
+            with connection:
+                self._serve_connection(connection)
+        self._socket.close()
+
+    def _serve_connection(self, connection):
+        # Idle clients do not prevent the server from stopping
+        connection.settimeout(_POLL_INTERVAL)
+        data = b''
+        while not self._stop.is_set():
+            try:
+                received = connection.recv(4096)
+            except socket.timeout:
+                continue
+            if not received:
+                return
+            lines = (data + received).split(b'\n')
+            data = lines.pop()
+            for line in lines:
+                line = line.decode('utf-8', 'replace')
+                if line.strip():
+                    connection.sendall(
+                        (_execute_line(line) + '\n').encode('utf-8'))
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        os.unlink(self.path)
+
+
+class _FileWatcher(object):
+    """Executes the commands of a file every time it is modified, lines
+    starting with ``#`` are ignored."""
+
+    def __init__(self, path):
+        self.path = path
+        self._stop = threading.Event()
+        self._mtime = self._get_mtime()
+        self._thread = threading.Thread(target=self._watch,
+                                        name='nvtx-control-file')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _get_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _watch(self):
+        while not self._stop.wait(_POLL_INTERVAL):
+            mtime = self._get_mtime()
+            if mtime is None or mtime == self._mtime:
+                continue
+            self._mtime = mtime
+            self.run()
+
+    def run(self):
+        try:
+            with open(self.path) as f:
+                lines = f.readlines()
+        except OSError:
+            return
+        for line in lines:
+            if not line.strip() or line.lstrip().startswith('#'):
+                continue
+            result = _execute_line(line)
+            if result.startswith('error'):
+                warnings.warn('%s: %s' % (self.path, result))
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def start(socket_path=None, control_file=None):
+    """Starts accepting control commands.
+
+    Example:
+        .. highlight:: python
+        .. code-block:: python
+
+            nvtx.plugins.tf.control.start(socket_path='/tmp/nvtx.sock')
+            model.fit(dataset, callbacks=[NVTXCallback()])
+
+            # then from a shell
+            # echo "sample 100" | nc -U /tmp/nvtx.sock
+
+    Arguments:
+        socket_path: An optional ``string`` path of a Unix domain socket, the
+            commands sent to it are executed and answered with one ``ok`` or
+            ``error`` line each. ``{pid}`` is replaced by the process id.
+            Only the user running the process can connect to it, a socket
+            left at that path by an exited process is replaced.
+        control_file: An optional ``string`` path of a file, its commands are
+            executed every time it is modified. ``{pid}`` is replaced by the
+            process id.
+
+    Raises:
+        ValueError: If neither ``socket_path`` nor ``control_file`` is set.
+        RuntimeError: If another process accepts connections on
+            ``socket_path``.
+
+    """
+    if socket_path is None and control_file is None:
+        raise ValueError('Live control requires a socket_path or a '
+                         'control_file')
+    stop()
+
+    if socket_path is not None:
+        _channels.append(_SocketServer(socket_path.format(pid=os.getpid())))
+    if control_file is not None:
+        _channels.append(_FileWatcher(control_file.format(pid=os.getpid())))
+
+
+def stop():
+    """Stops accepting control commands, the state is kept."""
+    while _channels:
+        _channels.pop().close()
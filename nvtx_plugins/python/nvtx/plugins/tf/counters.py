@@ -0,0 +1,110 @@
+# ! /usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2019, NVIDIA CORPORATION. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Counter samples, e.g. throughput, loss or queue depth.
+
+A sample is an NVTX event named after the counter in the ``Counters`` domain,
+the value is the ``double`` payload of the event. The profiler shows the
+samples as a track aligned with the ranges of the step they were taken in.
+"""
+
+import time
+
+__all__ = ['COUNTERS_DOMAIN_NAME', 'ThroughputMeter', 'counter']
+
+# Domain of the counter samples, kept apart from the ranges
+COUNTERS_DOMAIN_NAME = 'Counters'
+
+
+class ThroughputMeter(object):
+    """Computes the rate of items processed per second between consecutive
+    steps, e.g. examples, tokens or bytes per second.
+
+    The first step of an epoch is timed from :meth:`start <start>`, the
+    following ones from the end of the previous step so that the time spent
+    waiting for the input pipeline is accounted for.
+
+    Arguments:
+        clock: The clock used to time the steps, in seconds.
+
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self._last_time = None
+
+    def reset(self):
+        """Forgets the previous step, e.g. at the beginning of an epoch."""
+        self._last_time = None
+
+    def start(self):
+        """Marks the beginning of a step if no step was timed since the last
+        :meth:`reset <reset>`."""
+        if self._last_time is None:
+            self._last_time = self.clock()
+
+    def update(self, num_items):
+        """Marks the end of a step that processed ``num_items``.
+
+        Returns:
+            The ``float`` number of items per second, ``None`` if the step
+            could not be timed.
+
+        """
+        now = self.clock()
+        rate = None
+        if self._last_time is not None and now > self._last_time:
+            rate = num_items / (now - self._last_time)
+        self._last_time = now
+        return rate
+
+
+def counter(name, value, domain_name=COUNTERS_DOMAIN_NAME, enabled=True):
+    """Emits a counter sample.
+
+    When executing eagerly the sample is emitted directly with the NVTX C API.
+    Inside a ``tf.function`` a :func:`ops.counter <nvtx.plugins.tf.ops.counter>`
+    operation is added to the function and runs with it.
+
+    Example:
+        .. highlight:: python
+        .. code-block:: python
+
+            nvtx.plugins.tf.counter('queue depth', queue.size())
+
+    Arguments:
+        name: A ``string``, the name of the counter.
+        value: A scalar number, a ``Tensor`` inside a ``tf.function``.
+        domain_name: An optional ``string`` domain name of the sample.
+            Defaults to ``Counters``.
+        enabled: ``bool``, if ``False`` no sample is emitted.
+
+    Returns:
+        The ``Operation`` emitting the sample in graph mode, ``None`` when
+        executing eagerly.
+
+    """
+    # Loaded on first use, the module is imported by the op wrappers
+    import tensorflow as tf
+    from nvtx.plugins.tf.ranges import mark
+
+    # Counters are double, the payload type of integers is int64
+    if tf.is_tensor(value):
+        value = tf.cast(value, tf.float64)
+    else:
+        value = float(value)
+    return mark(name, domain_name=domain_name, payload=value, enabled=enabled)
@@ -0,0 +1,188 @@
+# ! /usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2019, NVIDIA CORPORATION. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Debug mode tracking of unclosed and mismatched NVTX ranges.
+"""
+
+import ctypes
+import os
+import sys
+import threading
+
+from nvtx.plugins.tf.ext_utils import load_ctypes_library
+from nvtx.plugins.tf.ext_utils import get_ext_suffix
+
+__all__ = ['DEBUG_ENV_VAR', 'is_enabled', 'set_enabled', 'RangeTracker',
+           'get_op_ranges_report', 'check_ranges']
+
+
+DEBUG_ENV_VAR = 'NVTX_PLUGINS_DEBUG'
+
+_REPORT_BUFFER_SIZE = 64 * 1024
+
+_op_runtime = None
+
+
+def _get_op_runtime():
+    global _op_runtime
+
+    if _op_runtime is None:
+        # The op library has to be loaded by TensorFlow first
+        from nvtx.plugins.tf.ops import nvtx_tf_ops  # noqa: F401
+
+        _op_runtime = load_ctypes_library('lib/nvtx_ops' + get_ext_suffix())
+        _op_runtime.NvtxPluginsSetDebug.argtypes = [ctypes.c_int]
+        _op_runtime.NvtxPluginsDebugReport.argtypes = [
+            ctypes.c_char_p, ctypes.c_size_t, ctypes.c_int]
+        _op_runtime.NvtxPluginsDebugReport.restype = ctypes.c_int
+
+    return _op_runtime
+
+
+def _op_library_loaded():
+    ops = sys.modules.get('nvtx.plugins.tf.ops')
+    return ops is not None and ops.nvtx_tf_ops is not None
+
+
+def is_enabled():
+    """Returns ``True`` if the NVTX debug mode is enabled."""
+    return os.environ.get(DEBUG_ENV_VAR, '0') not in ('', '0')
+
+
+def set_enabled(enabled=True):
+    """Enables or disables the NVTX debug mode.
+
+    The debug mode can also be enabled by setting the ``NVTX_PLUGINS_DEBUG=1``
+    environment variable. It should be enabled before any range is opened.
+
+    Arguments:
+        enabled: ``bool``, if ``True`` the ranges opened by the ops, layers
+            and callbacks are tracked and checked.
+
+    """
+    os.environ[DEBUG_ENV_VAR] = '1' if enabled else '0'
+
+    if _op_library_loaded():
+        _get_op_runtime().NvtxPluginsSetDebug(int(enabled))
+
+
+def get_op_ranges_report(reset=True):
+    """Returns the problems found in the ranges of the NVTX ops.
+
+    Arguments:
+        reset: ``bool``, if ``True`` the tracked ranges are cleared.
+
+    Returns:
+        ``list`` of ``string``, one entry per leaked range, unknown range
+        or domain mismatch.
+
+    """
+    if not _op_library_loaded():
+        return []
+
+    buffer = ctypes.create_string_buffer(_REPORT_BUFFER_SIZE)
+    _get_op_runtime().NvtxPluginsDebugReport(buffer, _REPORT_BUFFER_SIZE,
+                                             int(reset))
+    return [line for line in buffer.value.decode('utf-8').split('\n') if line]
+
+
+class RangeTracker(object):
+    """Keeps track of the ranges opened by the callbacks per domain.
+
+    The callbacks open start/end ranges, which may overlap and be closed on
+    any thread, so the ranges of a domain are not required to be closed in
+    the reverse order of opening.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._open_ranges = {}
+        self._problems = []
+
+    @staticmethod
+    def _describe(message, domain_name):
+        if domain_name:
+            return "'%s' (domain '%s')" % (message, domain_name)
+        return "'%s'" % message
+
+    def open(self, message, domain_name=None):
+        with self._lock:
+            self._open_ranges.setdefault(domain_name or '', []).append(
+                message)
+
+    def close(self, message, domain_name=None):
+        domain_name = domain_name or ''
+
+        with self._lock:
+            open_ranges = self._open_ranges.get(domain_name, [])
+
+            if message not in open_ranges:
+                for other_domain, other_ranges in self._open_ranges.items():
+                    if message in other_ranges:
+                        self._problems.append(
+                            'Range %s was closed with domain %s' % (
+                                self._describe(message, other_domain),
+                                repr(domain_name)))
+                        other_ranges.remove(message)
+                        return
+                self._problems.append(
+                    'Range %s was closed but is not open' %
+                    self._describe(message, domain_name))
+                return
+
+            # remove the most recent occurrence
+            del open_ranges[len(open_ranges) - 1 -
+                            open_ranges[::-1].index(message)]
+
+    def report(self, reset=True):
+        """Returns the problems found so far and the ranges still open."""
+        with self._lock:
+            report = list(self._problems)
+            for domain_name, open_ranges in self._open_ranges.items():
+                for message in open_ranges:
+                    report.append('Range %s was never closed' %
+                                  self._describe(message, domain_name))
+
+            if reset:
+                self._problems = []
+                self._open_ranges = {}
+
+        return report
+
+
+def check_ranges(range_tracker=None, check_ops=True):
+    """Raises an error if any NVTX range problem was found.
+
+    Arguments:
+        range_tracker: An optional :class:`RangeTracker` to check.
+        check_ops: ``bool``, if ``True`` the ranges of the NVTX ops are
+            checked as well.
+
+    Raises:
+        RuntimeError: if ranges were leaked, closed without being opened or
+            closed with the wrong domain.
+
+    """
+    problems = []
+    if range_tracker is not None:
+        problems += range_tracker.report()
+    if check_ops:
+        problems += get_op_ranges_report()
+
+    if problems:
+        raise RuntimeError('NVTX debug mode found %d range problem(s):\n  %s' %
+                           (len(problems), '\n  '.join(problems)))
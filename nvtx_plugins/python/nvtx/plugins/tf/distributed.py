@@ -0,0 +1,204 @@
+# ! /usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2019, NVIDIA CORPORATION. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Rank-aware NVTX ranges for distributed training.
+"""
+
+import json
+import os
+import weakref
+
+__all__ = ['RANKS_ENV_VAR', 'RANK_DOMAINS_ENV_VAR', 'get_rank',
+           'set_rank_policy', 'should_emit', 'rank_domain_name']
+
+
+# Comma separated list of the ranks emitting detailed ranges, e.g. "0,8"
+RANKS_ENV_VAR = 'NVTX_PLUGINS_RANKS'
+# If set to 1 the rank is added to the NVTX domain names
+RANK_DOMAINS_ENV_VAR = 'NVTX_PLUGINS_RANK_DOMAINS'
+
+# Launchers environment variables holding the rank of the process
+RANK_ENV_VARS = (
+    'HOROVOD_RANK',
+    'OMPI_COMM_WORLD_RANK',
+    'PMIX_RANK',
+    'PMI_RANK',
+    'SLURM_PROCID',
+    'RANK',
+)
+
+_policy = {
+    'ranks': None,
+    'label_domains': None,
+}
+
+# The resolved rank, detailed ranks and domain labeling. The rank is resolved
+# again when the current strategy changes, the policy when it is set.
+_cache = {}
+
+
+def _clear_cache():
+    _cache.clear()
+
+
+def _rank_from_strategy(strategy):
+    cluster_resolver = getattr(strategy, 'cluster_resolver', None)
+    if cluster_resolver is None or not cluster_resolver.task_type:
+        return None
+
+    cluster_spec = cluster_resolver.cluster_spec().as_dict()
+    task_id = cluster_resolver.task_id or 0
+    if cluster_resolver.task_type == 'worker' and 'chief' in cluster_spec:
+        task_id += len(cluster_spec['chief'])
+    return task_id
+
+
+def _rank_from_tf_config():
+    tf_config = os.environ.get('TF_CONFIG')
+    if not tf_config:
+        return None
+
+    tf_config = json.loads(tf_config)
+    task = tf_config.get('task', {})
+    if 'index' not in task:
+        return None
+
+    rank = int(task['index'])
+    if task.get('type') == 'worker' and 'chief' in tf_config.get('cluster', {}):
+        rank += len(tf_config['cluster']['chief'])
+    return rank
+
+
+def get_rank():
+    """Returns the rank of this process.
+
+    The rank is read from the Horovod/MPI/Slurm environment variables, from
+    the cluster resolver of the current ``tf.distribute`` strategy or from
+    ``TF_CONFIG``. Defaults to ``0`` if the process is not distributed.
+    The rank is resolved once for every strategy.
+
+    """
+    import tensorflow as tf
+
+    strategy = tf.distribute.get_strategy()
+    cached = _cache.get('rank')
+    if cached is not None and cached[0]() is strategy:
+        return cached[1]
+
+    rank = _resolve_rank(strategy)
+    _cache['rank'] = (weakref.ref(strategy), rank)
+    return rank
+
+
+def _resolve_rank(strategy):
+    for env_var in RANK_ENV_VARS:
+        if os.environ.get(env_var, '').isdigit():
+            return int(os.environ[env_var])
+
+    rank = _rank_from_strategy(strategy)
+    if rank is None:
+        rank = _rank_from_tf_config()
+    return rank or 0
+
+
+def _get_replica_id():
+    import tensorflow as tf
+
+    replica_context = tf.distribute.get_replica_context()
+    if replica_context is None or \
+            replica_context.num_replicas_in_sync <= 1:
+        return None
+    return tf.get_static_value(replica_context.replica_id_in_sync_group)
+
+
+def set_rank_policy(ranks=None, label_domains=None):
+    """Sets which ranks emit detailed ranges and how ranges are labeled.
+
+    The policy can also be set with the ``NVTX_PLUGINS_RANKS`` (e.g. ``0,8``)
+    and ``NVTX_PLUGINS_RANK_DOMAINS=1`` environment variables. They are read
+    once, and again after every call of this function.
+
+    Arguments:
+        ranks: An optional iterable of ``int``, the ranks that emit detailed
+            ranges (ops, Keras layers and per step callback ranges). Other
+            ranks only emit coarse ranges, e.g. the training and epoch ranges.
+            If not provided all the ranks emit detailed ranges.
+        label_domains: ``bool``, if ``True`` the rank (and the replica id
+            inside a ``tf.distribute`` replica context) is added to the NVTX
+            domain names.
+
+    """
+    _policy['ranks'] = None if ranks is None else frozenset(ranks)
+    _policy['label_domains'] = label_domains
+    _cache.pop('detailed_ranks', None)
+    _cache.pop('label_domains', None)
+
+
+def _detailed_ranks():
+    if 'detailed_ranks' not in _cache:
+        ranks = _policy['ranks']
+        if ranks is None:
+            ranks = os.environ.get(RANKS_ENV_VAR, '').strip()
+            ranks = frozenset(int(rank) for rank in ranks.split(',')) \
+                if ranks else None
+        _cache['detailed_ranks'] = ranks
+    return _cache['detailed_ranks']
+
+
+def _label_domains():
+    if 'label_domains' not in _cache:
+        label_domains = _policy['label_domains']
+        if label_domains is None:
+            label_domains = os.environ.get(RANK_DOMAINS_ENV_VAR, '0') \
+                not in ('', '0')
+        _cache['label_domains'] = label_domains
+    return _cache['label_domains']
+
+
+def should_emit(detailed=True):
+    """Returns ``True`` if this rank should emit the range.
+
+    Arguments:
+        detailed: ``bool``, ``False`` for coarse ranges that are always
+            emitted.
+
+    """
+    if not detailed:
+        return True
+
+    ranks = _detailed_ranks()
+    return ranks is None or get_rank() in ranks
+
+
+def rank_domain_name(domain_name):
+    """Returns ``domain_name`` labeled with the rank if enabled by the policy.
+
+    Domain names that are not python strings, e.g. ``Tensor`` objects, are
+    returned unchanged.
+
+    """
+    if not _label_domains() or not isinstance(domain_name, str):
+        return domain_name
+
+    label = 'rank %d' % get_rank()
+    replica_id = _get_replica_id()
+    if replica_id is not None:
+        label += ', replica %d' % replica_id
+
+    if not domain_name:
+        return label.capitalize()
+    return '%s (%s)' % (domain_name, label)
@@ -16,7 +16,9 @@
 # limitations under the License.
 
 import tensorflow as tf
+from nvtx.plugins.tf import control
 from nvtx.plugins.tf.base_callbacks import BaseCallback
+from nvtx.plugins.tf.counters import ThroughputMeter
 
 
 class NVTXHook(BaseCallback, tf.estimator.SessionRunHook):
@@ -26,29 +28,114 @@ class NVTXHook(BaseCallback, tf.estimator.SessionRunHook):
         skip_n_steps: ``int``, skips adding markers for the first N
             ``session.run()`` calls.
         name: ``string``, a marker name for the session.
+        domain_name: An optional ``string`` domain name to be associated with
+            the markers. If not provided the default NVTX domain will be used.
+        sync_every_n_steps: ``int``, if set a synchronization marker is added
+            after every N ``session.run()`` calls. The markers are used by
+            ``nvtx-merge-traces`` to align the traces of several processes.
+        debug: ``bool``, if ``True`` leaked, unknown and mismatched
+            ranges are reported when the session ends. If not provided the
+            ``NVTX_PLUGINS_DEBUG`` environment variable is used.
+        batch_size: An optional ``int``, the number of items processed by a
+            ``session.run()`` call. If set the throughput is emitted as a
+            counter sample after every call.
+        throughput_name: ``string``, the counter name of the throughput.
+        counters: An optional ``dict`` mapping counter names to scalar
+            ``Tensor`` objects, e.g. the loss or the size of a queue, fetched
+            with every ``session.run()`` call and emitted as counter samples.
+        tail_latency: An optional :class:`TailLatencyCapture
+            <nvtx.plugins.tf.tail_latency.TailLatencyCapture>`, the ranges of
+            the NVTX ops are then only emitted for slow ``session.run()``
+            calls.
 
     """
-    def __init__(self, skip_n_steps=0, name=None):
-        super(NVTXHook, self).__init__()
+    def __init__(self, skip_n_steps=0, name=None, domain_name=None,
+                 sync_every_n_steps=0, debug=None, batch_size=None,
+                 throughput_name='examples/sec', counters=None,
+                 tail_latency=None):
+        super(NVTXHook, self).__init__(domain_name=domain_name,
+                                       sync_every_n_steps=sync_every_n_steps,
+                                       debug=debug)
         self.name = name
         self.step_counter = 0
         self.skip_n_steps = skip_n_steps
         self.iteration_message = 'step {iter}'
+        self.batch_size = batch_size
+        self.throughput_name = throughput_name
+        self.counters = dict(counters or {})
+        self.tail_latency = tail_latency
+        self._throughput_meter = ThroughputMeter()
 
     def begin(self):
         self.step_counter = 0
+        self._throughput_meter.reset()
         if self.name:
             self.open_marker(self.name)
 
     def before_run(self, run_context):
-        if self.step_counter >= self.skip_n_steps:
-            self.open_marker(self.iteration_message.format(iter=self.step_counter))
+        if self.step_counter < self.skip_n_steps:
+            return None
+        self._throughput_meter.start()
+        control.begin_step(self.step_counter)
+        self.open_marker(
+            self.iteration_message.format(iter=self.step_counter),
+            detailed=True)
+        if self.tail_latency is not None:
+            self.tail_latency.step_begin()
+        if self.counters and self.libnvtx.available:
+            return tf.estimator.SessionRunArgs(fetches=self.counters)
+        return None
 
     def after_run(self, run_context, run_values):
         if self.step_counter >= self.skip_n_steps:
-            self.close_marker(self.iteration_message.format(iter=self.step_counter))
+            self.close_marker(
+                self.iteration_message.format(iter=self.step_counter),
+                detailed=True)
+            if self.tail_latency is not None:
+                self.tail_latency.step_end(self.step_counter)
+            self._sample_counters(run_values.results)
         self.step_counter += 1
+        self.sync_marker(self.step_counter)
+
+    def _sample_counters(self, results):
+        if self.batch_size:
+            throughput = self._throughput_meter.update(self.batch_size)
+            if throughput is not None:
+                self.counter(self.throughput_name, throughput)
+        for name, value in sorted((results or {}).items()):
+            self.counter(name, value)
 
     def end(self, session):
+        if self.tail_latency is not None:
+            self.tail_latency.disable()
         if self.name:
             self.close_marker(self.name)
+        self.check_ranges()
+
+
+class NVTXCheckpointSaverListener(BaseCallback,
+                                  tf.estimator.CheckpointSaverListener):
+    """Listener that marks the checkpoints of a
+    ``tf.estimator.CheckpointSaverHook`` as instantaneous NVTX events, with
+    the global step as payload.
+
+    Example:
+        .. highlight:: python
+        .. code-block:: python
+
+            estimator.train(input_fn, saving_listeners=[
+                NVTXCheckpointSaverListener(domain_name='Checkpoints')])
+
+    Arguments:
+        message: ``string``, the message of the events.
+        domain_name: An optional ``string`` domain name to be associated with
+            the events. If not provided the default NVTX domain will be used.
+
+    """
+    def __init__(self, message='checkpoint', domain_name=None):
+        super(NVTXCheckpointSaverListener, self).__init__(
+            domain_name=domain_name)
+        self.message = message
+
+    def after_save(self, session, global_step_value):
+        self.mark(self.message, payload=int(global_step_value))
@@ -32,13 +32,15 @@
 # limitations under the License.
 # ==============================================================================
 
+import ctypes
 import os
 import sysconfig
 
 from tensorflow.python.framework import load_library as _load_library
 from tensorflow.python.platform import resource_loader
 
-__all__ = ["get_ext_suffix", "load_library"]
+__all__ = ["get_ext_suffix", "get_library_path", "load_library",
+           "load_ctypes_library"]
 
 
 # Source: https://github.com/horovod/horovod/blob/abc3d88544/horovod/tensorflow/mpi_ops.py#L33
@@ -55,6 +57,27 @@ def load_library(name):
     return library
 
 
+def get_library_path(name):
+    """Returns the absolute path of a .so file of the package.
+    Args:
+      name: The name of the .so file.
+    """
+
+    return os.path.abspath(resource_loader.get_path_to_datafile(name))
+
+
+def load_ctypes_library(name):
+    """Loads a .so file with ctypes to access its C API.
+    Args:
+      name: The name of the .so file to load.
+    Raises:
+      OSError if were not able to load .so file.
+    """
+
+    filename = resource_loader.get_path_to_datafile(name)
+    return ctypes.CDLL(filename)
+
+
 def get_ext_suffix():
     """Determine library extension for various versions of Python."""
     ext_suffix = sysconfig.get_config_var('EXT_SUFFIX')
@@ -0,0 +1,398 @@
+# ! /usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2019, NVIDIA CORPORATION. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Flight recorder: the most recent ranges of every thread, kept in memory
+and dumped to a file when a job hangs, fails or on demand.
+"""
+
+import collections
+import ctypes
+import json
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+import warnings
+
+from nvtx.plugins.tf.ext_utils import load_ctypes_library
+from nvtx.plugins.tf.ext_utils import get_ext_suffix
+
+__all__ = ['DEFAULT_CAPACITY', 'enable', 'disable', 'is_enabled', 'record',
+           'events', 'dump']
+
+
+# Number of events kept per thread
+DEFAULT_CAPACITY = 1024
+
+_DEFAULT_DUMP_PATH = os.path.join(tempfile.gettempdir(),
+                                  'nvtx_flight_recorder_{pid}.json')
+
+
+class _NvtxPluginsRecordedEvent(ctypes.Structure):
+    # NvtxPluginsRecordedEvent, see nvtx_runtime.h
+    _fields_ = [
+        ('message', ctypes.c_char * 64),
+        ('domain_name', ctypes.c_char * 64),
+        ('ts_ns', ctypes.c_int64),
+        ('id', ctypes.c_uint64),
+        ('thread_id', ctypes.c_uint64),
+        ('phase', ctypes.c_int32),
+    ]
+
+
+_op_runtime = None
+
+
+def _get_op_runtime():
+    global _op_runtime
+
+    if _op_runtime is None:
+        # The op library has to be loaded by TensorFlow first
+        from nvtx.plugins.tf.ops import nvtx_tf_ops  # noqa: F401
+
+        _op_runtime = load_ctypes_library('lib/nvtx_ops' + get_ext_suffix())
+        _op_runtime.NvtxPluginsSetRecorder.argtypes = [ctypes.c_int]
+        _op_runtime.NvtxPluginsSetRecorder.restype = ctypes.c_int
+        _op_runtime.NvtxPluginsRecorderSnapshot.argtypes = [
+            ctypes.POINTER(_NvtxPluginsRecordedEvent), ctypes.c_int]
+        _op_runtime.NvtxPluginsRecorderSnapshot.restype = ctypes.c_int
+
+    return _op_runtime
+
+
+def _op_library_loaded():
+    try:
+        from nvtx.plugins.tf import ops
+    except ImportError:
+        return False
+    return ops.is_available()
+
+
+def _monotonic_ns():
+    # The clock of the op library, std::chrono::steady_clock
+    if hasattr(time, 'monotonic_ns'):
+        return time.monotonic_ns()
+    return int(time.monotonic() * 1e9)
+
+
+class _Recorder(object):
+    """The rings of the events recorded from python, one per thread."""
+
+    def __init__(self, capacity, dump_path):
+        self.capacity = capacity
+        self.dump_path = dump_path
+        self.op_library = False
+        self.signal_handler = False
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._rings = []
+        self._restore = []
+
+    def ring(self):
+        ring = getattr(self._local, 'ring', None)
+        if ring is None:
+            ring = collections.deque(maxlen=self.capacity)
+            self._local.ring = ring
+            with self._lock:
+                self._rings.append((threading.get_ident(), ring))
+        return ring
+
+    def events(self):
+        with self._lock:
+            rings = list(self._rings)
+        return [(thread_id, event) for thread_id, ring in rings
+                for event in list(ring)]
+
+
+_recorder = None
+_dump_lock = threading.Lock()
+
+
+def _install_signal_handler(recorder, signal_number):
+    if threading.current_thread() is not threading.main_thread():
+        raise RuntimeError('The flight recorder signal handler can only be '
+                           'installed from the main thread')
+
+    previous_handler = signal.getsignal(signal_number)
+    watcher = {'active': False}
+
+    def handler(signum, frame):
+        if not watcher['active']:
+            dump()
+        if callable(previous_handler):
+            previous_handler(signum, frame)
+
+    signal.signal(signal_number, handler)
+    recorder.signal_handler = True
+    recorder._restore.append(
+        lambda: signal.signal(signal_number, previous_handler))
+
+    # Python signal handlers run in the main thread between two bytecodes,
+    # not while it is blocked in TensorFlow. A thread woken up through the
+    # wakeup fd of the signal module dumps the events instead, unless the
+    # fd is already used, e.g. by asyncio.
+    read_fd, write_fd = os.pipe()
+    os.set_blocking(write_fd, False)
+    previous_fd = signal.set_wakeup_fd(write_fd)
+    if previous_fd != -1:
+        signal.set_wakeup_fd(previous_fd)
+        os.close(read_fd)
+        os.close(write_fd)
+        return
+
+    def watch():
+        try:
+            while True:
+                data = os.read(read_fd, 64)
+                # The write end is closed when the recorder is disabled
+                if not data:
+                    return
+                if signal_number in bytearray(data):
+                    dump()
+        finally:
+            os.close(read_fd)
+
+    watcher['active'] = True
+    thread = threading.Thread(target=watch, name='nvtx-flight-recorder')
+    thread.daemon = True
+    thread.start()
+
+    def restore_wakeup_fd():
+        signal.set_wakeup_fd(-1)
+        os.close(write_fd)
+
+    recorder._restore.append(restore_wakeup_fd)
+
+
+def _install_exception_hooks(recorder):
+    previous_excepthook = sys.excepthook
+
+    def excepthook(exc_type, exc_value, exc_traceback):
+        dump()
+        previous_excepthook(exc_type, exc_value, exc_traceback)
+
+    sys.excepthook = excepthook
+    recorder._restore.append(
+        lambda: setattr(sys, 'excepthook', previous_excepthook))
+
+    previous_threading_hook = getattr(threading, 'excepthook', None)
+    if previous_threading_hook is not None:
+        def threading_excepthook(args):
+            dump()
+            previous_threading_hook(args)
+
+        threading.excepthook = threading_excepthook
+        recorder._restore.append(
+            lambda: setattr(threading, 'excepthook', previous_threading_hook))
+
+
+def enable(capacity=DEFAULT_CAPACITY, dump_path=None,
+           signal_number=signal.SIGUSR1, dump_on_exception=True):
+    """Enables the flight recorder.
+
+    The ranges and events of the NVTX ops and of the callbacks are recorded
+    into fixed-size rings, one per thread, holding the most recent
+    ``capacity`` events. The memory used is fixed, about 100 bytes per event
+    and thread. Recording an event is a few stores into the ring, in
+    addition to the NVTX call.
+
+    The events are dumped to ``dump_path`` on ``signal_number``, on an
+    unhandled exception, e.g. raised by ``model.fit``, or by calling
+    :func:`dump <dump>`. The file uses the Chrome trace event format, it can
+    be opened with ``chrome://tracing`` or Perfetto.
+
+    Note:
+        The capacity of the rings of the op library is set the first time the
+        recorder is enabled, a warning is issued if a later call asks for
+        another capacity.
+
+    Example:
+        .. highlight:: python
+        .. code-block:: python
+
+            nvtx.plugins.tf.flight_recorder.enable(capacity=4096)
+            model.fit(dataset, callbacks=[NVTXCallback()])
+
+            # then from a shell, while the job hangs
+            # kill -USR1 <pid>
+
+    Arguments:
+        capacity: ``int``, the number of events kept per thread.
+        dump_path: An optional ``string`` path of the dump, ``{pid}`` is
+            replaced by the process id. Defaults to
+            ``nvtx_flight_recorder_{pid}.json`` in the temporary directory.
+        signal_number: The signal dumping the events, ``None`` to not install
+            a signal handler. Defaults to ``SIGUSR1``.
+        dump_on_exception: ``bool``, if ``True`` the events are dumped on an
+            unhandled exception.
+
+    Raises:
+        ValueError: If ``capacity`` is not positive.
+        RuntimeError: If a signal handler is installed from another thread
+            than the main thread.
+
+    """
+    global _recorder
+
+    if capacity <= 0:
+        raise ValueError('The flight recorder capacity must be positive, got '
+                         '%s' % capacity)
+    disable()
+
+    recorder = _Recorder(capacity, dump_path or _DEFAULT_DUMP_PATH)
+    if signal_number is not None:
+        _install_signal_handler(recorder, signal_number)
+    if dump_on_exception:
+        _install_exception_hooks(recorder)
+
+    if _op_library_loaded():
+        op_capacity = _get_op_runtime().NvtxPluginsSetRecorder(capacity)
+        if op_capacity != capacity:
+            warnings.warn('The rings of the NVTX ops keep %d events per '
+                          'thread, the capacity is only set the first time '
+                          'the flight recorder is enabled' % op_capacity,
+                          RuntimeWarning)
+        recorder.op_library = True
+    _recorder = recorder
+
+
+def disable():
+    """Disables the flight recorder and removes its handlers.
+
+    Raises:
+        RuntimeError: If the recorder installed a signal handler and is
+            disabled from another thread than the main thread.
+
+    """
+    global _recorder
+
+    recorder = _recorder
+    if recorder is None:
+        return
+    # Nothing is restored if the signal handler can not be
+    if recorder.signal_handler and \
+            threading.current_thread() is not threading.main_thread():
+        raise RuntimeError('The flight recorder signal handler can only be '
+                           'removed from the main thread')
+    _recorder = None
+
+    if recorder.op_library:
+        _get_op_runtime().NvtxPluginsSetRecorder(0)
+    for restore in reversed(recorder._restore):
+        restore()
+
+
+def is_enabled():
+    """Returns ``True`` if the flight recorder is enabled."""
+    return _recorder is not None
+
+
+def record(phase, message='', domain_name='', range_id=0):
+    """Records an event of a python range, e.g. of a callback.
+
+    Arguments:
+        phase: ``string``, ``'B'`` and ``'E'`` to open and close a range of
+            the calling thread, ``'b'`` and ``'e'`` for a range identified by
+            ``range_id``, ``'i'`` for an instantaneous event.
+        message: ``string``, the message of the range.
+        domain_name: ``string``, the domain name of the range.
+        range_id: ``int``, the id of ``'b'`` and ``'e'`` ranges.
+
+    """
+    recorder = _recorder
+    if recorder is not None:
+        recorder.ring().append(
+            (phase, _monotonic_ns(), message, domain_name, range_id))
+
+
+def _op_events():
+    runtime = _get_op_runtime()
+    num_events = runtime.NvtxPluginsRecorderSnapshot(None, 0)
+    buffer = (_NvtxPluginsRecordedEvent * num_events)()
+    num_events = runtime.NvtxPluginsRecorderSnapshot(buffer, num_events)
+
+    return [(raw.thread_id,
+             (chr(raw.phase), raw.ts_ns,
+              raw.message.decode('utf-8', 'replace'),
+              raw.domain_name.decode('utf-8', 'replace'), raw.id))
+            for raw in buffer[:num_events]]
+
+
+def events():
+    """Returns the recorded events in the Chrome trace event format.
+
+    Returns:
+        A ``list`` of ``dict``, sorted by timestamp.
+
+    """
+    recorder = _recorder
+    if recorder is None:
+        return []
+
+    recorded = recorder.events()
+    if recorder.op_library:
+        recorded += _op_events()
+
+    pid = os.getpid()
+    # 'e' events are not named by the op library
+    names = {(domain_name, range_id): message
+             for _, (phase, _, message, domain_name, range_id) in recorded
+             if phase == 'b'}
+
+    trace_events = []
+    for thread_id, (phase, ts_ns, message, domain_name, range_id) in \
+            sorted(recorded, key=lambda event: event[1][1]):
+        event = {
+            'name': message or names.get((domain_name, range_id), ''),
+            'cat': domain_name or 'default',
+            'ph': phase,
+            'ts': ts_ns / 1000.,
+            'pid': pid,
+            'tid': thread_id,
+        }
+        if phase in ('b', 'e'):
+            event['id'] = range_id
+        elif phase == 'i':
+            event['s'] = 't'
+        trace_events.append(event)
+    return trace_events
+
+
+def dump(path=None):
+    """Writes the recorded events to a file.
+
+    Arguments:
+        path: An optional ``string`` path of the file, ``{pid}`` is replaced
+            by the process id. Defaults to the ``dump_path`` of
+            :func:`enable <enable>`.
+
+    Returns:
+        The ``string`` path of the file, ``None`` if the flight recorder is
+        disabled.
+
+    """
+    recorder = _recorder
+    if recorder is None:
+        return None
+
+    path = (path or recorder.dump_path).format(pid=os.getpid())
+    with _dump_lock:
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events(), 'displayTimeUnit': 'ms'}, f)
+    return path
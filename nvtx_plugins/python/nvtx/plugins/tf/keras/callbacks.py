@@ -19,55 +19,217 @@
 """
 
 import tensorflow as tf
+from nvtx.plugins.tf import control
 from nvtx.plugins.tf.base_callbacks import BaseCallback
+from nvtx.plugins.tf.counters import ThroughputMeter
 
 
 class NVTXCallback(BaseCallback, tf.keras.callbacks.Callback):
     """Callback that adds NVTX markers to a keras session.
+
+    Note:
+        With ``steps_per_execution > 1`` Keras runs the callbacks once per
+        chunk of steps, the batch ranges are then named ``batches
+        {first}-{last}``. Use :class:`NVTXModel
+        <nvtx.plugins.tf.keras.models.NVTXModel>` for per step ranges.
+
+    Arguments:
+        domain_name: An optional ``string`` domain name to be associated with
+            the markers. If not provided the default NVTX domain will be used.
+        sync_every_n_steps: ``int``, if set a synchronization marker is added
+            at the end of every N training batches. The markers are used by
+            ``nvtx-merge-traces`` to align the traces of several processes.
+        debug: ``bool``, if ``True`` leaked, unknown and mismatched
+            ranges are reported at the end of training. If not provided the
+            ``NVTX_PLUGINS_DEBUG`` environment variable is used.
+        mark_metrics: ``bool``, if ``True`` the metrics of every epoch are
+            marked at the end of the epoch, one event per metric named after
+            it with the value as payload, and learning rate changes are
+            marked at the beginning of the epochs.
+        step_counters: ``bool``, if ``True`` counter samples are emitted at
+            the end of every training batch: the throughput, if the batch
+            size is known, and the numeric logs of the batch, e.g. the loss.
+        batch_size: An optional ``int``, the number of items of a batch used
+            to compute the throughput, e.g. a number of tokens. If not
+            provided the batch size is taken from the callback parameters
+            when available.
+        throughput_name: ``string``, the counter name of the throughput.
+        counters: An optional ``dict`` mapping counter names to callables
+            returning a number, sampled at the end of every training batch,
+            e.g. ``{'queue depth': queue.size}``.
+        tail_latency: An optional :class:`TailLatencyCapture
+            <nvtx.plugins.tf.tail_latency.TailLatencyCapture>`, the ranges of
+            the NVTX ops are then only emitted for slow training batches.
+            Buffering is disabled during evaluation and prediction, their
+            ranges are emitted, and enabled again at the next training batch.
+
     """
 
-    def __init__(self, **kwargs):
+    def __init__(self, mark_metrics=True, step_counters=True, batch_size=None,
+                 throughput_name='examples/sec', counters=None,
+                 tail_latency=None, **kwargs):
         super(NVTXCallback, self).__init__(**kwargs)
+        self.tail_latency = tail_latency
+        self.mark_metrics = mark_metrics
+        self.step_counters = step_counters
+        self.batch_size = batch_size
+        self.throughput_name = throughput_name
+        self.counters = dict(counters or {})
+        self._throughput_meter = ThroughputMeter()
+        self.learning_rate_message = 'learning rate'
+        self._learning_rate = None
         self.epoch_message = 'epoch {epoch}'
         self.batch_message = 'batch {batch}'
+        self.chunk_message = 'batches {first}-{last}'
+        self.train_step = 0
+        self._steps_per_execution = 1
+        self._open_batches = []
+
+    def _get_steps_per_execution(self):
+        steps = getattr(self.model, '_steps_per_execution', None)
+        if steps is None:
+            return 1
+        return int(steps.numpy()) if hasattr(steps, 'numpy') else int(steps)
+
+    def _get_learning_rate(self):
+        optimizer = getattr(self.model, 'optimizer', None)
+        learning_rate = getattr(optimizer, 'lr', None)
+        if learning_rate is None or callable(learning_rate):
+            # Schedules change every step, they are not marked
+            return None
+        try:
+            return float(tf.keras.backend.get_value(learning_rate))
+        except (TypeError, ValueError):
+            return None
+
+    def _mark_learning_rate(self):
+        learning_rate = self._get_learning_rate()
+        if learning_rate is not None and learning_rate != self._learning_rate:
+            self.mark(self.learning_rate_message, payload=learning_rate)
+        self._learning_rate = learning_rate
+
+    def _mark_metrics(self, logs):
+        for metric, value in sorted((logs or {}).items()):
+            try:
+                self.mark(metric, payload=float(value))
+            except (TypeError, ValueError):
+                continue
+
+    def _get_batch_size(self, logs):
+        if self.batch_size is not None:
+            return self.batch_size
+        # `size` is only reported by older Keras versions
+        return (logs or {}).get('size', (self.params or {}).get('batch_size'))
+
+    def _sample_counters(self, num_steps, logs):
+        batch_size = self._get_batch_size(logs)
+        throughput = self._throughput_meter.update(num_steps * (batch_size or 0))
+        if batch_size and throughput is not None:
+            self.counter(self.throughput_name, throughput)
+
+        for name, value in sorted((logs or {}).items()):
+            if name in ('batch', 'size'):
+                continue
+            try:
+                self.counter(name, float(value))
+            except (TypeError, ValueError):
+                continue
+
+        for name, sample in sorted(self.counters.items()):
+            self.counter(name, float(sample()))
+
+    def _open_batch(self, batch):
+        # With steps_per_execution > 1 the callbacks run once per chunk of
+        # steps. The range is named before the chunk runs, the step count is
+        # taken from the batch passed to on_train_batch_end as the last chunk
+        # of an epoch can be shorter.
+        if self._steps_per_execution > 1:
+            last = batch + self._get_steps_per_execution() - 1
+            message = self.chunk_message.format(first=batch, last=last)
+        else:
+            message = self.batch_message.format(batch=batch)
+
+        self._open_batches.append((message, batch))
+        self.open_marker(message, detailed=True)
+
+    def _close_batch(self):
+        message, first = self._open_batches.pop()
+        self.close_marker(message, detailed=True)
+        return first
 
     def on_epoch_begin(self, epoch, logs=None):
+        self._throughput_meter.reset()
+        if self.mark_metrics:
+            self._mark_learning_rate()
         self.open_marker(self.epoch_message.format(epoch=epoch))
 
     def on_epoch_end(self, epoch, logs=None):
         self.close_marker(self.epoch_message.format(epoch=epoch))
+        if self.mark_metrics:
+            self._mark_metrics(logs)
 
+    # Without libnvToolsExt the batch hooks return early
     def on_train_batch_begin(self, batch, logs=None):
-        self.open_marker(self.batch_message.format(batch=batch))
+        if not self.libnvtx.available:
+            return
+        self._throughput_meter.start()
+        control.begin_step(self.train_step)
+        self._open_batch(batch)
+        if self.tail_latency is not None:
+            self.tail_latency.step_begin()
 
     def on_train_batch_end(self, batch, logs=None):
-        self.close_marker(self.batch_message.format(batch=batch))
+        if not self.libnvtx.available:
+            return
+        num_steps = batch - self._close_batch() + 1
+        self.train_step += num_steps
+        if self.tail_latency is not None:
+            self.tail_latency.step_end(self.train_step, num_steps)
+        if self.step_counters:
+            self._sample_counters(num_steps, logs)
+        self.sync_marker(self.train_step, num_steps)
 
     def on_test_batch_begin(self, batch, logs=None):
-        self.open_marker(self.batch_message.format(batch=batch))
+        if self.libnvtx.available:
+            self._open_batch(batch)
 
     def on_test_batch_end(self, batch, logs=None):
-        self.close_marker(self.batch_message.format(batch=batch))
+        if self.libnvtx.available:
+            self._close_batch()
 
     def on_predict_batch_begin(self, batch, logs=None):
-        self.open_marker(self.batch_message.format(batch=batch))
+        if self.libnvtx.available:
+            self._open_batch(batch)
 
     def on_predict_batch_end(self, batch, logs=None):
-        self.close_marker(self.batch_message.format(batch=batch))
+        if self.libnvtx.available:
+            self._close_batch()
 
     def on_train_begin(self, logs=None):
+        self._steps_per_execution = self._get_steps_per_execution()
+        self._learning_rate = None
         self.open_marker('Train')
 
     def on_train_end(self, logs=None):
+        if self.tail_latency is not None:
+            self.tail_latency.disable()
         self.close_marker('Train')
+        self.check_ranges()
 
     def on_test_begin(self, logs=None):
+        # Evaluation steps are not training steps, their ranges are emitted
+        if self.tail_latency is not None:
+            self.tail_latency.disable()
+        self._steps_per_execution = self._get_steps_per_execution()
         self.open_marker('Test')
 
     def on_test_end(self, logs=None):
         self.close_marker('Test')
 
     def on_predict_begin(self, logs=None):
+        if self.tail_latency is not None:
+            self.tail_latency.disable()
+        self._steps_per_execution = self._get_steps_per_execution()
         self.open_marker('Predict')
 
     def on_predict_end(self, logs=None):
@@ -18,10 +18,68 @@
 """Keras layers.
 """
 
+import tensorflow as tf
 from tensorflow.keras.layers import Layer
+from tensorflow.keras.layers import Wrapper
+
+from nvtx.plugins.tf.distributed import rank_domain_name
+from nvtx.plugins.tf.distributed import should_emit
+from nvtx.plugins.tf.naming import scope_message
+from nvtx.plugins.tf.ops import mark
 from nvtx.plugins.tf.ops import nvtx_tf_ops
+from nvtx.plugins.tf.ops import _close_nested
+from nvtx.plugins.tf.ops import _in_xla_context
+from nvtx.plugins.tf.ops import _open_nested
+from nvtx.plugins.tf.ops import _payload_list
+from nvtx.plugins.tf.ops import _start_domain_name
+from nvtx.plugins.tf.ops import _string_constant
+
+
+def _serializable(cls):
+    """Registers the layer so models can be loaded without custom_objects."""
+    register = getattr(tf.keras.utils, 'register_keras_serializable', None)
+    if register is None:
+        return cls
+    return register(package='NVTXPlugins')(cls)
+
+
+def _start(x, message, domain_name, null_input):
+    """Opens a range on the nested inputs ``x``, returns the outputs, the
+    marker id and the domain handle."""
+    def nvtx_op(inputs):
+        if _in_xla_context():
+            return nvtx_tf_ops.nvtx_start_v2(
+                inputs=inputs, message=message, domain_name=domain_name,
+                null_input=null_input)
+        return nvtx_tf_ops.nvtx_start(
+            inputs=inputs, message=_string_constant(message),
+            domain_name=_string_constant(domain_name),
+            null_input=null_input, payload=_payload_list(None))
 
+    x, (_, marker_id, domain_handle) = _open_nested(x, nvtx_op)
+    return x, marker_id, domain_handle
 
+
+def _end(x, marker_id, domain_handle, grad_message, grad_domain_name,
+         domain_name):
+    """Closes a range on the nested inputs ``x``, returns the outputs."""
+    def nvtx_op(inputs):
+        if _in_xla_context():
+            return nvtx_tf_ops.nvtx_end_v2(
+                inputs=inputs, marker_id=marker_id,
+                domain_handle=domain_handle, grad_message=grad_message,
+                grad_domain_name=grad_domain_name,
+                domain_name=_start_domain_name(marker_id, domain_name))
+        return nvtx_tf_ops.nvtx_end(
+            inputs=inputs, marker_id=marker_id, domain_handle=domain_handle,
+            grad_message=_string_constant(grad_message),
+            grad_domain_name=_string_constant(grad_domain_name))
+
+    x, _ = _close_nested(x, nvtx_op)
+    return x
+
+
+@_serializable
 class NVTXStart(Layer):
     """An identity layer with a side effect of opening an NVTX marker.
 
@@ -40,31 +98,37 @@ class NVTXStart(Layer):
                         grad_domain_name='backwards')([x, marker_id, domain_id])
 
     Arguments:
-        message: A ``string`` message to be associated with this layer.
+        message: A ``string`` message to be associated with this layer. If
+            not provided the name scope the layer is called in is used, e.g.
+            the path of the enclosing layers, or the name of the layer.
         domain_name: An optional ``string`` domain name to be associated with
             this layer. If not provided the default NVTX domain will be used.
         trainable: ``bool``, if ``True`` will make this layer trainable.
             Used when this is the first layer in the graph to
             prevent an open ended marker during gradient calculation.
+        enabled: ``bool``, if ``False`` the layer is an identity and adds no
+            NVTX op to the graph.
         name: An optional ``string`` name for the layer.
 
     Input shape:
-        A ``Tensor`` object that is passed to ``output``.
+        A ``Tensor`` or a nested structure of ``Tensor`` objects, e.g. a
+        ``dict`` of features, that is passed to ``output``.
 
     Output shape:
         ``list`` of length 3:
-            - output: The inputs ``Tensor``.
+            - output: The inputs, with the same structure.
             - marker_id: ``int64 Tensor``, sent to :func:`NVTXEnd <NVTXEnd>`.
             - domain_handle: ``int64 Tensor``. sent to :func:`NVTXEnd <NVTXEnd>`.
 
     """
 
-    def __init__(self, message, domain_name=None,
-                 trainable=False, **kwargs):
+    def __init__(self, message=None, domain_name=None,
+                 trainable=False, enabled=True, **kwargs):
         super(NVTXStart, self).__init__(**kwargs)
         self.message = message
         self.domain_name = domain_name or ''
         self.trainable = trainable
+        self.enabled = enabled
 
     def build(self, input_shape):
         self.null_input = 1.
@@ -74,15 +138,31 @@ class NVTXStart(Layer):
         super(NVTXStart, self).build(input_shape)
 
     def call(self, x):
-        x, marker_id, domain_handle = nvtx_tf_ops.nvtx_start(inputs=x,
-            message=self.message, domain_name=self.domain_name,
-            null_input=self.null_input)
+        if not self.enabled or nvtx_tf_ops is None or not should_emit():
+            null_id = tf.zeros((), dtype=tf.int64)
+            return [x, null_id, null_id]
+
+        # The layer opens a name scope of its own
+        message = self.message or scope_message(default=self.name,
+                                                skip_last=True)
+        x, marker_id, domain_handle = _start(
+            x, message, rank_domain_name(self.domain_name), self.null_input)
         return [x, marker_id, domain_handle]
 
     def compute_output_shape(self, input_shape):
         return [input_shape, (), ()]
 
+    def get_config(self):
+        config = {
+            'message': self.message,
+            'domain_name': self.domain_name,
+            'enabled': self.enabled,
+        }
+        base_config = super(NVTXStart, self).get_config()
+        return dict(list(base_config.items()) + list(config.items()))
+
 
+@_serializable
 class NVTXEnd(Layer):
     """An identity layer with a side effect of closing an NVTX marker.
 
@@ -106,23 +186,34 @@ class NVTXEnd(Layer):
         grad_domain_name: An optional ``string`` domain name to be associated
             with this marker gradient. If not provided the default domain name
             will be used.
+        domain_name: An optional ``string``, the domain name of the matching
+            :func:`NVTXStart <NVTXStart>` layer. Only used when the model is
+            compiled with XLA on GPU and ``marker_id`` is not the output of
+            an :func:`NVTXStart <NVTXStart>` layer, otherwise the domain
+            name is taken from that layer.
+        enabled: ``bool``, if ``False`` the layer is an identity and adds no
+            NVTX op to the graph.
         name: An optional ``string`` name for the layer.
 
     Input shape:
         ``list`` of length 3:
-            - inputs: The input ``Tensor``.
+            - inputs: The input ``Tensor`` or nested structure of ``Tensor``
+              objects.
             - marker_id: ``int64 Tensor`` from :func:`NVTXStart <NVTXStart>`.
             - domain_handle: ``int64 Tensor`` from :func:`NVTXStart <NVTXStart>`.
 
     Output shape:
-            A ``Tensor`` with ``inputs`` shape.
+            The inputs, with the same structure.
 
     """
 
-    def __init__(self, grad_message=None, grad_domain_name=None, **kwargs):
+    def __init__(self, grad_message=None, grad_domain_name=None,
+                 domain_name=None, enabled=True, **kwargs):
         super(NVTXEnd, self).__init__(**kwargs)
         self.grad_message = grad_message or ''
         self.grad_domain_name = grad_domain_name or ''
+        self.domain_name = domain_name or ''
+        self.enabled = enabled
 
     def build(self, input_shape):
         super(NVTXEnd, self).build(input_shape)
@@ -130,12 +221,182 @@ class NVTXEnd(Layer):
     def call(self, x):
         assert isinstance(x, list) and (len(x) == 3)
         inputs, marker_id, domain_handle = x
-        output, _ = nvtx_tf_ops.nvtx_end(inputs=inputs, marker_id=marker_id,
-                                         domain_handle=domain_handle,
-                                         grad_message=self.grad_message,
-                                         grad_domain_name=self.grad_domain_name)
-        return output
+        if not self.enabled or nvtx_tf_ops is None or not should_emit():
+            return inputs
+
+        return _end(inputs, marker_id, domain_handle, self.grad_message,
+                    rank_domain_name(self.grad_domain_name),
+                    rank_domain_name(self.domain_name))
 
     def compute_output_shape(self, input_shape):
         assert isinstance(input_shape, list)
         return [input_shape[0], ()]
+
+    def get_config(self):
+        config = {
+            'grad_message': self.grad_message,
+            'grad_domain_name': self.grad_domain_name,
+            'domain_name': self.domain_name,
+            'enabled': self.enabled,
+        }
+        base_config = super(NVTXEnd, self).get_config()
+        return dict(list(base_config.items()) + list(config.items()))
+
+
+@_serializable
+class NVTXMark(Layer):
+    """An identity layer with a side effect of marking an instantaneous NVTX
+    event when its inputs are available.
+
+    Example:
+        .. highlight:: python
+        .. code-block:: python
+
+            x = Dense(1024, activation='relu')(x)
+            x = NVTXMark(message='Embedding ready', domain_name='forward')(x)
+
+    Arguments:
+        message: A ``string`` message to be associated with the event. If not
+            provided the name scope the layer is called in is used, e.g. the
+            path of the enclosing layers, or the name of the layer.
+        domain_name: An optional ``string`` domain name to be associated with
+            the event. If not provided the default NVTX domain will be used.
+        payload: An optional integer or floating point number attached to the
+            event.
+        enabled: ``bool``, if ``False`` the layer is an identity and adds no
+            NVTX op to the graph.
+        name: An optional ``string`` name for the layer.
+
+    Input shape:
+        A ``Tensor`` object that is passed to ``output``.
+
+    Output shape:
+        A ``Tensor`` with ``inputs`` shape.
+
+    """
+
+    def __init__(self, message=None, domain_name=None, payload=None,
+                 enabled=True, **kwargs):
+        super(NVTXMark, self).__init__(**kwargs)
+        self.message = message
+        self.domain_name = domain_name or ''
+        self.payload = payload
+        self.enabled = enabled
+
+    def call(self, x):
+        # The layer opens a name scope of its own
+        message = self.message or scope_message(default=self.name,
+                                                skip_last=True)
+        return mark(x, message=message, domain_name=self.domain_name,
+                    payload=self.payload, enabled=self.enabled)
+
+    def compute_output_shape(self, input_shape):
+        return input_shape
+
+    def get_config(self):
+        config = {
+            'message': self.message,
+            'domain_name': self.domain_name,
+            'payload': self.payload,
+            'enabled': self.enabled,
+        }
+        base_config = super(NVTXMark, self).get_config()
+        return dict(list(base_config.items()) + list(config.items()))
+
+
+@_serializable
+class NVTXWrap(Wrapper):
+    """Wraps a layer in an NVTX range, the forward pass of the layer in a
+    range and its gradient in a gradient range.
+
+    Unlike the :func:`NVTXStart <NVTXStart>` and :func:`NVTXEnd <NVTXEnd>`
+    pairs the wrapper takes and returns the inputs and outputs of the wrapped
+    layer, the layers of a model or a block of layers can be instrumented
+    without changing the graph around them.
+
+    Note:
+        The wrapped layer runs after the range is opened, the range is closed
+        once all the outputs of the layer are available. The inputs and
+        outputs can be nested structures, e.g. a ``dict`` of features.
+
+    Example:
+        .. highlight:: python
+        .. code-block:: python
+
+            x = NVTXWrap(Dense(1024, activation='relu'),
+                         domain_name='forward',
+                         grad_domain_name='backwards')(x)
+
+            # the model can be saved and loaded without custom_objects
+            model.save(path)
+            model = tf.keras.models.load_model(path)
+
+    Arguments:
+        layer: The ``tf.keras.layers.Layer`` to wrap, e.g. a block of layers
+            in a ``tf.keras.Sequential`` model.
+        message: A ``string`` message to be associated with the range. If not
+            provided the name of the wrapped layer is used.
+        domain_name: An optional ``string`` domain name to be associated with
+            the range. If not provided the default NVTX domain will be used.
+        grad_message: An optional ``string`` message to be associated with
+            the gradient range. If not provided ``message`` will be used.
+        grad_domain_name: An optional ``string`` domain name to be associated
+            with the gradient range. If not provided ``domain_name`` will be
+            used.
+        first_layer: ``bool``, set to ``True`` if the wrapped layer is
+            applied to the inputs of the model, a trainable weight is then
+            added to prevent an open ended gradient range.
+        enabled: ``bool``, if ``False`` the wrapper calls the layer and adds
+            no NVTX op to the graph.
+        name: An optional ``string`` name for the layer.
+
+    """
+
+    def __init__(self, layer, message=None, domain_name=None,
+                 grad_message=None, grad_domain_name=None, first_layer=False,
+                 enabled=True, **kwargs):
+        super(NVTXWrap, self).__init__(layer, **kwargs)
+        self.message = message
+        self.domain_name = domain_name or ''
+        self.grad_message = grad_message
+        self.grad_domain_name = grad_domain_name
+        self.first_layer = first_layer
+        self.enabled = enabled
+
+    def build(self, input_shape=None):
+        self.null_input = 1.
+        if self.first_layer:
+            self.null_input = self.add_weight(name='null_input', shape=(),
+                                              trainable=True, dtype='float32')
+        super(NVTXWrap, self).build(input_shape)
+
+    def call(self, inputs, *args, **kwargs):
+        if not self.enabled or nvtx_tf_ops is None or not should_emit():
+            return self.layer(inputs, *args, **kwargs)
+
+        message = self.message or self.layer.name
+        domain_name = rank_domain_name(self.domain_name)
+        grad_domain_name = rank_domain_name(
+            self.grad_domain_name or self.domain_name)
+
+        inputs, marker_id, domain_handle = _start(
+            inputs, message, domain_name, self.null_input)
+        outputs = self.layer(inputs, *args, **kwargs)
+        return _end(outputs, marker_id, domain_handle,
+                    self.grad_message or message, grad_domain_name,
+                    domain_name)
+
+    def compute_output_shape(self, input_shape):
+        return self.layer.compute_output_shape(input_shape)
+
+    def get_config(self):
+        config = {
+            'message': self.message,
+            'domain_name': self.domain_name,
+            'grad_message': self.grad_message,
+            'grad_domain_name': self.grad_domain_name,
+            'first_layer': self.first_layer,
+            'enabled': self.enabled,
+        }
+        base_config = super(NVTXWrap, self).get_config()
+        return dict(list(base_config.items()) + list(config.items()))
@@ -0,0 +1,174 @@
+# ! /usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2019, NVIDIA CORPORATION. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Keras models.
+"""
+
+import contextlib
+
+import tensorflow as tf
+
+from nvtx.plugins.tf.ops import _in_xla_context
+from nvtx.plugins.tf.ranges import range as nvtx_range
+
+__all__ = ['NVTXModelMixin', 'NVTXModel']
+
+
+def _unpack_x_y_sample_weight(data):
+    unpack = getattr(tf.keras.utils, 'unpack_x_y_sample_weight', None)
+    if unpack is None:
+        from tensorflow.python.keras.engine import data_adapter
+        unpack = data_adapter.unpack_x_y_sample_weight
+    return unpack(data)
+
+
+class _StepRanges(object):
+    """Opens the NVTX ranges of a train step.
+
+    In graph mode the step outputs depend on the closing ops, so the ranges
+    are kept even when the step is traced in a loop body.
+    """
+
+    def __init__(self, domain_name):
+        self.domain_name = domain_name
+        self.tokens = []
+
+    @contextlib.contextmanager
+    def range(self, message):
+        step_range = nvtx_range(message, domain_name=self.domain_name)
+        if tf.executing_eagerly():
+            with step_range:
+                yield
+            return
+
+        scope = step_range._open_graph_range()
+        try:
+            yield
+        except BaseException:
+            scope.control_deps.__exit__(None, None, None)
+            raise
+        self.tokens.append(step_range._close_graph_range(scope))
+
+    def outputs(self, outputs):
+        if not self.tokens:
+            return outputs
+
+        with tf.control_dependencies(self.tokens):
+            return tf.nest.map_structure(
+                lambda t: tf.identity(t) if isinstance(t, tf.Tensor) else t,
+                outputs, expand_composites=True)
+
+
+class NVTXModelMixin(object):
+    """A ``tf.keras.Model`` mixin adding NVTX ranges to the phases of
+    ``train_step``.
+
+    Every training step gets a ``Forward``, ``Loss``, ``Gradients`` and
+    ``Optimizer`` range inside the compiled train function, about eight ops
+    per step, nested in a ``step N`` range named after the iteration counter
+    of the model. The step ranges are emitted inside the compiled loop, so
+    they stay accurate with ``steps_per_execution > 1``.
+
+    Note:
+        Inside a train function compiled with XLA the step ranges are named
+        ``step``, XLA can not compute the message.
+
+    Note:
+        The mixin replaces ``train_step``, models overriding it should
+        instrument their own step with :class:`nvtx.plugins.tf.range
+        <nvtx.plugins.tf.range>`.
+
+    Example:
+        .. highlight:: python
+        .. code-block:: python
+
+            class MyModel(NVTXModelMixin, tf.keras.Model):
+                ...
+
+            # or with the functional API
+            model = NVTXModel(inputs=inputs, outputs=outputs)
+
+    Attributes:
+        nvtx_domain_name: The ``string`` domain name of the ranges. Defaults
+            to ``Train step``.
+        nvtx_step_ranges: ``bool``, if ``False`` the ``step N`` ranges are
+            not emitted.
+
+    """
+
+    nvtx_domain_name = 'Train step'
+    nvtx_step_ranges = True
+
+    def _nvtx_step_message(self):
+        counter = getattr(self, '_train_counter', None)
+        if counter is None or _in_xla_context():
+            return 'step'
+        if tf.executing_eagerly():
+            return 'step %d' % counter.numpy()
+        return tf.strings.format('step {}', counter)
+
+    def _nvtx_compute_loss(self, x, y, y_pred, sample_weight):
+        if hasattr(self, 'compute_loss'):
+            return self.compute_loss(x, y, y_pred, sample_weight)
+        return self.compiled_loss(y, y_pred, sample_weight,
+                                  regularization_losses=self.losses)
+
+    def _nvtx_compute_metrics(self, x, y, y_pred, sample_weight):
+        if hasattr(self, 'compute_metrics'):
+            return self.compute_metrics(x, y, y_pred, sample_weight)
+        self.compiled_metrics.update_state(y, y_pred, sample_weight)
+        return {m.name: m.result() for m in self.metrics}
+
+    def train_step(self, data):
+        ranges = _StepRanges(self.nvtx_domain_name)
+        if not self.nvtx_step_ranges:
+            return ranges.outputs(self._nvtx_train_step(data, ranges))
+
+        with ranges.range(self._nvtx_step_message()):
+            outputs = self._nvtx_train_step(data, ranges)
+        return ranges.outputs(outputs)
+
+    def _nvtx_train_step(self, data, ranges):
+        x, y, sample_weight = _unpack_x_y_sample_weight(data)
+        # Mixed precision: the loss is scaled to compute the gradients
+        loss_scaling = hasattr(self.optimizer, 'get_scaled_loss')
+
+        with tf.GradientTape() as tape:
+            with ranges.range('Forward'):
+                y_pred = self(x, training=True)
+            with ranges.range('Loss'):
+                loss = self._nvtx_compute_loss(x, y, y_pred, sample_weight)
+                if loss_scaling:
+                    loss = self.optimizer.get_scaled_loss(loss)
+
+        with ranges.range('Gradients'):
+            trainable_variables = self.trainable_variables
+            gradients = tape.gradient(loss, trainable_variables)
+            if loss_scaling:
+                gradients = self.optimizer.get_unscaled_gradients(gradients)
+
+        with ranges.range('Optimizer'):
+            self.optimizer.apply_gradients(
+                zip(gradients, trainable_variables))
+
+        return self._nvtx_compute_metrics(x, y, y_pred, sample_weight)
+
+
+class NVTXModel(NVTXModelMixin, tf.keras.Model):
+    """A ``tf.keras.Model`` with NVTX ranges around the phases of
+    ``train_step``, see :class:`NVTXModelMixin <NVTXModelMixin>`.
+    """
@@ -0,0 +1,74 @@
+# ! /usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2019, NVIDIA CORPORATION. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Range messages and domains derived from name scopes, function names and
+Keras layer paths.
+"""
+
+import sys
+
+from tensorflow.python.framework import ops
+
+__all__ = ['AUTO', 'intern_name', 'scope_message', 'scope_domain',
+           'function_message']
+
+
+class _Auto(object):
+    def __repr__(self):
+        return 'AUTO'
+
+
+# Pass as ``domain_name`` (or ``message``) to derive it from the name scope
+AUTO = _Auto()
+
+
+def intern_name(name):
+    """Returns the canonical copy of ``name`` from the per-process string
+    table, so the derived names of repeated graph builds are shared."""
+    return sys.intern(name)
+
+
+def _name_scope(skip_last=False):
+    scope = ops.get_name_scope()
+    if skip_last:
+        scope = scope.rpartition('/')[0]
+    return scope
+
+
+def scope_message(default=None, skip_last=False):
+    """Returns the current name scope, e.g. ``model/encoder/dense_1``.
+
+    Arguments:
+        default: The ``string`` returned outside of any name scope.
+        skip_last: ``bool``, if ``True`` the innermost scope is left out,
+            e.g. the scope opened by a Keras layer for itself.
+
+    """
+    return intern_name(_name_scope(skip_last) or default or 'range')
+
+
+def scope_domain(skip_last=False):
+    """Returns the outermost name scope, e.g. ``model``, or ``''`` for the
+    default domain."""
+    return intern_name(_name_scope(skip_last).partition('/')[0])
+
+
+def function_message(func):
+    """Returns the qualified name of ``func``, e.g. ``Model.train_step``."""
+    name = getattr(func, '__qualname__', None) or \
+        getattr(func, '__name__', None) or 'range'
+    return intern_name(name)
@@ -0,0 +1,271 @@
+# ! /usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2019, NVIDIA CORPORATION. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Direct NVTX calls from python, outside of the TensorFlow graph.
+"""
+
+import ctypes
+import threading
+import types
+import warnings
+
+__all__ = ['EventAttributes', 'NvtxLibrary', 'NullNvtxLibrary', 'get_libnvtx']
+
+
+NVTX_VERSION = 2
+
+NVTX_MESSAGE_TYPE_ASCII = 1
+
+NVTX_PAYLOAD_TYPE_UNKNOWN = 0
+NVTX_PAYLOAD_TYPE_UNSIGNED_INT64 = 1
+NVTX_PAYLOAD_TYPE_INT64 = 2
+NVTX_PAYLOAD_TYPE_DOUBLE = 3
+
+# Event attributes are cached per message, up to this number of messages
+_MAX_CACHED_ATTRIBUTES = 4096
+
+# Prefix of the NVTX C API exported by the op library
+OP_LIBRARY_PREFIX = 'NvtxPlugins_'
+
+
+class _Payload(ctypes.Union):
+    _fields_ = [
+        ('ullValue', ctypes.c_uint64),
+        ('llValue', ctypes.c_int64),
+        ('dValue', ctypes.c_double),
+        ('uiValue', ctypes.c_uint32),
+        ('iValue', ctypes.c_int32),
+        ('fValue', ctypes.c_float),
+    ]
+
+
+class _Message(ctypes.Union):
+    _fields_ = [
+        ('ascii', ctypes.c_char_p),
+        ('unicode', ctypes.c_wchar_p),
+        ('registered', ctypes.c_void_p),
+    ]
+
+
+class EventAttributes(ctypes.Structure):
+    """ctypes mirror of ``nvtxEventAttributes_t``."""
+    _fields_ = [
+        ('version', ctypes.c_uint16),
+        ('size', ctypes.c_uint16),
+        ('category', ctypes.c_uint32),
+        ('colorType', ctypes.c_int32),
+        ('color', ctypes.c_uint32),
+        ('payloadType', ctypes.c_int32),
+        ('reserved0', ctypes.c_int32),
+        ('payload', _Payload),
+        ('messageType', ctypes.c_int32),
+        ('message', _Message),
+    ]
+
+
+class NvtxLibrary(object):
+    """Thin wrapper around the NVTX C API with typed entry points and a
+    registry of NVTX domains.
+
+    Arguments:
+        lib: A ``ctypes.CDLL`` exporting the NVTX C API, ``libnvToolsExt`` or
+            the op library.
+        prefix: The ``string`` prefix of the exported function names.
+
+    """
+
+    available = True
+
+    def __init__(self, lib, prefix=''):
+        self.lib = types.SimpleNamespace()
+        self._domains = {}
+        self._attributes = {}
+        self._lock = threading.Lock()
+
+        def bind(name, argtypes, restype):
+            function = getattr(lib, prefix + name)
+            function.argtypes = argtypes
+            function.restype = restype
+            setattr(self.lib, name, function)
+
+        attributes_p = ctypes.POINTER(EventAttributes)
+
+        bind('nvtxDomainCreateA', [ctypes.c_char_p], ctypes.c_void_p)
+
+        bind('nvtxRangePushEx', [attributes_p], ctypes.c_int)
+        bind('nvtxRangePop', [], ctypes.c_int)
+        bind('nvtxDomainRangePushEx', [ctypes.c_void_p, attributes_p],
+             ctypes.c_int)
+        bind('nvtxDomainRangePop', [ctypes.c_void_p], ctypes.c_int)
+
+        bind('nvtxRangeStartEx', [attributes_p], ctypes.c_uint64)
+        bind('nvtxDomainRangeStartEx', [ctypes.c_void_p, attributes_p],
+             ctypes.c_uint64)
+        bind('nvtxRangeEnd', [ctypes.c_uint64], None)
+        bind('nvtxDomainRangeEnd', [ctypes.c_void_p, ctypes.c_uint64], None)
+
+        bind('nvtxMarkEx', [attributes_p], None)
+        bind('nvtxDomainMarkEx', [ctypes.c_void_p, attributes_p], None)
+
+    def domain(self, domain_name):
+        """Returns the handle of ``domain_name``, ``None`` for the default
+        domain."""
+        if not domain_name:
+            return None
+
+        handle = self._domains.get(domain_name)
+        if handle is None:
+            with self._lock:
+                handle = self._domains.get(domain_name)
+                if handle is None:
+                    handle = self.lib.nvtxDomainCreateA(
+                        domain_name.encode('utf-8'))
+                    self._domains[domain_name] = handle
+        return handle
+
+    @staticmethod
+    def _new_event_attributes(message):
+        attributes = EventAttributes()
+        attributes.version = NVTX_VERSION
+        attributes.size = ctypes.sizeof(EventAttributes)
+        attributes.messageType = NVTX_MESSAGE_TYPE_ASCII
+        attributes.message.ascii = message.encode('utf-8')
+        return attributes
+
+    def event_attributes(self, message, payload=None):
+        """Returns ``EventAttributes`` with an ASCII ``message`` and an
+        optional ``int`` or ``float`` payload."""
+        if payload is not None:
+            # Payloads change with every event, they are not cached
+            attributes = self._new_event_attributes(message)
+            if isinstance(payload, float):
+                attributes.payloadType = NVTX_PAYLOAD_TYPE_DOUBLE
+                attributes.payload.dValue = payload
+            else:
+                attributes.payloadType = NVTX_PAYLOAD_TYPE_INT64
+                attributes.payload.llValue = int(payload)
+            return attributes
+
+        attributes = self._attributes.get(message)
+        if attributes is None:
+            attributes = self._new_event_attributes(message)
+            if len(self._attributes) < _MAX_CACHED_ATTRIBUTES:
+                self._attributes[message] = attributes
+        return attributes
+
+    def push(self, message, domain_handle=None, payload=None):
+        attributes = self.event_attributes(message, payload)
+        if domain_handle is None:
+            return self.lib.nvtxRangePushEx(attributes)
+        return self.lib.nvtxDomainRangePushEx(domain_handle, attributes)
+
+    def pop(self, domain_handle=None):
+        if domain_handle is None:
+            return self.lib.nvtxRangePop()
+        return self.lib.nvtxDomainRangePop(domain_handle)
+
+    def start(self, message, domain_handle=None, payload=None):
+        attributes = self.event_attributes(message, payload)
+        if domain_handle is None:
+            return self.lib.nvtxRangeStartEx(attributes)
+        return self.lib.nvtxDomainRangeStartEx(domain_handle, attributes)
+
+    def end(self, range_id, domain_handle=None):
+        if domain_handle is None:
+            self.lib.nvtxRangeEnd(range_id)
+        else:
+            self.lib.nvtxDomainRangeEnd(domain_handle, range_id)
+
+    def mark(self, message, domain_handle=None, payload=None):
+        attributes = self.event_attributes(message, payload)
+        if domain_handle is None:
+            self.lib.nvtxMarkEx(attributes)
+        else:
+            self.lib.nvtxDomainMarkEx(domain_handle, attributes)
+
+
+class NullNvtxLibrary(object):
+    """Stands in for :class:`NvtxLibrary` when ``libnvToolsExt`` can not be
+    loaded, e.g. on hosts without CUDA. Every call is a no-op.
+    """
+
+    available = False
+
+    def domain(self, domain_name):
+        return None
+
+    def push(self, message, domain_handle=None, payload=None):
+        return 0
+
+    def pop(self, domain_handle=None):
+        return 0
+
+    def start(self, message, domain_handle=None, payload=None):
+        return 0
+
+    def end(self, range_id, domain_handle=None):
+        pass
+
+    def mark(self, message, domain_handle=None, payload=None):
+        pass
+
+
+_libnvtx = None
+_libnvtx_lock = threading.Lock()
+
+
+def _load_op_library():
+    """Returns an :class:`NvtxLibrary` using the NVTX C API exported by the
+    op library, ``None`` if it is not available."""
+    try:
+        from nvtx.plugins.tf import ops
+        if not ops.is_available():
+            return None
+        return NvtxLibrary(ctypes.CDLL(ops.get_library_path()),
+                           prefix=OP_LIBRARY_PREFIX)
+    except (ImportError, OSError, AttributeError):
+        # TensorFlow is missing or the library does not export the C API
+        return None
+
+
+def get_libnvtx():
+    """Returns the process wide :class:`NvtxLibrary`.
+
+    The NVTX C API exported by the op library is used if it is available,
+    the op library is built with the header-only NVTX v3 API. Otherwise
+    ``libnvToolsExt.so`` is loaded. If neither can be loaded a warning is
+    issued once and a :class:`NullNvtxLibrary` is returned, instrumented code
+    then runs without NVTX ranges.
+
+    """
+    global _libnvtx
+
+    if _libnvtx is None:
+        with _libnvtx_lock:
+            if _libnvtx is None:
+                libnvtx = _load_op_library()
+                if libnvtx is None:
+                    try:
+                        libnvtx = NvtxLibrary(
+                            ctypes.cdll.LoadLibrary('libnvToolsExt.so'))
+                    except OSError as e:
+                        warnings.warn(
+                            'NVTX ranges are disabled, libnvToolsExt.so '
+                            'could not be loaded: %s' % e, RuntimeWarning)
+                        libnvtx = NullNvtxLibrary()
+                _libnvtx = libnvtx
+    return _libnvtx
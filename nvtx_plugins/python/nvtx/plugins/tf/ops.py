@@ -15,31 +15,179 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import warnings
+import weakref
+
 import wrapt
 import tensorflow as tf
 
 from tensorflow.python.framework import ops
+from tensorflow.python.ops import control_flow_util
 
+from nvtx.plugins.tf.counters import COUNTERS_DOMAIN_NAME
+from nvtx.plugins.tf.distributed import rank_domain_name
+from nvtx.plugins.tf.distributed import should_emit
 from nvtx.plugins.tf.ext_utils import load_library
 from nvtx.plugins.tf.ext_utils import get_ext_suffix
+from nvtx.plugins.tf.ext_utils import get_library_path as _get_library_path
+from nvtx.plugins.tf.naming import AUTO
+from nvtx.plugins.tf.naming import function_message
+from nvtx.plugins.tf.naming import scope_domain
+from nvtx.plugins.tf.naming import scope_message
+from nvtx.plugins.tf.serving import get_request_id
+
+__all__ = ['nvtx_tf_ops', 'is_available', 'get_library_path', 'start', 'end',
+           'push', 'pop', 'mark', 'counter', 'trace']
+
+
+_LIBRARY_NAME = 'lib/nvtx_ops' + get_ext_suffix()
+
+try:
+    nvtx_tf_ops = load_library(_LIBRARY_NAME)
+except (tf.errors.NotFoundError, OSError) as e:
+    # The library was not built or libnvToolsExt is missing, the ops are
+    # left out of the graph
+    warnings.warn('NVTX ops are disabled, the op library could not be '
+                  'loaded: %s' % e, RuntimeWarning)
+    nvtx_tf_ops = None
+
+
+def is_available():
+    """Returns ``True`` if the NVTX op library is loaded.
+
+    Otherwise :func:`start <start>`, :func:`end <end>`, :func:`trace <trace>`
+    and the Keras layers are identities and add no op to the graph.
+
+    """
+    return nvtx_tf_ops is not None
+
+
+def get_library_path():
+    """Returns the path of the NVTX op library.
+
+    Models instrumented with NVTX ops and exported as SavedModel need the op
+    library to be loaded by the serving binary, e.g. with
+    ``tf.load_op_library`` or ``TF_LoadLibrary``. To link the ops statically
+    in TensorFlow Serving use the Bazel targets of ``nvtx_plugins/cc/BUILD``.
+
+    """
+    return _get_library_path(_LIBRARY_NAME)
+
+
+def _in_xla_context():
+    """Returns ``True`` when building a function compiled with XLA."""
+    return not tf.executing_eagerly() and \
+        control_flow_util.GraphOrParentsInXlaContext(
+            tf.compat.v1.get_default_graph())
+
+
+# Scalar string constants of the messages and domain names per graph, the
+# ops of a graph share one Const op per string
+_string_constants = weakref.WeakKeyDictionary()
 
-__all__ = ['nvtx_tf_ops', 'start', 'end', 'trace']
 
+def _string_constant(value):
+    """Returns the scalar string ``Tensor`` of ``value`` shared by the NVTX
+    ops of the current graph, ``value`` itself if it is already a ``Tensor``
+    or when executing eagerly."""
+    if isinstance(value, tf.Tensor) or tf.executing_eagerly():
+        return value
 
-nvtx_tf_ops = load_library('lib/nvtx_ops' + get_ext_suffix())
+    graph = tf.compat.v1.get_default_graph()
+    constants = _string_constants.setdefault(graph, {})
+    constant = constants.get(value)
+    if constant is None:
+        # Outside of the control dependencies and control flow contexts the
+        # constant can be used by any op of the graph
+        with graph.control_dependencies(None):
+            constant = tf.constant(value, dtype=tf.string,
+                                   name='nvtx_string')
+        constants[value] = constant
+    return constant
+
+
+def _start_domain_name(marker_id, default=''):
+    """Returns the domain name of the NvtxStartV2 op producing ``marker_id``,
+    or ``default`` if ``marker_id`` is produced by another op."""
+    op = getattr(marker_id, 'op', None)
+    if op is not None and op.type == 'NvtxStartV2':
+        return op.get_attr('domain_name')
+    return default
+
+
+def _flatten(inputs):
+    """Returns the leaves of the nested ``inputs`` and the indices of their
+    ``Tensor`` objects, the first one is passed through the NVTX op.
+
+    Composite tensors, e.g. ``SparseTensor`` and ``RaggedTensor`` objects,
+    are expanded into their component tensors, they are not densified.
+    """
+    flat_inputs = tf.nest.flatten(inputs, expand_composites=True)
+    indices = [idx for idx, leaf in enumerate(flat_inputs)
+               if isinstance(leaf, tf.Tensor)]
+    if not indices:
+        raise ValueError('The inputs of an NVTX op must contain a Tensor, '
+                         'got %r' % (inputs,))
+    return flat_inputs, indices
+
+
+def _open_nested(inputs, nvtx_op):
+    """Passes the first ``Tensor`` of the nested ``inputs`` through
+    ``nvtx_op``, the other ones are forwarded once the op ran.
+
+    The leaves are not copied, the other tensors go through a single
+    ``IdentityN`` op with a control dependency on the NVTX op.
+
+    Returns:
+        The nested outputs and the outputs of ``nvtx_op``.
+    """
+    flat_inputs, indices = _flatten(inputs)
+    outputs = nvtx_op(flat_inputs[indices[0]])
+    output = outputs if isinstance(outputs, tf.Tensor) else outputs[0]
+    flat_inputs[indices[0]] = output
+
+    if len(indices) > 1 and not tf.executing_eagerly():
+        with tf.control_dependencies([output.op]):
+            forwarded = tf.identity_n([flat_inputs[idx]
+                                       for idx in indices[1:]])
+        for idx, tensor in zip(indices[1:], forwarded):
+            flat_inputs[idx] = tensor
+
+    return tf.nest.pack_sequence_as(inputs, flat_inputs,
+                                    expand_composites=True), outputs
+
+
+def _close_nested(inputs, nvtx_op):
+    """Passes the first ``Tensor`` of the nested ``inputs`` through
+    ``nvtx_op`` once all of them are available.
+
+    Returns:
+        The nested outputs and the outputs of ``nvtx_op``.
+    """
+    flat_inputs, indices = _flatten(inputs)
+    with tf.control_dependencies([flat_inputs[idx] for idx in indices[1:]]):
+        outputs = nvtx_op(flat_inputs[indices[0]])
+    output = outputs if isinstance(outputs, tf.Tensor) else outputs[0]
+    flat_inputs[indices[0]] = output
 
-def _maybe_convert_list_to_tensor(inputs):
+    return tf.nest.pack_sequence_as(inputs, flat_inputs,
+                                    expand_composites=True), outputs
 
-    inputs_were_processed = False
 
-    if isinstance(inputs, (list, tuple)) and \
-        all([isinstance(x, tf.Tensor) for x in inputs]):
-        inputs = tf.stack(inputs, axis=0, name="nvtx_trace_inputs")
-        inputs_were_processed = True
+def _payload_list(payload):
+    """Converts an optional scalar payload to the ``NvtxStart`` payload list.
 
-    assert isinstance(inputs, tf.Tensor)
+    Defaults to the request id of the current :func:`request_scope
+    <nvtx.plugins.tf.serving.request_scope>`.
+    """
+    if payload is None:
+        payload = get_request_id()
+    if payload is None:
+        return []
 
-    return inputs, inputs_were_processed
+    payload = tf.convert_to_tensor(payload)
+    dtype = tf.float64 if payload.dtype.is_floating else tf.int64
+    return [tf.cast(payload, dtype)]
 
 
 @ops.RegisterGradient('NvtxStart')
@@ -52,26 +200,88 @@ def _nvtx_start_grad(op, grad, marker_id, domain_handle):
     grad, null_grad = nvtx_tf_ops.nvtx_end(inputs=grad,
         marker_id=marker_id, domain_handle=domain_handle,
         grad_message=op.inputs[2], grad_domain_name=op.inputs[3])
-    return [grad, null_grad, None, None]
+    # message, domain_name and the optional payload are not differentiable
+    return [grad, null_grad] + [None] * (len(op.inputs) - 2)
 
 
 @ops.RegisterGradient('NvtxEnd')
 def _nvtx_end_grad(op, grad, null_grad):
     grad, marker_id, domain_handle = nvtx_tf_ops.nvtx_start(
         inputs=grad, null_input=1.,
-        message=op.inputs[3], domain_name=op.inputs[4])
+        message=op.inputs[3], domain_name=op.inputs[4], payload=[])
     return [grad, marker_id, domain_handle, None, None]
 
 
-def start(inputs, message, domain_name=None,
+@ops.RegisterGradient('NvtxStartV2')
+def _nvtx_start_v2_grad(op, grad, marker_id, domain_handle):
+    if not isinstance(marker_id, tf.Tensor) and marker_id is None:
+        raise RuntimeError('Error in nvtx range %s. '
+                           'Make sure all nvtx ranges are closed' % op.name)
+
+    # domain of the gradient range opened by the NvtxEndV2 gradient
+    grad, null_grad = nvtx_tf_ops.nvtx_end_v2(inputs=grad,
+        marker_id=marker_id, domain_handle=domain_handle,
+        grad_message=op.get_attr('message'),
+        grad_domain_name=op.get_attr('domain_name'),
+        domain_name=_start_domain_name(marker_id))
+    return [grad, null_grad]
+
+
+@ops.RegisterGradient('NvtxEndV2')
+def _nvtx_end_v2_grad(op, grad, null_grad):
+    grad, marker_id, domain_handle = nvtx_tf_ops.nvtx_start_v2(
+        inputs=grad, null_input=1.,
+        message=op.get_attr('grad_message'),
+        domain_name=op.get_attr('grad_domain_name'))
+    return [grad, marker_id, domain_handle]
+
+
+@ops.RegisterGradient('NvtxPush')
+def _nvtx_push_grad(op, grad):
+    return nvtx_tf_ops.nvtx_pop(
+        inputs=grad, domain_name=op.get_attr('grad_domain_name'),
+        grad_message=op.get_attr('message'),
+        grad_domain_name=op.get_attr('domain_name'))
+
+
+@ops.RegisterGradient('NvtxPop')
+def _nvtx_pop_grad(op, grad):
+    return nvtx_tf_ops.nvtx_push(
+        inputs=grad, message=op.get_attr('grad_message'),
+        domain_name=op.get_attr('grad_domain_name'),
+        grad_domain_name=op.get_attr('domain_name'))
+
+
+@ops.RegisterGradient('NvtxMark')
+def _nvtx_mark_grad(op, grad):
+    # The payload is not differentiable
+    return [grad] + [None] * (len(op.inputs) - 1)
+
+
+class _PushContext(object):
+    """NVTX context of :func:`push <push>`, no tensor is needed to pop the
+    range."""
+
+    def __init__(self, domain_name, grad_message, grad_domain_name):
+        self.domain_name = domain_name
+        self.grad_message = grad_message
+        self.grad_domain_name = grad_domain_name
+
+
+def start(inputs, message=None, domain_name=None,
           grad_message=None, grad_domain_name=None,
-          trainable=False, enabled=True, name=None):
+          trainable=False, enabled=True, name=None, payload=None):
     """An identity operation with a side effect of opening an NVTX marker.
 
     Note:
         The :func:`ops.start <start>` and :func:`ops.end <end>` operations
         must be used in pairs.
 
+    Note:
+        Inside a function compiled with XLA (``jit_compile=True``) the
+        ``message`` and domain names must be python strings. The ops are not
+        compiled by XLA auto-clustering and split the clusters.
+
     Example:
         .. highlight:: python
         .. code-block:: python
@@ -83,11 +293,23 @@ def start(inputs, message, domain_name=None,
             x = tf.layers.dense(x, 1024, activation=tf.nn.relu, name='dense_3')
             x = nvtx.plugins.tf.ops.end(x, nvtx_context)
 
+            # message 'encoder/block_1', domain 'encoder'
+            with tf.name_scope('encoder'), tf.name_scope('block_1'):
+                x, nvtx_context = nvtx.plugins.tf.ops.start(
+                    x, domain_name=nvtx.plugins.tf.naming.AUTO)
+
     Arguments:
-        inputs: A ``Tensor`` object that is passed to ``output``.
-        message: A ``string`` message to be associated with this marker.
+        inputs: A ``Tensor`` or a nested structure of ``Tensor`` objects,
+            e.g. a ``dict`` of features, that is passed to ``output``. The
+            ops consuming the tensors run after the range is opened.
+            ``SparseTensor`` and ``RaggedTensor`` objects are passed through
+            component by component, without being densified.
+        message: A ``string`` message to be associated with this marker. If
+            not provided the current name scope is used.
         domain_name: An optional ``string`` domain name to be associated with
             this marker. If not provided the default NVTX domain will be used.
+            If :data:`naming.AUTO <nvtx.plugins.tf.naming.AUTO>` the
+            outermost name scope is used.
         grad_message: An optional ``string`` message to be associated with
             the op gradient. If not provided ``message`` will be used.
         grad_domain_name: An optional ``string`` domain name to be associated
@@ -97,21 +319,36 @@ def start(inputs, message, domain_name=None,
             trainable. Used when this is the first operation in the graph to
             prevent an open ended marker during gradient calculation.
         enabled: ``bool``, if ``False`` the nvtx marker will be disabled.
+            The marker is also disabled on the ranks excluded by
+            :func:`set_rank_policy <nvtx.plugins.tf.distributed.set_rank_policy>`.
         name: An optional `string` name for the operation.
+        payload: An optional scalar integer or floating point number or
+            ``Tensor`` attached to the range, e.g. a number of bytes. Defaults
+            to the request id of the current :func:`request_scope
+            <nvtx.plugins.tf.serving.request_scope>`. Ignored inside a
+            function compiled with XLA.
 
     Returns:
         ``tuple``:
-        - output: The inputs ``Tensor``.
+        - output: The inputs, with the same structure.
         - nvtx_context: ``list``, NVTX context associated with this op and passed to :func:`ops.end <end>`. ``None``  if ``enabled=False``.
 
     """
-    if not enabled:
+    if not enabled or nvtx_tf_ops is None or not should_emit():
         return inputs, None
 
+    if message is None or message is AUTO:
+        message = scope_message()
+    if domain_name is AUTO:
+        domain_name = scope_domain()
+
     domain_name = domain_name or ''
     grad_message = grad_message or message
     grad_domain_name = grad_domain_name or domain_name or ''
 
+    domain_name = rank_domain_name(domain_name)
+    grad_domain_name = rank_domain_name(grad_domain_name)
+
     null_input = 1.
 
     if trainable:
@@ -121,16 +358,23 @@ def start(inputs, message, domain_name=None,
                                                    initializer=tf.zeros_initializer,
                                                    trainable=True)
 
-    inputs, should_unstack = _maybe_convert_list_to_tensor(inputs)
+    if _in_xla_context():
+        def nvtx_op(x):
+            return nvtx_tf_ops.nvtx_start_v2(
+                inputs=x, null_input=null_input,
+                message=message, domain_name=domain_name, name=name)
+    else:
+        def nvtx_op(x):
+            return nvtx_tf_ops.nvtx_start(
+                inputs=x, null_input=null_input,
+                message=_string_constant(message),
+                domain_name=_string_constant(domain_name),
+                payload=_payload_list(payload), name=name)
 
-    inputs, marker_id, domain_handle = nvtx_tf_ops.nvtx_start(
-        inputs=inputs, null_input=null_input,
-        message=message, domain_name=domain_name, name=name)
+    inputs, (_, marker_id, domain_handle) = _open_nested(inputs, nvtx_op)
 
-    if should_unstack:
-        inputs = tf.unstack(inputs, axis=0)
-
-    return inputs, (marker_id, domain_handle, grad_message, grad_domain_name)
+    return inputs, (marker_id, domain_handle, grad_message, grad_domain_name,
+                    domain_name)
 
 
 def end(inputs, nvtx_context, name=None):
@@ -152,47 +396,260 @@ def end(inputs, nvtx_context, name=None):
             x = nvtx.plugins.tf.ops.end(x, nvtx_context)
 
     Arguments:
-        inputs: A ``Tensor`` object that will be passed to ``output``.
+        inputs: A ``Tensor`` or a nested structure of ``Tensor`` objects that
+            will be passed to ``output``. The range is closed once all the
+            tensors are available.
         nvtx_context: ``list``, NVTX context received from
             :func:`ops.start <start>` If `None` the marker will be disabled.
         name: An optional ``string`` name for the operation.
 
     Returns:
-        The inputs ``Tensor``.
+        The inputs, with the same structure.
 
     """
     if nvtx_context is None:
         return inputs
 
-    marker_id, domain_handle, grad_message, grad_domain_name = nvtx_context
+    marker_id, domain_handle, grad_message, grad_domain_name, domain_name = \
+        nvtx_context
+
+    if _in_xla_context():
+        def nvtx_op(x):
+            return nvtx_tf_ops.nvtx_end_v2(inputs=x,
+                marker_id=marker_id, domain_handle=domain_handle,
+                grad_message=grad_message, grad_domain_name=grad_domain_name,
+                domain_name=domain_name, name=name
+            )
+    else:
+        def nvtx_op(x):
+            return nvtx_tf_ops.nvtx_end(inputs=x,
+                marker_id=marker_id, domain_handle=domain_handle,
+                grad_message=_string_constant(grad_message),
+                grad_domain_name=_string_constant(grad_domain_name),
+                name=name
+            )
+
+    output, _ = _close_nested(inputs, nvtx_op)
 
-    inputs, should_unstack = _maybe_convert_list_to_tensor(inputs)
+    return output
 
-    output, null_output = nvtx_tf_ops.nvtx_end(inputs=inputs,
-        marker_id=marker_id, domain_handle=domain_handle,
-        grad_message=grad_message, grad_domain_name=grad_domain_name, name=name
-    )
 
-    if should_unstack:
-        output = tf.unstack(output, axis=0)
+def push(inputs, message=None, domain_name=None,
+         grad_message=None, grad_domain_name=None, enabled=True, name=None):
+    """An identity operation with a side effect of pushing an NVTX range on
+    the range stack of the executing thread.
+
+    A cheaper alternative to :func:`ops.start <start>` for strictly nested
+    regions: no marker id or domain handle tensor is allocated and passed
+    to :func:`ops.pop <pop>`, the message and domain are attributes of the
+    ops and the domain is resolved once.
+
+    Note:
+        NVTX range stacks are per thread. When the pop runs on another
+        inter-op thread than the push, the range is popped by the pushing
+        thread the next time it pushes or pops a range of the domain, so it
+        may appear longer than the region. Use :func:`ops.start <start>`
+        and :func:`ops.end <end>` for regions executed by several threads.
+        Inside a function compiled with XLA the range falls back to
+        :func:`ops.start <start>`.
+
+    Example:
+        .. highlight:: python
+        .. code-block:: python
+
+            x, nvtx_context = nvtx.plugins.tf.ops.push(x, message='Dense 1-3',
+                domain_name='Forward', grad_domain_name='Gradient')
+            x = tf.layers.dense(x, 1024, activation=tf.nn.relu, name='dense_1')
+            x = tf.layers.dense(x, 1024, activation=tf.nn.relu, name='dense_2')
+            x = tf.layers.dense(x, 1024, activation=tf.nn.relu, name='dense_3')
+            x = nvtx.plugins.tf.ops.pop(x, nvtx_context)
+
+    Arguments:
+        inputs: A ``Tensor`` or a nested structure of ``Tensor`` objects that
+            is passed to ``output``.
+        message: A python ``string`` message to be associated with this
+            range. If not provided the current name scope is used.
+        domain_name: An optional python ``string`` domain name to be
+            associated with this range. If not provided the default NVTX
+            domain will be used. If :data:`naming.AUTO
+            <nvtx.plugins.tf.naming.AUTO>` the outermost name scope is used.
+        grad_message: An optional ``string`` message to be associated with
+            the op gradient. If not provided ``message`` will be used.
+        grad_domain_name: An optional ``string`` domain name to be associated
+            with the op gradient. If not provided ``domain_name`` will be
+            used.
+        enabled: ``bool``, if ``False`` the nvtx range will be disabled.
+        name: An optional ``string`` name for the operation.
+
+    Returns:
+        ``tuple``:
+        - output: The inputs, with the same structure.
+        - nvtx_context: NVTX context passed to :func:`ops.pop <pop>`. ``None`` if the range is disabled.
+
+    """
+    if _in_xla_context():
+        return start(inputs, message=message, domain_name=domain_name,
+                     grad_message=grad_message,
+                     grad_domain_name=grad_domain_name, enabled=enabled,
+                     name=name)
+
+    if not enabled or nvtx_tf_ops is None or not should_emit():
+        return inputs, None
+
+    if message is None or message is AUTO:
+        message = scope_message()
+    if domain_name is AUTO:
+        domain_name = scope_domain()
+
+    domain_name = domain_name or ''
+    grad_message = grad_message or message
+    grad_domain_name = grad_domain_name or domain_name
+
+    domain_name = rank_domain_name(domain_name)
+    grad_domain_name = rank_domain_name(grad_domain_name)
+
+    inputs, _ = _open_nested(inputs, lambda x: nvtx_tf_ops.nvtx_push(
+        inputs=x, message=message, domain_name=domain_name,
+        grad_domain_name=grad_domain_name, name=name))
+
+    return inputs, _PushContext(domain_name, grad_message, grad_domain_name)
+
+
+def pop(inputs, nvtx_context, name=None):
+    """An identity operation with a side effect of popping the NVTX range
+    pushed by :func:`ops.push <push>`.
+
+    Arguments:
+        inputs: A ``Tensor`` or a nested structure of ``Tensor`` objects that
+            will be passed to ``output``.
+        nvtx_context: NVTX context received from :func:`ops.push <push>`. If
+            ``None`` the range is disabled.
+        name: An optional ``string`` name for the operation.
+
+    Returns:
+        The inputs, with the same structure.
+
+    """
+    if nvtx_context is None:
+        return inputs
+    if not isinstance(nvtx_context, _PushContext):
+        # ops.push fell back to ops.start
+        return end(inputs, nvtx_context, name=name)
+
+    output, _ = _close_nested(inputs, lambda x: nvtx_tf_ops.nvtx_pop(
+        inputs=x, domain_name=nvtx_context.domain_name,
+        grad_message=nvtx_context.grad_message,
+        grad_domain_name=nvtx_context.grad_domain_name, name=name))
+
+    return output
+
+
+def mark(inputs, message=None, domain_name=None, payload=None,
+         enabled=True, name=None):
+    """An identity operation with a side effect of marking an instantaneous
+    NVTX event, e.g. a learning rate change or a dataset epoch rollover.
+
+    Note:
+        Marks are left out of functions compiled with XLA.
+
+    Example:
+        .. highlight:: python
+        .. code-block:: python
+
+            lr = nvtx.plugins.tf.ops.mark(lr, message='Learning rate',
+                                          payload=lr)
+
+    Arguments:
+        inputs: A ``Tensor`` or a nested structure of ``Tensor`` objects that
+            is passed to ``output``, the event
+            is marked when it is available.
+        message: A python ``string`` message to be associated with this
+            event. If not provided the current name scope is used.
+        domain_name: An optional python ``string`` domain name to be
+            associated with this event. If not provided the default NVTX
+            domain will be used. If :data:`naming.AUTO
+            <nvtx.plugins.tf.naming.AUTO>` the outermost name scope is used.
+        payload: An optional scalar integer or floating point number or
+            ``Tensor`` attached to the event. Defaults to the request id of
+            the current :func:`request_scope
+            <nvtx.plugins.tf.serving.request_scope>`.
+        enabled: ``bool``, if ``False`` no event is marked.
+        name: An optional ``string`` name for the operation.
+
+    Returns:
+        The inputs, with the same structure.
+
+    """
+    if not enabled or nvtx_tf_ops is None or not should_emit() or \
+            _in_xla_context():
+        return inputs
+
+    if message is None or message is AUTO:
+        message = scope_message()
+    if domain_name is AUTO:
+        domain_name = scope_domain()
+
+    domain_name = rank_domain_name(domain_name or '')
+    output, _ = _close_nested(inputs, lambda x: nvtx_tf_ops.nvtx_mark(
+        inputs=x, message=message, domain_name=domain_name,
+        payload=_payload_list(payload), name=name))
 
     return output
 
 
-def trace(message, domain_name=None,
+def counter(inputs, counter_name, value, domain_name=COUNTERS_DOMAIN_NAME,
+            enabled=True, name=None):
+    """An identity operation with a side effect of emitting a counter sample,
+    e.g. the depth of a queue or the number of tokens of a batch.
+
+    The sample is an NVTX event named ``counter_name`` with ``value`` as its
+    ``double`` payload, see :mod:`nvtx.plugins.tf.counters`.
+
+    Example:
+        .. highlight:: python
+        .. code-block:: python
+
+            x = nvtx.plugins.tf.ops.counter(x, 'queue depth', queue.size())
+
+    Arguments:
+        inputs: A ``Tensor`` or a nested structure of ``Tensor`` objects that
+            is passed to ``output``, the sample
+            is emitted when it is available.
+        counter_name: A python ``string``, the name of the counter.
+        value: A scalar number or ``Tensor``, the value of the counter.
+        domain_name: An optional python ``string`` domain name of the sample.
+            Defaults to ``Counters``.
+        enabled: ``bool``, if ``False`` no sample is emitted.
+        name: An optional ``string`` name for the operation.
+
+    Returns:
+        The inputs, with the same structure.
+
+    """
+    if not enabled:
+        return inputs
+    return mark(inputs, message=counter_name, domain_name=domain_name,
+                payload=tf.cast(value, tf.float64), name=name)
+
+
+def trace(message=None, domain_name=None,
           grad_message=None, grad_domain_name=None,
           trainable=False, enabled=True, name=None):
     """An identity function decorator with a side effect of adding NVTX marker.
 
     Note:
-        The decorator expects the wrapped function to take the input ``Tensor``
-        as the first argument or to be named ``inputs``, and to return a single
-        ``Tensor``.
+        The decorator expects the wrapped function to take the input ``Tensor``,
+        or nested structure of ``Tensor`` objects, as the first argument or
+        to be named ``inputs``, and to return a ``Tensor`` or a nested
+        structure of ``Tensor`` objects.
 
     Arguments:
-        message: A ``string`` message to be associated with this marker.
+        message: A ``string`` message to be associated with this marker. If
+            not provided the qualified name of the function is used.
         domain_name: An optional ``string`` domain name to be associated with
             this marker. If not provided the default NVTX domain will be used.
+            If :data:`naming.AUTO <nvtx.plugins.tf.naming.AUTO>` the
+            outermost name scope is used.
         grad_message: An optional ``string`` message to be associated with
             the op gradient. If not provided `message` will be used.
         grad_domain_name: An optional ``string`` domain name to be associated
@@ -213,20 +670,16 @@ def trace(message, domain_name=None,
             raise ValueError("The input tensor must be the first argument"
                              " or named `inputs`")
 
-        inputs, should_unstack = _maybe_convert_list_to_tensor(inputs)
-
         start_name = '{}_start'.format(name) if name else None
         end_name = '{}_end'.format(name) if name else None
 
         inputs, nvtx_context = start(inputs=inputs,
-            message=message, domain_name=domain_name,
+            message=function_message(wrapped) if message is None else message,
+            domain_name=domain_name,
             grad_message=grad_message, grad_domain_name=grad_domain_name,
             enabled=enabled, trainable=trainable, name=start_name
         )
 
-        if should_unstack:
-            inputs = tf.unstack(inputs, axis=0)
-
         if "inputs" in kwargs:
             kwargs["inputs"] = inputs
         else:
@@ -0,0 +1,300 @@
+# ! /usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2019, NVIDIA CORPORATION. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""NVTX range context manager and decorator.
+"""
+
+import wrapt
+import tensorflow as tf
+
+from tensorflow.python.framework.func_graph import FuncGraph
+
+from nvtx.plugins.tf import control
+from nvtx.plugins.tf import ops as nvtx_ops
+from nvtx.plugins.tf.naming import AUTO
+from nvtx.plugins.tf.naming import function_message
+from nvtx.plugins.tf.naming import scope_domain
+from nvtx.plugins.tf.naming import scope_message
+from nvtx.plugins.tf.distributed import rank_domain_name
+from nvtx.plugins.tf.distributed import should_emit
+from nvtx.plugins.tf.native import get_libnvtx
+from nvtx.plugins.tf.serving import get_request_id
+
+__all__ = ['range', 'mark']
+
+# Returned by range._push when the range is not pushed, the domain handle of
+# the default domain is None
+_NOT_PUSHED = object()
+
+
+class _GraphScope(object):
+    def __init__(self, graph, token, nvtx_context, control_deps, num_ops):
+        self.graph = graph
+        self.token = token
+        self.nvtx_context = nvtx_context
+        self.control_deps = control_deps
+        self.num_ops = num_ops
+
+
+class range(object):
+    """A context manager and function decorator opening an NVTX range.
+
+    When executing eagerly the range is pushed and popped directly with the
+    NVTX C API, bypassing TensorFlow op dispatch. When tracing a
+    ``tf.function`` the :func:`ops.start <nvtx.plugins.tf.ops.start>` and
+    :func:`ops.end <nvtx.plugins.tf.ops.end>` graph operations are emitted
+    around the ops created inside the range.
+
+    Note:
+        As a context manager in graph mode the range is only supported inside
+        a ``tf.function``. In TF1 graphs use it as a decorator or use the
+        :func:`ops.start <nvtx.plugins.tf.ops.start>` and
+        :func:`ops.end <nvtx.plugins.tf.ops.end>` operations.
+
+    Example:
+        .. highlight:: python
+        .. code-block:: python
+
+            with nvtx.plugins.tf.range('Preprocessing', domain_name='Data'):
+                x = preprocess(x)
+
+            @nvtx.plugins.tf.range('Train step', domain_name='Train')
+            def train_step(x, y):
+                ...
+
+            @nvtx.plugins.tf.range()  # named 'train_step'
+            def train_step(x, y):
+                ...
+
+    Arguments:
+        message: A ``string`` message to be associated with this range. If
+            not provided the current name scope is used, or the qualified
+            name of the function when used as a decorator.
+        domain_name: An optional ``string`` domain name to be associated with
+            this range. If not provided the default NVTX domain will be used.
+            If :data:`naming.AUTO <nvtx.plugins.tf.naming.AUTO>` the
+            outermost name scope is used.
+        enabled: ``bool``, if ``False`` the nvtx range will be disabled.
+
+    """
+
+    def __init__(self, message=None, domain_name=None, enabled=True):
+        self.message = message
+        self.domain_name = domain_name or ''
+        self.enabled = enabled
+        self._libnvtx = None
+        self._scopes = []
+
+    def _message(self, func=None):
+        if self.message is not None and self.message is not AUTO:
+            return self.message
+        if func is not None:
+            return function_message(func)
+        return scope_message()
+
+    def _push(self, func=None):
+        """Pushes the range and returns its domain handle, ``_NOT_PUSHED`` if
+        the range is disabled on this rank or by the live control."""
+        if not should_emit():
+            return _NOT_PUSHED
+        if self._libnvtx is None:
+            self._libnvtx = get_libnvtx()
+
+        domain_name = self.domain_name
+        if domain_name is AUTO:
+            domain_name = scope_domain()
+        domain_name = rank_domain_name(domain_name or '')
+        if not control.should_emit(domain_name, detailed=True):
+            return _NOT_PUSHED
+
+        # The domain handles are cached by the library
+        domain_handle = self._libnvtx.domain(domain_name)
+        self._libnvtx.push(self._message(func), domain_handle)
+        return domain_handle
+
+    def _pop(self, domain_handle):
+        if domain_handle is not _NOT_PUSHED:
+            self._libnvtx.pop(domain_handle)
+
+    def _open_graph_range(self, func=None):
+        graph = tf.compat.v1.get_default_graph()
+
+        token, nvtx_context = nvtx_ops.start(
+            tf.constant(0.), message=self._message(func),
+            domain_name=self.domain_name)
+        # The range is disabled on this rank
+        marker_id = [] if nvtx_context is None else [nvtx_context[0]]
+
+        # Ops created inside the range run after the range is opened
+        control_deps = graph.control_dependencies(marker_id)
+        control_deps.__enter__()
+
+        return _GraphScope(graph, token, nvtx_context, control_deps,
+                           len(graph.get_operations()))
+
+    def _close_graph_range(self, scope):
+        scope.control_deps.__exit__(None, None, None)
+        if scope.nvtx_context is None:
+            return scope.token
+
+        # The range is closed after the last ops created inside of it
+        block_ops = scope.graph.get_operations()[scope.num_ops:]
+        consumers = set(consumer for op in block_ops
+                        for output in op.outputs
+                        for consumer in output.consumers())
+        last_ops = [op for op in block_ops if op not in consumers]
+
+        with scope.graph.control_dependencies(last_ops):
+            return nvtx_ops.end(scope.token, scope.nvtx_context)
+
+    def __enter__(self):
+        if not self.enabled:
+            return self
+
+        if tf.executing_eagerly():
+            self._scopes.append(self._push())
+            return self
+
+        if not isinstance(tf.compat.v1.get_default_graph(), FuncGraph):
+            raise RuntimeError(
+                'nvtx.plugins.tf.range can only be used as a context manager '
+                'eagerly or inside a tf.function. Use it as a decorator or '
+                'use nvtx.plugins.tf.ops.start and nvtx.plugins.tf.ops.end '
+                'instead.')
+
+        self._scopes.append(self._open_graph_range())
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self.enabled:
+            return False
+
+        scope = self._scopes.pop()
+        if not isinstance(scope, _GraphScope):
+            # The domain handle of an eager range
+            self._pop(scope)
+            return False
+
+        token = self._close_graph_range(scope)
+        # Nothing consumes the closing op, make sure it is not pruned
+        scope.graph.control_outputs.append(token.op)
+        return False
+
+    def __call__(self, func):
+        @wrapt.decorator
+        def func_wrapper(wrapped, instance, args, kwargs):
+            if not self.enabled:
+                return wrapped(*args, **kwargs)
+
+            if tf.executing_eagerly():
+                domain_handle = self._push(wrapped)
+                try:
+                    return wrapped(*args, **kwargs)
+                finally:
+                    self._pop(domain_handle)
+
+            scope = self._open_graph_range(wrapped)
+            try:
+                outputs = wrapped(*args, **kwargs)
+            except BaseException:
+                scope.control_deps.__exit__(None, None, None)
+                raise
+            token = self._close_graph_range(scope)
+
+            tensors = [t for t in tf.nest.flatten(outputs,
+                                                  expand_composites=True)
+                       if isinstance(t, tf.Tensor)]
+            if not tensors:
+                if not isinstance(scope.graph, FuncGraph):
+                    raise RuntimeError(
+                        'A function decorated with nvtx.plugins.tf.range '
+                        'must return a Tensor in TF1 graph mode.')
+                scope.graph.control_outputs.append(token.op)
+                return outputs
+
+            # The outputs are available once the range is closed
+            with scope.graph.control_dependencies([token]):
+                return tf.nest.map_structure(
+                    lambda t: tf.identity(t) if isinstance(t, tf.Tensor)
+                    else t, outputs, expand_composites=True)
+
+        return func_wrapper(func)
+
+
+def mark(message=None, domain_name=None, payload=None, enabled=True):
+    """Marks an instantaneous NVTX event.
+
+    When executing eagerly the event is marked directly with the NVTX C API.
+    Inside a ``tf.function`` a :func:`ops.mark <nvtx.plugins.tf.ops.mark>`
+    operation is added to the function and runs with it.
+
+    Example:
+        .. highlight:: python
+        .. code-block:: python
+
+            nvtx.plugins.tf.mark('Dataset rollover', domain_name='Data',
+                                 payload=epoch)
+
+    Arguments:
+        message: A ``string`` message to be associated with this event. If
+            not provided the current name scope is used.
+        domain_name: An optional ``string`` domain name to be associated with
+            this event. If not provided the default NVTX domain will be used.
+            If :data:`naming.AUTO <nvtx.plugins.tf.naming.AUTO>` the
+            outermost name scope is used.
+        payload: An optional scalar integer or floating point number attached
+            to the event, a ``Tensor`` inside a ``tf.function``.
+        enabled: ``bool``, if ``False`` no event is marked.
+
+    Returns:
+        The ``Operation`` marking the event in graph mode, ``None`` when
+        executing eagerly.
+
+    """
+    if not enabled:
+        return None
+
+    if not tf.executing_eagerly():
+        graph = tf.compat.v1.get_default_graph()
+        # NvtxMark is stateful, identical marks are neither folded nor merged
+        token = nvtx_ops.mark(tf.constant(0.), message=message,
+                              domain_name=domain_name, payload=payload)
+        if not isinstance(token, tf.Tensor) or token.op.type != 'NvtxMark':
+            return None
+        if isinstance(graph, FuncGraph):
+            # Nothing consumes the mark, make sure it is not pruned
+            graph.control_outputs.append(token.op)
+        return token.op
+
+    if not should_emit():
+        return None
+    if message is None or message is AUTO:
+        message = scope_message()
+    if domain_name is AUTO:
+        domain_name = scope_domain()
+    if payload is None:
+        payload = get_request_id()
+    if payload is not None and not isinstance(payload, (int, float)):
+        payload = payload.numpy().item()
+
+    domain_name = rank_domain_name(domain_name or '')
+    if not control.should_emit(domain_name, detailed=True):
+        return None
+
+    libnvtx = get_libnvtx()
+    libnvtx.mark(message, libnvtx.domain(domain_name), payload=payload)
+    return None
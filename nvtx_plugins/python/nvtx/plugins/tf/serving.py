@@ -0,0 +1,120 @@
+# ! /usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2019, NVIDIA CORPORATION. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Per-request NVTX ranges for exported models.
+"""
+
+import contextlib
+import threading
+
+import tensorflow as tf
+
+__all__ = ['REQUEST_ID_NAME', 'request_scope', 'get_request_id',
+           'serving_function']
+
+
+# Name of the request id input added to the serving signatures
+REQUEST_ID_NAME = 'nvtx_request_id'
+
+_request_ids = threading.local()
+
+
+def _stack():
+    if not hasattr(_request_ids, 'stack'):
+        _request_ids.stack = []
+    return _request_ids.stack
+
+
+@contextlib.contextmanager
+def request_scope(request_id):
+    """A context manager attaching ``request_id`` as payload to the ranges
+    created inside of it.
+
+    The :func:`ops.start <nvtx.plugins.tf.ops.start>` operations and the
+    :func:`NVTXStart <nvtx.plugins.tf.keras.layers.NVTXStart>` layers created
+    in the scope use the request id as payload, unless an explicit payload is
+    given.
+
+    Arguments:
+        request_id: An integer scalar ``Tensor`` or python ``int``.
+
+    """
+    _stack().append(request_id)
+    try:
+        yield request_id
+    finally:
+        _stack().pop()
+
+
+def get_request_id():
+    """Returns the request id of the innermost :func:`request_scope
+    <request_scope>`, ``None`` outside of a request scope."""
+    stack = _stack()
+    return stack[-1] if stack else None
+
+
+def serving_function(function, input_signature, message='Request',
+                     domain_name='Serving', request_id_name=REQUEST_ID_NAME):
+    """Returns a ``tf.function`` to export as a SavedModel signature, opening
+    an NVTX range for every request.
+
+    The signature takes an additional ``int64`` scalar input, the request id,
+    attached as payload to the request range and to the ranges of the
+    instrumented blocks of ``function``, so the latency of a request can be
+    attributed to the blocks of the model.
+
+    Note:
+        The op library must be loaded by the serving binary, see
+        :func:`ops.get_library_path <nvtx.plugins.tf.ops.get_library_path>`.
+
+    Example:
+        .. highlight:: python
+        .. code-block:: python
+
+            serve = nvtx.plugins.tf.serving.serving_function(
+                model, [tf.TensorSpec([None, 8], tf.float32, name='x')])
+            tf.saved_model.save(model, export_dir,
+                                signatures={'serving_default': serve})
+
+    Arguments:
+        function: A python callable or ``tf.keras.Model`` returning a
+            ``Tensor`` or a ``dict`` of ``Tensor`` objects.
+        input_signature: A ``list`` of ``tf.TensorSpec`` of the inputs of
+            ``function``.
+        message: A ``string`` message of the request ranges.
+        domain_name: An optional ``string`` domain name of the request
+            ranges.
+        request_id_name: A ``string``, the name of the request id input.
+
+    Returns:
+        A ``tf.function`` with ``input_signature`` and the request id as
+        input signature.
+
+    """
+    from nvtx.plugins.tf.ranges import range as nvtx_range
+
+    input_signature = list(input_signature) + [
+        tf.TensorSpec([], tf.int64, name=request_id_name)]
+
+    @tf.function(input_signature=input_signature)
+    def serve(*args):
+        inputs, request_id = args[:-1], args[-1]
+        with request_scope(request_id):
+            with nvtx_range(message, domain_name=domain_name):
+                return function(*inputs)
+
+    return serve
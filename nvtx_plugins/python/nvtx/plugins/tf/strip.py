@@ -0,0 +1,420 @@
+# ! /usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2019, NVIDIA CORPORATION. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Removes the NVTX instrumentation from graphs and models.
+
+The same model definition can be profiled with NVTX ranges and deployed
+without them: the stripped graphs have no NVTX node, no host memory
+constraint and no stacked inputs left.
+"""
+
+import os
+
+import tensorflow as tf
+
+from tensorflow.core.framework import graph_pb2
+from tensorflow.core.framework import node_def_pb2
+from tensorflow.core.protobuf import saved_model_pb2
+
+__all__ = ['NVTX_OP_TYPES', 'strip_graph_def', 'strip_saved_model',
+           'strip_model']
+
+
+NVTX_OP_TYPES = frozenset([
+    'NvtxStart',
+    'NvtxEnd',
+    'NvtxStartV2',
+    'NvtxEndV2',
+    'NvtxPush',
+    'NvtxPop',
+    'NvtxMark',
+])
+
+# Ops only feeding NVTX nodes, e.g. messages, null inputs and the stacking of
+# list inputs, that are removed with them
+_REMOVABLE_OP_TYPES = frozenset([
+    'Cast',
+    'Const',
+    'Identity',
+    'Pack',
+    'ReadVariableOp',
+    'Unpack',
+])
+
+_SAVED_MODEL_FILENAME = 'saved_model.pb'
+_SAVED_MODEL_DIRS = ('variables', 'assets', 'assets.extra')
+
+
+class _NodeRewriter(object):
+    """Removes the NVTX nodes of a ``GraphDef`` or ``FunctionDef`` body and
+    connects their consumers to their inputs.
+
+    Tensor names are ``node:index`` in a ``GraphDef`` and
+    ``node:output_name:index`` in a ``FunctionDef``, where names without a
+    colon are function arguments.
+    """
+
+    def __init__(self, nodes, is_function):
+        self.nodes = {node.name: node for node in nodes}
+        # Inputs before rewriting, the nodes are rewritten in place
+        self.inputs = {node.name: list(node.input) for node in nodes}
+        self.is_function = is_function
+        self.new_nodes = []
+        self._controls = {}
+
+    def split(self, tensor_name):
+        """Returns the ``(node_name, port, is_control)`` of an input."""
+        if tensor_name.startswith('^'):
+            return tensor_name[1:], None, True
+
+        parts = tensor_name.split(':')
+        if self.is_function:
+            if len(parts) == 1:
+                return parts[0], None, False
+            return parts[0], ':'.join(parts[1:]), False
+        return parts[0], int(parts[1]) if len(parts) > 1 else 0, False
+
+    def _port_index(self, port):
+        if self.is_function:
+            return int(port.split(':')[-1])
+        return port
+
+    def is_nvtx(self, node_name):
+        node = self.nodes.get(node_name)
+        return node is not None and node.op in NVTX_OP_TYPES
+
+    def _is_passthrough(self, port):
+        return port in (0, 'output:0')
+
+    def _null_output(self, node_name):
+        """Returns a zero constant replacing the ``null_output`` gradient
+        plumbing of a NvtxEnd node."""
+        name = node_name + '/stripped_null_output'
+        if name not in self.nodes:
+            node = node_def_pb2.NodeDef()
+            node.name = name
+            node.op = 'Const'
+            node.device = self.nodes[node_name].device
+            node.attr['dtype'].type = tf.float32.as_datatype_enum
+            node.attr['value'].tensor.CopyFrom(
+                tf.compat.v1.make_tensor_proto(0., dtype=tf.float32))
+            self.nodes[name] = node
+            self.inputs[name] = []
+            self.new_nodes.append(node)
+        return name + (':output:0' if self.is_function else '')
+
+    def resolve(self, tensor_name, consumer):
+        """Returns the tensor to use instead of ``tensor_name``, skipping
+        NVTX nodes and the stacking of their list inputs."""
+        node_name, port, _ = self.split(tensor_name)
+
+        if self.is_nvtx(node_name):
+            if self._is_passthrough(port):
+                return self.resolve(self.inputs[node_name][0], consumer)
+            if self.nodes[node_name].op.startswith('NvtxEnd') and \
+                    port in (1, 'null_output:0'):
+                return self._null_output(node_name)
+            raise ValueError(
+                'Can not strip NVTX op %s: %s consumes its output %s.' %
+                (node_name, consumer, tensor_name))
+
+        # tf.unstack(nvtx_op(tf.stack(inputs))) is replaced by the inputs
+        node = self.nodes.get(node_name)
+        if node is not None and node.op == 'Unpack':
+            unpack_input = self.inputs[node_name][0]
+            packed = self.resolve(unpack_input, consumer)
+            pack_name, pack_port, _ = self.split(packed)
+            pack = self.nodes.get(pack_name)
+            if packed != unpack_input and pack is not None and \
+                    pack.op == 'Pack' and self._is_passthrough(pack_port) and \
+                    pack.attr['axis'].i == node.attr['axis'].i and \
+                    pack.attr['N'].i == node.attr['num'].i:
+                return self.resolve(
+                    self.inputs[pack_name][self._port_index(port)], consumer)
+
+        return tensor_name
+
+    def resolve_control(self, node_name):
+        """Returns the control inputs to use instead of a control dependency
+        on ``node_name``."""
+        if not self.is_nvtx(node_name):
+            # Function arguments can not be control inputs
+            return ['^' + node_name] if node_name in self.nodes else []
+
+        if node_name not in self._controls:
+            controls = []
+            for idx, tensor_name in enumerate(self.inputs[node_name]):
+                input_name, _, is_control = self.split(tensor_name)
+                # The data input, the control inputs and the range opened
+                # by a NvtxStart node
+                if not (idx == 0 or is_control or self.is_nvtx(input_name)):
+                    continue
+
+                # Stacked inputs are replaced by the tensors they stack
+                input_node = self.nodes.get(input_name)
+                if idx == 0 and input_node is not None and \
+                        input_node.op == 'Pack':
+                    input_names = [self.split(name)[0]
+                                   for name in self.inputs[input_name]]
+                else:
+                    input_names = [input_name]
+
+                for name in input_names:
+                    for control in self.resolve_control(name):
+                        if control not in controls:
+                            controls.append(control)
+            self._controls[node_name] = controls
+        return self._controls[node_name]
+
+    def rewrite_inputs(self, node):
+        data_inputs = []
+        control_inputs = []
+        for tensor_name in self.inputs[node.name]:
+            node_name, _, is_control = self.split(tensor_name)
+            if not is_control:
+                data_inputs.append(self.resolve(tensor_name, node.name))
+                continue
+
+            for control in self.resolve_control(node_name):
+                if control not in control_inputs and \
+                        control != '^' + node.name:
+                    control_inputs.append(control)
+
+        del node.input[:]
+        node.input.extend(data_inputs + control_inputs)
+
+
+def _consumed_nodes(rewriter, nodes, extra_inputs, preserved=()):
+    consumed = set(preserved)
+    for tensor_name in extra_inputs:
+        consumed.add(rewriter.split(tensor_name)[0])
+    for node in nodes:
+        for tensor_name in node.input:
+            consumed.add(rewriter.split(tensor_name)[0])
+    return consumed
+
+
+def _copy_node(node):
+    node_copy = node_def_pb2.NodeDef()
+    node_copy.CopyFrom(node)
+    return node_copy
+
+
+def _strip_nodes(nodes, is_function, outputs=(), keep_nodes=(),
+                 preserved=()):
+    """Strips a repeated ``NodeDef`` field in place.
+
+    Arguments:
+        nodes: The repeated ``NodeDef`` field.
+        is_function: ``bool``, ``True`` for the body of a ``FunctionDef``.
+        outputs: Tensor names consumed outside of ``nodes``, they are
+            resolved and returned.
+        keep_nodes: Names of NVTX nodes replaced by an ``Identity`` node
+            instead of being removed, e.g. the nodes fetched by name.
+        preserved: Names of nodes used outside of ``nodes`` that must not be
+            removed, e.g. the control outputs of a function.
+
+    Returns:
+        The resolved ``outputs``.
+    """
+    rewriter = _NodeRewriter(nodes, is_function)
+    if not any(node.op in NVTX_OP_TYPES for node in nodes):
+        return list(outputs)
+
+    consumed_before = _consumed_nodes(rewriter, nodes, outputs)
+
+    outputs = [rewriter.resolve(tensor_name, 'output')
+               for tensor_name in outputs]
+
+    kept = []
+    for node in nodes:
+        if node.op not in NVTX_OP_TYPES:
+            rewriter.rewrite_inputs(node)
+        elif node.name in keep_nodes:
+            identity = node_def_pb2.NodeDef()
+            identity.name = node.name
+            identity.op = 'Identity'
+            identity.device = node.device
+            identity.attr['T'].CopyFrom(node.attr['T'])
+            identity.input.append(rewriter.resolve(node.input[0], node.name))
+            kept.append(identity)
+
+    remaining = [node for node in nodes if node.op not in NVTX_OP_TYPES]
+    remaining += kept + rewriter.new_nodes
+
+    # Remove the nodes orphaned by the strip
+    while True:
+        consumed = _consumed_nodes(rewriter, remaining, outputs, preserved)
+        orphans = set(node.name for node in remaining
+                      if node.op in _REMOVABLE_OP_TYPES and
+                      node.name in consumed_before and
+                      node.name not in consumed)
+        if not orphans:
+            break
+        remaining = [node for node in remaining if node.name not in orphans]
+
+    # The nodes are copied before clearing the repeated field they belong to
+    remaining = [_copy_node(node) for node in remaining]
+    del nodes[:]
+    nodes.extend(remaining)
+    return outputs
+
+
+def _strip_function(function_def):
+    returns = list(function_def.ret.items())
+    outputs = _strip_nodes(function_def.node_def, is_function=True,
+                           outputs=[tensor for _, tensor in returns],
+                           preserved=set(function_def.control_ret.values()))
+    for (name, _), tensor in zip(returns, outputs):
+        function_def.ret[name] = tensor
+
+    # Drop the control outputs keeping the NVTX nodes alive
+    node_names = set(node.name for node in function_def.node_def)
+    for name, node_name in list(function_def.control_ret.items()):
+        if node_name not in node_names:
+            del function_def.control_ret[name]
+            function_def.signature.control_output.remove(name)
+
+
+def _unconsumed_nvtx_nodes(graph_def):
+    rewriter = _NodeRewriter(graph_def.node, is_function=False)
+    consumed = _consumed_nodes(rewriter, graph_def.node, ())
+    return set(node.name for node in graph_def.node
+               if node.op in NVTX_OP_TYPES and node.name not in consumed)
+
+
+def strip_graph_def(graph_def, keep_nodes=None):
+    """Returns a copy of ``graph_def`` without NVTX nodes.
+
+    The consumers of the NVTX nodes are connected to their inputs, including
+    the ``null_input`` / ``null_output`` gradient plumbing, the stacking of
+    list inputs and the functions of the graph library.
+
+    Arguments:
+        graph_def: A ``tf.compat.v1.GraphDef``.
+        keep_nodes: An optional list of NVTX node names replaced by an
+            ``Identity`` node instead of being removed, e.g. the output nodes
+            fetched by name. Defaults to the NVTX nodes without consumers.
+
+    Returns:
+        The stripped ``GraphDef``.
+
+    """
+    stripped = graph_pb2.GraphDef()
+    stripped.CopyFrom(graph_def)
+
+    if keep_nodes is None:
+        keep_nodes = _unconsumed_nvtx_nodes(stripped)
+
+    _strip_nodes(stripped.node, is_function=False,
+                 keep_nodes=frozenset(keep_nodes))
+    for function_def in stripped.library.function:
+        _strip_function(function_def)
+    return stripped
+
+
+def _signature_nodes(meta_graph_def):
+    nodes = set()
+    for signature_def in meta_graph_def.signature_def.values():
+        for tensor_info in list(signature_def.inputs.values()) + \
+                list(signature_def.outputs.values()):
+            if tensor_info.name:
+                nodes.add(tensor_info.name.split(':')[0])
+    return nodes
+
+
+def _copy_dir(src_dir, dst_dir):
+    for root, _, filenames in tf.io.gfile.walk(src_dir):
+        target = os.path.join(dst_dir, os.path.relpath(root, src_dir))
+        tf.io.gfile.makedirs(target)
+        for filename in filenames:
+            tf.io.gfile.copy(os.path.join(root, filename),
+                             os.path.join(target, filename), overwrite=True)
+
+
+def strip_saved_model(export_dir, output_dir):
+    """Writes a copy of the SavedModel ``export_dir`` without NVTX nodes to
+    ``output_dir``.
+
+    The variables and assets are copied unchanged. The stripped SavedModel
+    can be served without the NVTX op library.
+
+    Arguments:
+        export_dir: The directory of the instrumented SavedModel.
+        output_dir: The directory of the stripped SavedModel.
+
+    """
+    saved_model = saved_model_pb2.SavedModel()
+    with tf.io.gfile.GFile(
+            os.path.join(export_dir, _SAVED_MODEL_FILENAME), 'rb') as f:
+        saved_model.ParseFromString(f.read())
+
+    for meta_graph_def in saved_model.meta_graphs:
+        graph_def = meta_graph_def.graph_def
+        # Nodes fetched by the signatures keep their name
+        keep_nodes = _unconsumed_nvtx_nodes(graph_def) | \
+            _signature_nodes(meta_graph_def)
+        meta_graph_def.graph_def.CopyFrom(
+            strip_graph_def(graph_def, keep_nodes=keep_nodes))
+
+    tf.io.gfile.makedirs(output_dir)
+    with tf.io.gfile.GFile(
+            os.path.join(output_dir, _SAVED_MODEL_FILENAME), 'wb') as f:
+        f.write(saved_model.SerializeToString())
+
+    for dirname in _SAVED_MODEL_DIRS:
+        src_dir = os.path.join(export_dir, dirname)
+        if tf.io.gfile.isdir(src_dir):
+            _copy_dir(src_dir, os.path.join(output_dir, dirname))
+
+
+def strip_model(model):
+    """Returns a copy of the Keras ``model`` with disabled
+    :func:`NVTXStart <nvtx.plugins.tf.keras.layers.NVTXStart>`,
+    :func:`NVTXEnd <nvtx.plugins.tf.keras.layers.NVTXEnd>`,
+    :func:`NVTXMark <nvtx.plugins.tf.keras.layers.NVTXMark>` and
+    :func:`NVTXWrap <nvtx.plugins.tf.keras.layers.NVTXWrap>` layers.
+
+    The disabled layers are identities, or call the wrapped layer, and add no
+    NVTX op to the graph. The weights are copied, the model must be compiled
+    again.
+
+    Note:
+        Only functional and sequential models can be stripped, use
+        :func:`strip_saved_model <strip_saved_model>` for subclassed models.
+
+    Arguments:
+        model: A ``tf.keras.Model``.
+
+    Returns:
+        The stripped ``tf.keras.Model``.
+
+    """
+    from nvtx.plugins.tf.keras.layers import NVTXEnd
+    from nvtx.plugins.tf.keras.layers import NVTXMark
+    from nvtx.plugins.tf.keras.layers import NVTXStart
+    from nvtx.plugins.tf.keras.layers import NVTXWrap
+
+    def clone_layer(layer):
+        config = layer.get_config()
+        if isinstance(layer, (NVTXStart, NVTXEnd, NVTXMark, NVTXWrap)):
+            config['enabled'] = False
+        return layer.__class__.from_config(config)
+
+    stripped = tf.keras.models.clone_model(model, clone_function=clone_layer)
+    stripped.set_weights(model.get_weights())
+    return stripped
@@ -0,0 +1,280 @@
+# ! /usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2019, NVIDIA CORPORATION. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tail latency capture: detailed ranges are only kept for slow steps.
+"""
+
+import bisect
+import collections
+import ctypes
+import time
+
+from nvtx.plugins.tf.distributed import rank_domain_name
+from nvtx.plugins.tf.ext_utils import load_ctypes_library
+from nvtx.plugins.tf.ext_utils import get_ext_suffix
+from nvtx.plugins.tf.native import get_libnvtx
+
+__all__ = ['BufferedRange', 'TailLatencyCapture']
+
+
+# Number of ranges read from the op library at once
+_TAKE_BATCH_SIZE = 1024
+
+_PAYLOAD_INT64 = 1
+_PAYLOAD_DOUBLE = 2
+
+
+class _NvtxPluginsBufferedRange(ctypes.Structure):
+    # NvtxPluginsBufferedRange, see nvtx_runtime.h
+    _fields_ = [
+        ('message', ctypes.c_char * 256),
+        ('domain_name', ctypes.c_char * 64),
+        ('start_ns', ctypes.c_int64),
+        ('end_ns', ctypes.c_int64),
+        ('thread_id', ctypes.c_uint64),
+        ('payload_type', ctypes.c_int32),
+        ('int64_payload', ctypes.c_int64),
+        ('double_payload', ctypes.c_double),
+    ]
+
+
+BufferedRange = collections.namedtuple(
+    'BufferedRange',
+    ['message', 'domain_name', 'start_ns', 'end_ns', 'thread_id', 'payload'])
+BufferedRange.__doc__ = """A range of the NVTX ops kept in memory during a
+step. The timestamps are ``time.monotonic_ns()`` nanoseconds."""
+
+_op_runtime = None
+
+
+def _get_op_runtime():
+    global _op_runtime
+
+    if _op_runtime is None:
+        # The op library has to be loaded by TensorFlow first
+        from nvtx.plugins.tf.ops import nvtx_tf_ops  # noqa: F401
+
+        _op_runtime = load_ctypes_library('lib/nvtx_ops' + get_ext_suffix())
+        _op_runtime.NvtxPluginsSetBuffering.argtypes = [ctypes.c_int]
+        _op_runtime.NvtxPluginsTakeBufferedRanges.argtypes = [
+            ctypes.POINTER(_NvtxPluginsBufferedRange), ctypes.c_int]
+        _op_runtime.NvtxPluginsTakeBufferedRanges.restype = ctypes.c_int
+        _op_runtime.NvtxPluginsClearBufferedRanges.restype = ctypes.c_int
+
+    return _op_runtime
+
+
+def _op_library_loaded():
+    try:
+        from nvtx.plugins.tf import ops
+    except ImportError:
+        return False
+    return ops.is_available()
+
+
+def _take_ranges():
+    runtime = _get_op_runtime()
+    buffer = (_NvtxPluginsBufferedRange * _TAKE_BATCH_SIZE)()
+
+    ranges = []
+    while True:
+        num_ranges = runtime.NvtxPluginsTakeBufferedRanges(buffer,
+                                                           _TAKE_BATCH_SIZE)
+        for raw in buffer[:num_ranges]:
+            payload = None
+            if raw.payload_type == _PAYLOAD_INT64:
+                payload = raw.int64_payload
+            elif raw.payload_type == _PAYLOAD_DOUBLE:
+                payload = raw.double_payload
+            ranges.append(BufferedRange(
+                raw.message.decode('utf-8', 'replace'),
+                raw.domain_name.decode('utf-8', 'replace'),
+                raw.start_ns, raw.end_ns, raw.thread_id, payload))
+        if num_ranges < _TAKE_BATCH_SIZE:
+            return ranges
+
+
+class TailLatencyCapture(object):
+    """Keeps the ranges of the NVTX ops in memory during a step and emits
+    them only if the step is slow.
+
+    The coarse ranges of the callbacks, e.g. the ``batch N`` ranges, are
+    always emitted. The ranges of the ops, e.g. of the :class:`NVTXStart
+    <nvtx.plugins.tf.keras.layers.NVTXStart>` layers, are recorded into a
+    buffer of the op library while buffering is enabled. At the end of a step
+    the buffer is flushed if the step took longer than ``threshold_ms`` or
+    than the ``percentile`` of the latencies of the last ``window`` steps,
+    and dropped otherwise.
+
+    NVTX events are timestamped by the tool when they are emitted, the
+    buffered ranges can not be replayed at the time they ran. A slow step is
+    flushed as a ``slow step N`` event with the latency of the step in
+    milliseconds as payload, followed by one event per buffered range with
+    the duration of the range in milliseconds as payload, in the
+    ``domain_name`` domain. The ranges and their timestamps are also passed
+    to the ``sinks``, e.g. the flight recorder.
+
+    Note:
+        Buffering should only be enabled or disabled between steps, ranges
+        are closed where they were opened.
+
+    Example:
+        .. highlight:: python
+        .. code-block:: python
+
+            capture = TailLatencyCapture(percentile=99)
+            model.fit(dataset, callbacks=[NVTXCallback(tail_latency=capture)])
+
+    Arguments:
+        threshold_ms: An optional ``float``, steps slower than this latency in
+            milliseconds are flushed.
+        percentile: An optional ``float`` between 0 and 100, steps slower than
+            this percentile of the recent latencies are flushed.
+        window: ``int``, the number of recent step latencies the percentile
+            is computed over.
+        min_steps: ``int``, the percentile is only used once this number of
+            steps were seen.
+        domain_name: ``string``, the domain name of the flushed events.
+        sinks: An optional ``list`` of callables called with ``(step,
+            latency_ms, ranges)`` for every slow step, ``ranges`` is a
+            ``list`` of :class:`BufferedRange <BufferedRange>`.
+
+    Raises:
+        ValueError: If neither ``threshold_ms`` nor ``percentile`` is set.
+
+    """
+
+    def __init__(self, threshold_ms=None, percentile=None, window=1000,
+                 min_steps=100, domain_name='Slow steps', sinks=None):
+        if threshold_ms is None and percentile is None:
+            raise ValueError('TailLatencyCapture requires a threshold_ms or '
+                             'a percentile')
+        if percentile is not None and not 0 < percentile < 100:
+            raise ValueError('percentile must be between 0 and 100, got %s'
+                             % percentile)
+
+        self.threshold_ms = threshold_ms
+        self.percentile = percentile
+        self.min_steps = min_steps
+        self.domain_name = domain_name
+        self.sinks = list(sinks or [])
+        self.slow_step_message = 'slow step {step}'
+        self.num_slow_steps = 0
+
+        self._latencies = collections.deque(maxlen=window)
+        self._sorted_latencies = []
+        self._step_start = None
+        self._enabled = False
+
+    @property
+    def enabled(self):
+        return self._enabled
+
+    def enable(self):
+        """Starts buffering the ranges of the NVTX ops."""
+        if not _op_library_loaded():
+            return
+        _get_op_runtime().NvtxPluginsSetBuffering(1)
+        self._enabled = True
+
+    def disable(self):
+        """Stops buffering, the ranges of the NVTX ops are emitted again."""
+        if self._enabled:
+            _get_op_runtime().NvtxPluginsSetBuffering(0)
+            _get_op_runtime().NvtxPluginsClearBufferedRanges()
+        self._enabled = False
+
+    def threshold(self):
+        """Returns the latency in milliseconds above which a step is slow,
+        ``None`` until enough steps were seen."""
+        thresholds = []
+        if self.threshold_ms is not None:
+            thresholds.append(self.threshold_ms)
+        if self.percentile is not None and \
+                len(self._sorted_latencies) >= self.min_steps:
+            index = int(len(self._sorted_latencies) * self.percentile / 100.)
+            thresholds.append(self._sorted_latencies[
+                min(index, len(self._sorted_latencies) - 1)])
+        return min(thresholds) if thresholds else None
+
+    def is_slow(self, latency_ms):
+        """Returns ``True`` if a step of ``latency_ms`` is slow."""
+        threshold = self.threshold()
+        return threshold is not None and latency_ms > threshold
+
+    def _add_latency(self, latency_ms):
+        if len(self._latencies) == self._latencies.maxlen:
+            oldest = self._latencies.popleft()
+            del self._sorted_latencies[
+                bisect.bisect_left(self._sorted_latencies, oldest)]
+        self._latencies.append(latency_ms)
+        bisect.insort(self._sorted_latencies, latency_ms)
+
+    def step_begin(self):
+        """Called at the beginning of a step, the ranges recorded between
+        steps are dropped."""
+        if not self._enabled:
+            self.enable()
+        if self._enabled:
+            _get_op_runtime().NvtxPluginsClearBufferedRanges()
+        self._step_start = time.perf_counter()
+
+    def step_end(self, step, num_steps=1):
+        """Called at the end of a step, flushes the buffered ranges if the
+        step is slow.
+
+        Arguments:
+            step: ``int``, the step number used to name the flushed event.
+            num_steps: ``int``, the number of steps since
+                :meth:`step_begin <step_begin>`, e.g. with Keras
+                ``steps_per_execution``, the latency is per step.
+
+        Returns:
+            ``True`` if the step is slow.
+
+        """
+        if self._step_start is None:
+            return False
+        latency_ms = (time.perf_counter() - self._step_start) * 1000. / \
+            max(num_steps, 1)
+        self._step_start = None
+
+        slow = self.is_slow(latency_ms)
+        self._add_latency(latency_ms)
+        if not self._enabled:
+            return slow
+
+        if slow:
+            self.num_slow_steps += 1
+            self.flush(step, latency_ms, _take_ranges())
+        else:
+            _get_op_runtime().NvtxPluginsClearBufferedRanges()
+        return slow
+
+    def flush(self, step, latency_ms, ranges):
+        """Emits the ranges of a slow step and passes them to the sinks."""
+        libnvtx = get_libnvtx()
+        domain_handle = libnvtx.domain(rank_domain_name(self.domain_name))
+        libnvtx.mark(self.slow_step_message.format(step=step), domain_handle,
+                     payload=float(latency_ms))
+        for buffered_range in ranges:
+            libnvtx.mark(buffered_range.message, domain_handle,
+                         payload=(buffered_range.end_ns -
+                                  buffered_range.start_ns) / 1e6)
+
+        for sink in self.sinks:
+            sink(step, latency_ms, ranges)
@@ -0,0 +1,242 @@
+# ! /usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2019, NVIDIA CORPORATION. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Merges the NVTX events of several processes into a single timeline.
+
+Every process of a distributed job is profiled separately and exported to
+SQLite (``nsys export --type sqlite`` or ``nsys-exporter --export-sqlite``).
+The clocks of the recordings are aligned using the synchronization markers
+added by ``NVTXCallback(sync_every_n_steps=N)`` or
+``NVTXHook(sync_every_n_steps=N)``: as all the workers leave a synchronous
+step together, the same marker is assumed to happen at the same time in
+every process.
+
+Example:
+    nvtx-merge-traces --output merged.sqlite rank0.sqlite rank1.sqlite
+
+The inputs are merged in a streaming fashion, apart from the synchronization
+markers only one event per input file and one batch of output rows are held
+in memory at any time.
+"""
+
+import argparse
+import heapq
+import itertools
+import os
+import sqlite3
+import sys
+
+# Kept in sync with nvtx.plugins.tf.base_callbacks, importing it would import
+# TensorFlow.
+SYNC_MARKER_PREFIX = 'nvtx_plugins sync '
+
+__all__ = ['get_sync_markers', 'get_clock_offset', 'merge_traces', 'main']
+
+_INSERT_BATCH_SIZE = 10000
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(
+        'PRAGMA table_info(`{}`)'.format(table))}
+
+
+def _text_expression(conn):
+    """Returns the SQL expression of the event text, recent exports store the
+    strings in the ``StringIds`` table."""
+    tables = {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table'")}
+    if 'NVTX_EVENTS' not in tables:
+        raise ValueError('No NVTX_EVENTS table found')
+
+    columns = _columns(conn, 'NVTX_EVENTS')
+    has_text = 'text' in columns
+    has_text_id = 'textId' in columns and 'StringIds' in tables
+    if has_text and has_text_id:
+        return ('COALESCE(e.`text`, (SELECT s.value FROM StringIds s '
+                'WHERE s.id = e.textId))')
+    elif has_text_id:
+        return '(SELECT s.value FROM StringIds s WHERE s.id = e.textId)'
+    return 'e.`text`'
+
+
+def _optional_column(conn, name):
+    if name in _columns(conn, 'NVTX_EVENTS'):
+        return 'e.`{}`'.format(name)
+    return 'NULL'
+
+
+def get_sync_markers(conn):
+    """Returns a dict mapping the synchronization markers of a recording to
+    their timestamp (in ns)."""
+    text = _text_expression(conn)
+    markers = {}
+    query = ('SELECT {text}, e.`start` FROM NVTX_EVENTS e '
+             'WHERE {text} LIKE ?'.format(text=text))
+    for message, timestamp in conn.execute(query,
+                                           (SYNC_MARKER_PREFIX + '%',)):
+        # Keep the first occurrence if a marker was recorded twice
+        markers.setdefault(message, timestamp)
+    return markers
+
+
+def get_clock_offset(reference_markers, markers):
+    """Returns the offset (in ns) to add to the timestamps of a recording to
+    align it on the reference recording, ``None`` if both recordings do not
+    share any synchronization marker.
+
+    The median difference is used so a few late workers do not skew the
+    alignment.
+    """
+    deltas = sorted(reference_markers[message] - timestamp
+                    for message, timestamp in markers.items()
+                    if message in reference_markers)
+    if not deltas:
+        return None
+
+    middle = len(deltas) // 2
+    if len(deltas) % 2:
+        return deltas[middle]
+    return (deltas[middle - 1] + deltas[middle]) // 2
+
+
+def _read_events(conn, rank, offset):
+    query = (
+        'SELECT e.`start` + ?, e.`end` + ?, e.eventType, {text}, '
+        '{global_tid}, {domain_id} FROM NVTX_EVENTS e '
+        'ORDER BY e.`start`'.format(
+            text=_text_expression(conn),
+            global_tid=_optional_column(conn, 'globalTid'),
+            domain_id=_optional_column(conn, 'domainId')))
+
+    for start, end, event_type, text, global_tid, domain_id in conn.execute(
+            query, (offset, offset)):
+        yield start, rank, end, event_type, text, global_tid, domain_id
+
+
+def _create_output(output_file):
+    if os.path.exists(output_file):
+        os.remove(output_file)
+
+    conn = sqlite3.connect(output_file)
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute(
+        'CREATE TABLE SOURCES ('
+        'rank INTEGER PRIMARY KEY, path TEXT NOT NULL, '
+        'clockOffset INTEGER, syncMarkers INTEGER NOT NULL)')
+    conn.execute(
+        'CREATE TABLE NVTX_EVENTS ('
+        '`start` INTEGER NOT NULL, `end` INTEGER, rank INTEGER NOT NULL, '
+        'eventType INTEGER, `text` TEXT, globalTid INTEGER, '
+        'domainId INTEGER)')
+    return conn
+
+
+def merge_traces(input_files, output_file, reference=0):
+    """Merges the NVTX events of ``input_files`` into ``output_file``.
+
+    Arguments:
+        input_files: list of SQLite exports, the index of a file in the list
+            is used as its rank.
+        output_file: path of the merged SQLite database, overwritten if it
+            exists.
+        reference: index of the recording whose clock is used for the merged
+            timeline.
+
+    Returns:
+        A list of the clock offsets (in ns) applied to every input file,
+        ``None`` for the files which could not be aligned (no common
+        synchronization marker), these are merged unshifted.
+    """
+    if not input_files:
+        raise ValueError('No input file to merge')
+    if not 0 <= reference < len(input_files):
+        raise ValueError('Invalid reference index: {}'.format(reference))
+
+    inputs = [sqlite3.connect(path) for path in input_files]
+    try:
+        markers = [get_sync_markers(conn) for conn in inputs]
+        offsets = [get_clock_offset(markers[reference], rank_markers)
+                   for rank_markers in markers]
+
+        output = _create_output(output_file)
+        try:
+            output.executemany(
+                'INSERT INTO SOURCES VALUES (?, ?, ?, ?)',
+                [(rank, os.path.abspath(path), offset, len(rank_markers))
+                 for rank, (path, offset, rank_markers)
+                 in enumerate(zip(input_files, offsets, markers))])
+
+            events = heapq.merge(*[
+                _read_events(conn, rank, offset or 0)
+                for rank, (conn, offset) in enumerate(zip(inputs, offsets))],
+                key=lambda event: event[:2])
+
+            while True:
+                batch = list(itertools.islice(events, _INSERT_BATCH_SIZE))
+                if not batch:
+                    break
+                output.executemany(
+                    'INSERT INTO NVTX_EVENTS (`start`, rank, `end`, '
+                    'eventType, `text`, globalTid, domainId) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)', batch)
+
+            # Indexes are cheaper to build once the data is inserted
+            output.execute(
+                'CREATE INDEX NVTX_EVENTS_START ON NVTX_EVENTS (`start`)')
+            output.execute(
+                'CREATE INDEX NVTX_EVENTS_RANK ON NVTX_EVENTS (rank, `start`)')
+            output.execute(
+                'CREATE INDEX NVTX_EVENTS_TEXT ON NVTX_EVENTS (`text`)')
+            output.commit()
+        finally:
+            output.close()
+    finally:
+        for conn in inputs:
+            conn.close()
+
+    return offsets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Merges the NVTX events of several processes into a '
+                    'single clock-aligned SQLite database.')
+    parser.add_argument('inputs', nargs='+',
+                        help='SQLite exports, one per process, ordered by '
+                             'rank.')
+    parser.add_argument('-o', '--output', required=True,
+                        help='Path of the merged SQLite database.')
+    parser.add_argument('--reference', type=int, default=0,
+                        help='Rank whose clock is used for the merged '
+                             'timeline (default: 0).')
+    args = parser.parse_args(argv)
+
+    offsets = merge_traces(args.inputs, args.output,
+                           reference=args.reference)
+    for path, offset in zip(args.inputs, offsets):
+        if offset is None:
+            print('WARNING: no synchronization marker in common with the '
+                  'reference, {} was not aligned.'.format(path),
+                  file=sys.stderr)
+        else:
+            print('{}: {:+d} ns'.format(path, offset))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
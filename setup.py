@@ -80,10 +80,10 @@ tensorflow_nvtx_lib = Extension(
     sources=[
         'nvtx_plugins/cc/nvtx_ops.cc',
         'nvtx_plugins/cc/nvtx_kernels.cc',
+        'nvtx_plugins/cc/nvtx_runtime.cc',
+        'nvtx_plugins/cc/nvtx_xla_kernels.cc',
     ],
     undef_macros=["NDEBUG"],
-    extra_compile_args=['-lnvToolsExt'],
-    extra_link_args=['-lnvToolsExt']
 )
 
 # =================== Reading Readme file as TXT files ===================
@@ -172,8 +172,14 @@ setup(
 
     # Add in any packaged data.
     include_package_data=True,
-    packages=['nvtx.plugins.tf', 'nvtx.plugins.tf.keras'],
+    packages=['nvtx.plugins.tf', 'nvtx.plugins.tf.keras',
+              'nvtx.plugins.tf.tools'],
     package_dir={'': 'nvtx_plugins/python'},
+    entry_points={
+        'console_scripts': [
+            'nvtx-merge-traces=nvtx.plugins.tf.tools.merge_traces:main',
+        ],
+    },
 
     # Contained modules and scripts.
     install_requires=install_requires,
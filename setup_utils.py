@@ -86,6 +86,19 @@ def check_tf_version():
         )
 
 
+def check_xla_support():
+    """XLA lowering requires the tf2xla headers and OptimizationBarrier."""
+    import tensorflow as tf
+
+    if LooseVersion(tf.__version__) < LooseVersion('2.8.0'):
+        return False
+
+    xla_op_kernel_header = os.path.join(
+        tf.sysconfig.get_include(), 'tensorflow', 'compiler', 'tf2xla', 'xla_op_kernel.h'
+    )
+    return os.path.exists(xla_op_kernel_header)
+
+
 def build_cmake(build_ext, ext, prefix, plugin_ext=None, options=None):
     cmake_bin = 'cmake'
 
@@ -312,11 +325,78 @@ def get_cuda_dirs(build_ext, cpp_flags):
     return cuda_include_dirs, cuda_lib_dirs
 
 
+def get_nvtx_include_dirs(build_ext, cpp_flags, cuda_include_dirs):
+    """Finds the header-only NVTX v3 API (nvtx3/nvToolsExt.h).
+
+    The headers ship with the CUDA toolkit (10.0 or newer) and with the
+    `nvidia-nvtx-cu12` pip package, so CUDA is not required to build the ops.
+    """
+    candidates = []
+
+    nvtx_include = os.environ.get('NVTX_INCLUDE')
+    if nvtx_include:
+        candidates.append(nvtx_include)
+
+    candidates += cuda_include_dirs
+
+    try:
+        import nvidia.nvtx
+        for _dir in nvidia.nvtx.__path__:
+            candidates.append(os.path.join(_dir, 'include'))
+    except ImportError:
+        pass
+
+    candidates.append('/usr/local/cuda/include')
+
+    for nvtx_include_dir in candidates:
+        if not os.path.exists(os.path.join(nvtx_include_dir, 'nvtx3', 'nvToolsExt.h')):
+            continue
+
+        try:
+            test_compile(
+                build_ext,
+                'test_nvtx',
+                include_dirs=[nvtx_include_dir],
+                libraries=['dl'],
+                extra_compile_preargs=cpp_flags,
+                code=textwrap.dedent(
+                    '''\
+                    #include <nvtx3/nvToolsExt.h>
+                    void test() {
+                        nvtxRangePop();
+                    }
+                    '''
+                )
+            )
+            return [nvtx_include_dir]
+
+        except (CompileError, LinkError):
+            continue
+
+    raise DistutilsPlatformError(
+        'NVTX v3 headers (nvtx3/nvToolsExt.h) were not found.\n'
+        'Install a CUDA toolkit 10.0 or newer, install the `nvidia-nvtx-cu12` '
+        'pip package or set the NVTX_INCLUDE environment variable.\n\n'
+        'NVTX_INCLUDE - path to the directory containing the nvtx3 directory'
+    )
+
+
 def get_common_options(build_ext):
     cpp_flags = get_cpp_flags(build_ext)
     link_flags = get_link_flags(build_ext)
 
-    have_cuda = True
+    try:
+        cuda_include_dirs, cuda_lib_dirs = get_cuda_dirs(build_ext, cpp_flags)
+        have_cuda = True
+
+    except DistutilsPlatformError:
+        # The ops only need the NVTX headers, CUDA is used by the XLA GPU
+        # custom calls
+        print("===========================================================================================")
+        print('INFO: CUDA was not found, NVTX ops will be built without CUDA support.')
+        print("===========================================================================================")
+        cuda_include_dirs, cuda_lib_dirs = [], []
+        have_cuda = False
 
     MACROS = []
 
@@ -330,8 +410,11 @@ def get_common_options(build_ext):
     LIBRARY_DIRS = []
     LIBRARIES = []
 
+    # NVTX v3 is header-only and loads the injected tool with dlopen
+    INCLUDES += get_nvtx_include_dirs(build_ext, cpp_flags, cuda_include_dirs)
+    LIBRARIES += ['dl']
+
     if have_cuda:
-        cuda_include_dirs, cuda_lib_dirs = get_cuda_dirs(build_ext, cpp_flags)
         MACROS += [('HAVE_CUDA', '1')]
         INCLUDES += cuda_include_dirs
         LIBRARY_DIRS += cuda_lib_dirs
@@ -395,6 +478,13 @@ def build_tf_extension(build_ext, tf_lib, options):
     tf_compile_flags, tf_link_flags = get_tf_flags(build_ext, options['COMPILE_FLAGS'])
 
     tf_lib.define_macros = options['MACROS'] + tf_lib.define_macros
+
+    if check_xla_support():
+        tf_lib.define_macros += [('NVTX_PLUGINS_WITH_XLA', '1')]
+    else:
+        print("===========================================================================================")
+        print('INFO: TensorFlow XLA headers not found, NVTX ops will not be compiled with XLA.')
+        print("===========================================================================================")
     tf_lib.include_dirs = options['INCLUDES'] + tf_lib.include_dirs
 
     tf_lib.sources = options['SOURCES'] + tf_lib.sources
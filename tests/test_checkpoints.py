@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import unittest
+
+from unittest import mock
+
+import numpy as np
+import tensorflow as tf
+
+from nvtx.plugins.tf import checkpoints
+
+
+class _LibNVTX(object):
+    """Records the ranges of the checkpoints."""
+
+    available = True
+
+    def __init__(self):
+        self.events = []
+
+    def domain(self, domain_name):
+        return domain_name or None
+
+    def push(self, message, domain_handle=None, payload=None):
+        self.events.append(('push', message))
+
+    def pop(self, domain_handle=None):
+        self.events.append(('pop',))
+
+    def start(self, message, domain_handle=None, payload=None):
+        self.events.append(('start', message))
+        return len(self.events)
+
+    def end(self, range_id, domain_handle=None):
+        self.events.append(('end',))
+
+    def mark(self, message, domain_handle=None, payload=None):
+        self.events.append(('mark', message))
+
+
+class CheckpointsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        checkpoints.trace_checkpoints()
+
+    def tearDown(self):
+        checkpoints.untrace_checkpoints()
+
+    def test_checkpoint_write(self):
+        variable = tf.Variable([1., 2., 3.])
+        checkpoint = tf.train.Checkpoint(variable=variable)
+        prefix = os.path.join(tempfile.mkdtemp(), 'ckpt')
+
+        path = checkpoint.write(prefix)
+        self.assertGreater(checkpoints._checkpoint_bytes(path), 0)
+
+        variable.assign([0., 0., 0.])
+        checkpoint.read(path)
+        np.testing.assert_allclose(variable.numpy(), [1., 2., 3.])
+
+    def test_checkpoint_save(self):
+        libnvtx = _LibNVTX()
+        checkpoint = tf.train.Checkpoint(variable=tf.Variable([1., 2.]))
+        prefix = os.path.join(tempfile.mkdtemp(), 'ckpt')
+        with mock.patch.object(checkpoints, 'get_libnvtx',
+                               return_value=libnvtx):
+            checkpoint.save(prefix)
+
+        # save may call write, there is a single Checkpoint range
+        pushed = [event[1] for event in libnvtx.events
+                  if event[0] == 'push']
+        self.assertEqual(pushed, ['Checkpoint'])
+        self.assertIn(('start', 'serialize'), libnvtx.events)
+        self.assertIn(('mark', checkpoints.BYTES_COUNTER_NAME),
+                      libnvtx.events)
+
+    def test_missing_method_warns(self):
+        class Saver(object):
+            pass
+
+        with self.assertWarns(RuntimeWarning):
+            checkpoints._patch(Saver, 'save', lambda method: method,
+                               'Saver.save')
+        with self.assertWarns(RuntimeWarning):
+            checkpoints._patch(None, 'save', lambda method: method,
+                               'Saver.save')
+        self.assertNotIn((Saver, 'save'), checkpoints._originals)
+
+    def test_checkpoint_bytes(self):
+        checkpoint = tf.train.Checkpoint(variable=tf.Variable(tf.ones(1000)))
+        directory = tempfile.mkdtemp()
+
+        path = checkpoint.write(os.path.join(directory, 'ckpt-1'))
+        expected = sum(os.path.getsize(os.path.join(directory, name))
+                       for name in os.listdir(directory))
+        self.assertEqual(checkpoints._checkpoint_bytes(path), expected)
+
+        # The files of ckpt-10 are not counted with ckpt-1
+        checkpoint.write(os.path.join(directory, 'ckpt-10'))
+        self.assertEqual(checkpoints._checkpoint_bytes(path), expected)
+
+    def test_model_checkpoint(self):
+        model = tf.keras.Sequential([tf.keras.layers.Dense(1,
+                                                           input_shape=(4,))])
+        model.compile(optimizer='sgd', loss='mse')
+        path = os.path.join(tempfile.mkdtemp(), 'weights')
+
+        model.fit(np.ones((8, 4)), np.ones((8, 1)), epochs=1, verbose=0,
+                  callbacks=[tf.keras.callbacks.ModelCheckpoint(
+                      path, save_weights_only=True)])
+        self.assertTrue(tf.io.gfile.glob(path + '*'))
+
+    def test_untrace(self):
+        checkpoints.untrace_checkpoints()
+        self.assertFalse(hasattr(tf.compat.v1.train.Saver.save,
+                                 '__wrapped__'))
+        self.assertFalse(hasattr(tf.train.Checkpoint.write, '__wrapped__'))
+        self.assertFalse(checkpoints._originals)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import numpy as np
+import tensorflow as tf
+
+from nvtx.plugins.tf import collectives
+from nvtx.plugins.tf import flight_recorder
+
+
+class CollectivesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.strategy = tf.distribute.MirroredStrategy(['/CPU:0'])
+        collectives.trace_collectives(self.strategy)
+        self.addCleanup(collectives.untrace_collectives, self.strategy)
+
+    def test_tf_function_runs_kernels(self):
+        flight_recorder.enable(signal_number=None, dump_on_exception=False)
+        self.addCleanup(flight_recorder.disable)
+
+        def replica_fn(x):
+            ctx = tf.distribute.get_replica_context()
+            return ctx.all_reduce(tf.distribute.ReduceOp.SUM, x * 2.)
+
+        @tf.function
+        def step(x):
+            return self.strategy.run(replica_fn, args=(x,))
+
+        for value in (1., 2.):
+            np.testing.assert_allclose(
+                step(tf.constant([value])).numpy(), [2. * value])
+
+        events = [event for event in flight_recorder.events()
+                  if event['ph'] == 'b' and
+                  event['name'].startswith('AllReduce')]
+        self.assertEqual(len(events), 2)
+        self.assertEqual(events[0]['cat'], collectives.DEFAULT_DOMAIN_NAME)
+
+
+if __name__ == '__main__':
+    unittest.main()
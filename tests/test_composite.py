@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import numpy as np
+import tensorflow as tf
+
+import nvtx.plugins.tf as nvtx_tf
+
+_DENSIFYING_OPS = ('SparseToDense', 'SparseTensorToDense',
+                   'RaggedTensorToTensor')
+
+
+def _op_types(func, *args):
+    return [op.type for op in
+            func.get_concrete_function(*args).graph.get_operations()]
+
+
+class CompositeTensorsTestCase(unittest.TestCase):
+
+    def test_sparse(self):
+        @tf.function
+        def func(ids):
+            ids, nvtx_context = nvtx_tf.ops.start(ids, message='Sparse ids',
+                                                  domain_name='Test')
+            ids = tf.SparseTensor(ids.indices, ids.values * 2,
+                                  ids.dense_shape)
+            return nvtx_tf.ops.end(ids, nvtx_context)
+
+        ids = tf.SparseTensor(indices=[[0, 3], [2, 1]], values=[1, 2],
+                              dense_shape=[3, 1000000])
+        outputs = func(ids)
+        self.assertIsInstance(outputs, tf.SparseTensor)
+        np.testing.assert_array_equal(outputs.indices.numpy(),
+                                      ids.indices.numpy())
+        np.testing.assert_array_equal(outputs.values.numpy(), [2, 4])
+
+        op_types = _op_types(func, ids)
+        self.assertEqual(op_types.count('NvtxStart'), 1)
+        self.assertEqual(op_types.count('NvtxEnd'), 1)
+        self.assertFalse(set(op_types) & set(_DENSIFYING_OPS))
+
+    def test_ragged(self):
+        @tf.function
+        def func(tokens):
+            tokens, nvtx_context = nvtx_tf.ops.start(tokens,
+                                                     message='Tokens')
+            return nvtx_tf.ops.end(tokens + 1, nvtx_context)
+
+        tokens = tf.ragged.constant([[1, 2, 3], [4], []])
+        outputs = func(tokens)
+        self.assertIsInstance(outputs, tf.RaggedTensor)
+        self.assertEqual(outputs.to_list(), [[2, 3, 4], [5], []])
+        self.assertFalse(set(_op_types(func, tokens)) & set(_DENSIFYING_OPS))
+
+    def test_trace(self):
+        @nvtx_tf.ops.trace(message='Lookup', domain_name='Test')
+        def lookup(ids, embeddings):
+            return tf.nn.embedding_lookup_sparse(embeddings, ids, None)
+
+        embeddings = tf.constant([[1., 1.], [2., 2.], [3., 3.]])
+        ids = tf.SparseTensor(indices=[[0, 0], [0, 1], [1, 0]],
+                              values=tf.constant([0, 2, 1], tf.int64),
+                              dense_shape=[2, 2])
+        outputs = tf.function(lookup)(ids, embeddings)
+        np.testing.assert_allclose(outputs.numpy(), [[2., 2.], [2., 2.]])
+
+    def test_nested_composite(self):
+        @tf.function
+        def func(features):
+            features, nvtx_context = nvtx_tf.ops.start(features,
+                                                       message='Features')
+            return nvtx_tf.ops.end(features, nvtx_context)
+
+        features = {
+            'dense': tf.ones((2, 2)),
+            'sparse': tf.sparse.from_dense([[0, 1], [1, 0]]),
+            'ragged': tf.ragged.constant([[1], [2, 3]]),
+        }
+        outputs = func(features)
+        self.assertIsInstance(outputs['sparse'], tf.SparseTensor)
+        self.assertIsInstance(outputs['ragged'], tf.RaggedTensor)
+        self.assertEqual(outputs['ragged'].to_list(), [[1], [2, 3]])
+
+
+if __name__ == '__main__':
+    unittest.main()
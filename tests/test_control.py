@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import socket
+import stat
+import tempfile
+import time
+import unittest
+
+from nvtx.plugins.tf import control
+
+
+class ControlTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        control.stop()
+        control.set_tracing(True)
+        control.set_sampling(1)
+        control.begin_step(0)
+        for domain_name in control._state['disabled_domains']:
+            control.set_domain_enabled(domain_name, True)
+        shutil.rmtree(self.tmp_dir)
+
+    def test_tracing(self):
+        control.execute('disable')
+        self.assertFalse(control.is_tracing())
+        self.assertFalse(control.should_emit('Train'))
+
+        control.execute('enable')
+        self.assertTrue(control.should_emit('Train'))
+
+    def test_sampling(self):
+        control.execute('sample 4')
+
+        emitted = []
+        for step in range(8):
+            control.begin_step(step)
+            emitted.append(control.should_emit(detailed=True))
+            # Coarse ranges are not sampled
+            self.assertTrue(control.should_emit())
+        self.assertEqual(emitted, [True, False, False, False] * 2)
+
+    def test_domains(self):
+        control.execute('domain "Input pipeline" off')
+        control.execute('domain "" off')
+        self.assertFalse(control.should_emit('Input pipeline'))
+        self.assertFalse(control.should_emit(''))
+        self.assertTrue(control.should_emit('Train'))
+        self.assertIn("'Input pipeline'", control.execute('status'))
+
+        control.execute('domain "Input pipeline" on')
+        self.assertTrue(control.should_emit('Input pipeline'))
+
+    def test_invalid_commands(self):
+        for command in ('', 'enable now', 'sample', 'sample 0', 'sample x',
+                        'domain Train', 'domain Train maybe', 'restart'):
+            with self.assertRaises(ValueError, msg=command):
+                control.execute(command)
+
+    def test_dump_requires_flight_recorder(self):
+        with self.assertRaises(ValueError):
+            control.execute('dump')
+
+    def _wait_for(self, condition, timeout=5.):
+        deadline = time.time() + timeout
+        while not condition():
+            if time.time() > deadline:
+                self.fail('Timed out waiting for the control command')
+            time.sleep(0.05)
+
+    def test_control_file(self):
+        path = os.path.join(self.tmp_dir, 'control')
+        control.start(control_file=path)
+
+        with open(path, 'w') as f:
+            f.write('# turned off while debugging the input pipeline\n'
+                    'disable\n')
+        self._wait_for(lambda: not control.is_tracing())
+
+    def test_socket(self):
+        path = os.path.join(self.tmp_dir, 'control.sock')
+        control.start(socket_path=path)
+
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(path)
+        with client:
+            client.sendall(b'sample 10\nsample 0\n')
+            with client.makefile('r') as results:
+                self.assertEqual(results.readline().split()[0], 'ok')
+                self.assertEqual(results.readline().split()[0], 'error')
+        self.assertEqual(control._state['sample_every_n_steps'], 10)
+
+        control.stop()
+        self.assertFalse(os.path.exists(path))
+
+    def test_socket_permissions(self):
+        path = os.path.join(self.tmp_dir, 'control.sock')
+        control.start(socket_path=path)
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o600)
+
+    def test_stale_socket(self):
+        path = os.path.join(self.tmp_dir, 'control.sock')
+        # Left by a process that exited without closing it
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(path)
+        stale.close()
+
+        control.start(socket_path=path)
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(path)
+        with client:
+            client.sendall(b'sample 10\n')
+            with client.makefile('r') as results:
+                self.assertEqual(results.readline().split()[0], 'ok')
+
+    def test_socket_in_use(self):
+        path = os.path.join(self.tmp_dir, 'control.sock')
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        server.listen(1)
+        with server:
+            with self.assertRaises(RuntimeError):
+                control.start(socket_path=path)
+            self.assertTrue(os.path.exists(path))
+
+    def test_start_requires_a_channel(self):
+        with self.assertRaises(ValueError):
+            control.start()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from nvtx.plugins.tf.counters import ThroughputMeter
+
+
+class _Clock(object):
+
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
+
+
+class ThroughputMeterTestCase(unittest.TestCase):
+
+    def test_rate(self):
+        clock = _Clock()
+        meter = ThroughputMeter(clock=clock)
+
+        meter.start()
+        clock.now = 0.5
+        self.assertAlmostEqual(meter.update(64), 128.)
+
+        # Already started, the next step is timed from the previous one
+        clock.now = 0.75
+        meter.start()
+        clock.now = 1.5
+        self.assertAlmostEqual(meter.update(64), 64.)
+
+    def test_reset(self):
+        clock = _Clock()
+        meter = ThroughputMeter(clock=clock)
+
+        self.assertIsNone(meter.update(64))
+        meter.reset()
+        clock.now = 10.
+        meter.start()
+        clock.now = 12.
+        self.assertAlmostEqual(meter.update(64), 32.)
+
+    def test_untimed_step(self):
+        meter = ThroughputMeter(clock=_Clock())
+        meter.start()
+        self.assertIsNone(meter.update(64))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import unittest
+
+from nvtx.plugins.tf import debug
+
+
+class DebugTestCase(unittest.TestCase):
+
+    def test_leak(self):
+        tracker = debug.RangeTracker()
+        tracker.open('Epoch 1', 'Keras')
+        self.assertEqual(tracker.report(),
+                         ["Range 'Epoch 1' (domain 'Keras') was never closed"])
+        self.assertEqual(tracker.report(), [])
+
+    def test_close_without_open(self):
+        tracker = debug.RangeTracker()
+        tracker.close('Batch 1')
+        self.assertEqual(tracker.report(),
+                         ["Range 'Batch 1' was closed but is not open"])
+
+    def test_wrong_domain(self):
+        tracker = debug.RangeTracker()
+        tracker.open('Batch 1', 'Keras')
+        tracker.close('Batch 1', 'Other')
+        self.assertEqual(tracker.report(),
+                         ["Range 'Batch 1' (domain 'Keras') was closed with "
+                          "domain 'Other'"])
+
+    def test_overlapping_ranges(self):
+        tracker = debug.RangeTracker()
+        tracker.open('Train', 'Keras')
+        tracker.open('Epoch 1', 'Keras')
+        tracker.close('Train', 'Keras')
+
+        # start/end ranges may be closed on another thread
+        thread = threading.Thread(target=tracker.close,
+                                  args=('Epoch 1', 'Keras'))
+        thread.start()
+        thread.join()
+        self.assertEqual(tracker.report(), [])
+
+    def test_check_ranges(self):
+        tracker = debug.RangeTracker()
+        tracker.open('Train', 'Keras')
+        tracker.open('Epoch 1', 'Keras')
+        tracker.close('Train', 'Keras')
+        tracker.close('Epoch 1', 'Keras')
+        debug.check_ranges(tracker, check_ops=False)
+
+        tracker.open('Epoch 2', 'Keras')
+        tracker.close('Batch 1', 'Keras')
+        with self.assertRaisesRegex(RuntimeError, '2 range problem'):
+            debug.check_ranges(tracker, check_ops=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+import pytest
+
+from tests.base import CustomTestCase
+
+
+class DistributeTestCase(CustomTestCase):
+
+    JOB_NAME = "distribute_example"
+
+    def test_execution(self):
+        self.assertTrue(self.run_command(DistributeTestCase.JOB_NAME))
+
+    @pytest.mark.run(after='test_execution')
+    def test_report_is_compliant(self):
+
+        with self.open_db(DistributeTestCase.JOB_NAME) as conn:
+
+            step_count, _ = self.query_report(conn, range_name="batch %")
+            self.assertGreater(step_count, 0)
+
+            # Gradients are all-reduced once per step
+            count, _ = self.query_report(conn, range_name="AllReduce %")
+            self.assertGreaterEqual(count, step_count - 1)
+
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT count(*) FROM NVTX_EVENTS "
+                "WHERE `text` LIKE 'AllReduce %' AND `int64Value` > 0 "
+                "AND `start` > 0"
+            )
+            self.assertEqual(cur.fetchone()[0], count)
+
+
+if __name__ == '__main__':
+    unittest.main()
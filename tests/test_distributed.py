@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import unittest
+
+from unittest import mock
+
+import tensorflow as tf
+
+import nvtx.plugins.tf as nvtx_tf
+from nvtx.plugins.tf import distributed
+from nvtx.plugins.tf import ranges
+
+
+class _LibNVTX(object):
+    """Records the ranges pushed by nvtx.plugins.tf.range."""
+
+    available = True
+
+    def __init__(self):
+        self.pushed = []
+
+    def domain(self, domain_name):
+        return domain_name or None
+
+    def push(self, message, domain_handle=None, payload=None):
+        self.pushed.append((message, domain_handle))
+
+    def pop(self, domain_handle=None):
+        pass
+
+
+class DistributedTestCase(unittest.TestCase):
+
+    def setUp(self):
+        rank_env_vars = list(distributed.RANK_ENV_VARS) + [
+            'TF_CONFIG', distributed.RANKS_ENV_VAR,
+            distributed.RANK_DOMAINS_ENV_VAR]
+        environ = dict((key, value) for key, value in os.environ.items()
+                       if key not in rank_env_vars)
+        patcher = mock.patch.dict(os.environ, environ, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        distributed._clear_cache()
+        self.addCleanup(distributed._clear_cache)
+        self.addCleanup(distributed.set_rank_policy)
+
+    def test_rank_from_env_vars(self):
+        os.environ['SLURM_PROCID'] = '3'
+        self.assertEqual(distributed.get_rank(), 3)
+
+        # Launcher variables are checked in order
+        os.environ['OMPI_COMM_WORLD_RANK'] = '5'
+        distributed._clear_cache()
+        self.assertEqual(distributed.get_rank(), 5)
+
+    def test_rank_is_cached(self):
+        os.environ['SLURM_PROCID'] = '3'
+        self.assertEqual(distributed.get_rank(), 3)
+
+        os.environ['SLURM_PROCID'] = '4'
+        self.assertEqual(distributed.get_rank(), 3)
+
+        # The rank is resolved again for another strategy
+        strategy = tf.distribute.OneDeviceStrategy('/CPU:0')
+        with strategy.scope():
+            self.assertEqual(distributed.get_rank(), 4)
+
+    def test_rank_from_tf_config(self):
+        self.assertIsNone(distributed._rank_from_tf_config())
+
+        tf_config = {
+            'cluster': {'chief': ['host0:2222'],
+                        'worker': ['host1:2222', 'host2:2222']},
+            'task': {'type': 'worker', 'index': 1},
+        }
+        os.environ['TF_CONFIG'] = json.dumps(tf_config)
+        self.assertEqual(distributed._rank_from_tf_config(), 2)
+
+        tf_config['task'] = {'type': 'chief', 'index': 0}
+        os.environ['TF_CONFIG'] = json.dumps(tf_config)
+        self.assertEqual(distributed._rank_from_tf_config(), 0)
+
+    def test_should_emit(self):
+        os.environ['HOROVOD_RANK'] = '1'
+        self.assertTrue(distributed.should_emit())
+
+        # The policy is read from the environment once
+        os.environ[distributed.RANKS_ENV_VAR] = '0, 8'
+        self.assertTrue(distributed.should_emit())
+        distributed._clear_cache()
+        self.assertFalse(distributed.should_emit())
+        self.assertTrue(distributed.should_emit(detailed=False))
+
+        # The policy takes precedence over the environment variable
+        distributed.set_rank_policy(ranks=[1])
+        self.assertTrue(distributed.should_emit())
+
+    def test_rank_domain_name(self):
+        os.environ['HOROVOD_RANK'] = '2'
+        self.assertEqual(distributed.rank_domain_name('Train'), 'Train')
+
+        os.environ[distributed.RANK_DOMAINS_ENV_VAR] = '1'
+        distributed._clear_cache()
+        self.assertEqual(distributed.rank_domain_name('Train'),
+                         'Train (rank 2)')
+        self.assertEqual(distributed.rank_domain_name(''), 'Rank 2')
+
+        distributed.set_rank_policy(label_domains=False)
+        self.assertEqual(distributed.rank_domain_name('Train'), 'Train')
+
+    def test_eager_range(self):
+        os.environ['HOROVOD_RANK'] = '1'
+        libnvtx = _LibNVTX()
+        with mock.patch.object(ranges, 'get_libnvtx', return_value=libnvtx):
+            distributed.set_rank_policy(label_domains=True)
+            with nvtx_tf.range('Step', domain_name='Train'):
+                pass
+            self.assertEqual(libnvtx.pushed, [('Step', 'Train (rank 1)')])
+
+            distributed.set_rank_policy(ranks=[0])
+            with nvtx_tf.range('Step', domain_name='Train'):
+                pass
+            self.assertEqual(len(libnvtx.pushed), 1)
+
+    def test_graph_range_excluded_rank(self):
+        os.environ['HOROVOD_RANK'] = '1'
+        distributed.set_rank_policy(ranks=[0])
+
+        @tf.function
+        def func(x):
+            with nvtx_tf.range('Step'):
+                return x * 2.
+
+        self.assertEqual(func(tf.constant(2.)).numpy(), 4.)
+        op_types = [op.type for op in func.get_concrete_function(
+            tf.TensorSpec((), tf.float32)).graph.get_operations()]
+        self.assertNotIn('NvtxStart', op_types)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import numpy as np
+import tensorflow as tf
+
+import nvtx.plugins.tf as nvtx_tf
+
+
+def _wrap(x, message):
+    x, nvtx_context = nvtx_tf.ops.start(x, message=message,
+                                        domain_name='Test')
+    return nvtx_tf.ops.end(x, nvtx_context)
+
+
+class DtypesTestCase(unittest.TestCase):
+
+    def _assert_nvtx_ops(self, func, *args):
+        op_types = [op.type for op in
+                    func.get_concrete_function(*args).graph.get_operations()]
+        self.assertEqual(op_types.count('NvtxStart'), 1)
+        self.assertEqual(op_types.count('NvtxEnd'), 1)
+
+    def test_bool(self):
+        func = tf.function(lambda mask: _wrap(mask, 'Mask'))
+        mask = tf.constant([True, False, True])
+        np.testing.assert_array_equal(func(mask).numpy(), mask.numpy())
+        self._assert_nvtx_ops(func, mask)
+
+    def test_string(self):
+        @tf.function
+        def func(text):
+            return _wrap(tf.strings.lower(text), 'Lower')
+
+        text = tf.constant(['Hello', 'NVTX'])
+        self.assertEqual(list(func(text).numpy()), [b'hello', b'nvtx'])
+        self._assert_nvtx_ops(func, text)
+
+    def test_resource(self):
+        variable = tf.Variable([1., 2.])
+
+        @tf.function
+        def func():
+            handle = _wrap(variable.handle, 'Variable')
+            return tf.raw_ops.ReadVariableOp(resource=handle,
+                                             dtype=tf.float32)
+
+        np.testing.assert_allclose(func().numpy(), [1., 2.])
+        self._assert_nvtx_ops(func)
+
+    def test_variant(self):
+        dataset = tf.data.Dataset.range(4)
+
+        @tf.function
+        def func():
+            variant = _wrap(tf.data.experimental.to_variant(dataset),
+                            'Dataset')
+            restored = tf.data.experimental.from_variant(
+                variant, dataset.element_spec)
+            return restored.reduce(tf.constant(0, tf.int64),
+                                   lambda total, x: total + x)
+
+        self.assertEqual(func().numpy(), 6)
+        self._assert_nvtx_ops(func)
+
+
+if __name__ == '__main__':
+    unittest.main()
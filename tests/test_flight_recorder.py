@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from nvtx.plugins.tf import flight_recorder
+
+
+class FlightRecorderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dump_path = os.path.join(tempfile.mkdtemp(), 'dump_{pid}.json')
+
+    def tearDown(self):
+        flight_recorder.disable()
+
+    def _load_dump(self, path):
+        with open(path) as f:
+            return json.load(f)['traceEvents']
+
+    def test_ring_capacity(self):
+        flight_recorder.enable(capacity=4, dump_path=self.dump_path,
+                               signal_number=None, dump_on_exception=False)
+        for step in range(10):
+            flight_recorder.record('B', 'step %d' % step, 'Train')
+            flight_recorder.record('E', 'step %d' % step, 'Train')
+
+        events = [event for event in flight_recorder.events()
+                  if event['tid'] == threading.get_ident()]
+        self.assertEqual([event['name'] for event in events],
+                         ['step 8', 'step 8', 'step 9', 'step 9'])
+        self.assertEqual([event['ph'] for event in events],
+                         ['B', 'E', 'B', 'E'])
+
+    def test_threads(self):
+        flight_recorder.enable(capacity=8, signal_number=None,
+                               dump_on_exception=False)
+
+        def work():
+            flight_recorder.record('i', 'worker')
+
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+        flight_recorder.record('i', 'main')
+
+        names = sorted(event['name'] for event in flight_recorder.events())
+        self.assertIn('main', names)
+        self.assertIn('worker', names)
+
+    def test_dump(self):
+        flight_recorder.enable(dump_path=self.dump_path, signal_number=None,
+                               dump_on_exception=False)
+        flight_recorder.record('i', 'checkpoint', 'Checkpoints')
+
+        path = flight_recorder.dump()
+        self.assertEqual(path, self.dump_path.format(pid=os.getpid()))
+        events = self._load_dump(path)
+        self.assertIn('checkpoint', [event['name'] for event in events])
+
+    def test_dump_on_signal(self):
+        flight_recorder.enable(dump_path=self.dump_path,
+                               signal_number=signal.SIGUSR1,
+                               dump_on_exception=False)
+        flight_recorder.record('B', 'hang')
+
+        os.kill(os.getpid(), signal.SIGUSR1)
+        path = self.dump_path.format(pid=os.getpid())
+        for _ in range(100):
+            if os.path.exists(path):
+                break
+            time.sleep(0.05)
+        self.assertIn('hang', [event['name']
+                               for event in self._load_dump(path)])
+
+    def test_disabled(self):
+        flight_recorder.record('i', 'ignored')
+        self.assertFalse(flight_recorder.is_enabled())
+        self.assertEqual(flight_recorder.events(), [])
+        self.assertIsNone(flight_recorder.dump())
+
+    def test_invalid_capacity(self):
+        with self.assertRaises(ValueError):
+            flight_recorder.enable(capacity=0)
+
+    def test_disable_from_thread(self):
+        flight_recorder.enable(dump_path=self.dump_path,
+                               signal_number=signal.SIGUSR1,
+                               dump_on_exception=True)
+        excepthook = sys.excepthook
+        errors = []
+
+        def work():
+            try:
+                flight_recorder.disable()
+            except RuntimeError as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+
+        # Nothing was restored
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(flight_recorder.is_enabled())
+        self.assertIs(sys.excepthook, excepthook)
+
+        flight_recorder.disable()
+        self.assertFalse(flight_recorder.is_enabled())
+        self.assertIsNot(sys.excepthook, excepthook)
+
+    @unittest.skipUnless(flight_recorder._op_library_loaded(),
+                         'The NVTX op library is not loaded')
+    def test_op_library_capacity(self):
+        # The capacity of the op library is only set once per process
+        with self.assertWarns(RuntimeWarning):
+            flight_recorder.enable(capacity=4, signal_number=None,
+                                   dump_on_exception=False)
+            flight_recorder.enable(capacity=5, signal_number=None,
+                                   dump_on_exception=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
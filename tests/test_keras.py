@@ -71,6 +71,15 @@ class KerasTestCase(CustomTestCase):
             self.assertGreaterEqual(count, reference_count - 1)
             self.assertLessEqual(count, reference_count + 1)
 
+            count, _ = self.query_report(conn, range_name="learning rate")
+            self.assertEqual(count, 1)
+
+            # Counter samples every batch, the epoch metrics are marked once
+            for counter in ["examples/sec", "loss", "accuracy"]:
+                count, _ = self.query_report(conn, range_name=counter)
+                self.assertGreaterEqual(count, reference_count - 1)
+                self.assertLessEqual(count, reference_count + 2)
+
 
 if __name__ == '__main__':
     unittest.main()
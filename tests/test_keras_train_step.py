@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+import pytest
+
+from tests.base import CustomTestCase
+
+
+class KerasTrainStepTestCase(CustomTestCase):
+
+    JOB_NAME = "keras_train_step_example"
+
+    def test_execution(self):
+        self.assertTrue(self.run_command(KerasTrainStepTestCase.JOB_NAME))
+
+    @pytest.mark.run(after='test_execution')
+    def test_report_is_compliant(self):
+
+        with self.open_db(KerasTrainStepTestCase.JOB_NAME) as conn:
+
+            # steps_per_execution=10: the callback sees chunks of steps
+            chunk_count, _ = self.query_report(conn, range_name="batches %")
+            self.assertGreater(chunk_count, 50)
+
+            # while the model ranges every step in the compiled loop
+            step_count, _ = self.query_report(conn, range_name="step %")
+            self.assertGreaterEqual(step_count, chunk_count * 10 - 10)
+
+            for range_name in ["Forward", "Loss", "Gradients", "Optimizer"]:
+                try:
+                    count, _ = self.query_report(conn, range_name=range_name)
+                    # The profile could start & end in the middle of one step.
+                    self.assertGreaterEqual(count, step_count - 1)
+                    self.assertLessEqual(count, step_count + 1)
+
+                except AssertionError as e:
+                    raise AssertionError("Issue with range: %s" % range_name) from e
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import numpy as np
+import tensorflow as tf
+
+from tensorflow.keras.layers import Dense
+from tensorflow.keras.layers import Input
+from tensorflow.keras.models import Model
+
+from nvtx.plugins.tf.keras.layers import NVTXEnd
+from nvtx.plugins.tf.keras.layers import NVTXStart
+from nvtx.plugins.tf.keras.layers import NVTXWrap
+
+
+def _op_types(model):
+    concrete = tf.function(model).get_concrete_function(
+        tf.TensorSpec((None, 8), tf.float32))
+    return [op.type for op in concrete.graph.get_operations()]
+
+
+class LayersTestCase(unittest.TestCase):
+
+    def test_start_end_round_trip(self):
+        inputs = Input((8,))
+        x, marker_id, domain_id = NVTXStart(message='Dense',
+                                            domain_name='forward')(inputs)
+        x = Dense(4)(x)
+        x = NVTXEnd(grad_message='Dense grad')([x, marker_id, domain_id])
+        model = Model(inputs=inputs, outputs=x)
+
+        # Registered layers are loaded without custom_objects
+        loaded = tf.keras.models.model_from_json(model.to_json())
+        loaded.set_weights(model.get_weights())
+        self.assertEqual(loaded.layers[1].get_config()['message'], 'Dense')
+        self.assertEqual(loaded.layers[3].get_config()['grad_message'],
+                         'Dense grad')
+
+        features = np.random.rand(2, 8).astype(np.float32)
+        np.testing.assert_allclose(model.predict(features),
+                                   loaded.predict(features), rtol=1e-6)
+
+    def test_wrap(self):
+        inputs = Input((8,))
+        x = NVTXWrap(Dense(4, name='dense'), domain_name='forward',
+                     first_layer=True)(inputs)
+        model = Model(inputs=inputs, outputs=x)
+
+        op_types = _op_types(model)
+        self.assertEqual(op_types.count('NvtxStart'), 1)
+        self.assertEqual(op_types.count('NvtxEnd'), 1)
+
+        features = np.random.rand(2, 8).astype(np.float32)
+        dense = model.layers[1].layer
+        kernel, bias = dense.get_weights()
+        np.testing.assert_allclose(model.predict(features),
+                                   features.dot(kernel) + bias, rtol=1e-5)
+
+        with tf.GradientTape() as tape:
+            loss = tf.reduce_sum(model(features))
+        grads = tape.gradient(loss, dense.trainable_weights)
+        np.testing.assert_allclose(grads[1].numpy(), [2.] * 4)
+
+    def test_wrap_round_trip(self):
+        inputs = Input((8,))
+        block = tf.keras.Sequential([Dense(8, activation='relu'), Dense(4)],
+                                    name='block')
+        x = NVTXWrap(block, message='Block', grad_domain_name='backward')(
+            inputs)
+        model = Model(inputs=inputs, outputs=x)
+
+        loaded = tf.keras.models.model_from_json(model.to_json())
+        loaded.set_weights(model.get_weights())
+        wrapper = loaded.layers[1]
+        self.assertIsInstance(wrapper, NVTXWrap)
+        self.assertEqual(wrapper.message, 'Block')
+        self.assertEqual(wrapper.grad_domain_name, 'backward')
+
+        features = np.random.rand(2, 8).astype(np.float32)
+        np.testing.assert_allclose(model.predict(features),
+                                   loaded.predict(features), rtol=1e-6)
+
+        cloned = tf.keras.models.clone_model(model)
+        self.assertIsInstance(cloned.layers[1], NVTXWrap)
+
+    def test_disabled_wrap(self):
+        inputs = Input((8,))
+        x = NVTXWrap(Dense(4), enabled=False)(inputs)
+        model = Model(inputs=inputs, outputs=x)
+        self.assertNotIn('NvtxStart', _op_types(model))
+
+
+if __name__ == '__main__':
+    unittest.main()
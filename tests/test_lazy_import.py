@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import subprocess
+import sys
+import unittest
+
+
+def _loaded_modules(statement):
+    output = subprocess.check_output([
+        sys.executable, '-c',
+        statement + '; import sys; print(" ".join(sys.modules))'
+    ])
+    return set(output.decode().split())
+
+
+class LazyImportTestCase(unittest.TestCase):
+
+    def test_import_is_lazy(self):
+        modules = _loaded_modules('import nvtx.plugins.tf')
+        self.assertNotIn('tensorflow', modules)
+        self.assertNotIn('nvtx.plugins.tf.ops', modules)
+        self.assertNotIn('nvtx.plugins.tf.estimator', modules)
+        self.assertNotIn('nvtx.plugins.tf.keras', modules)
+
+    def test_submodule_on_first_access(self):
+        modules = _loaded_modules(
+            'import nvtx.plugins.tf as nvtx_tf; nvtx_tf.distributed')
+        self.assertIn('nvtx.plugins.tf.distributed', modules)
+        self.assertNotIn('nvtx.plugins.tf.estimator', modules)
+
+    def test_unknown_attribute(self):
+        import nvtx.plugins.tf as nvtx_tf
+        with self.assertRaises(AttributeError):
+            nvtx_tf.does_not_exist
+
+
+if __name__ == '__main__':
+    unittest.main()
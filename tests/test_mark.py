@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import numpy as np
+import tensorflow as tf
+
+import nvtx.plugins.tf as nvtx_tf
+from nvtx.plugins.tf import flight_recorder
+from nvtx.plugins.tf.keras.layers import NVTXMark
+
+
+class MarkTestCase(unittest.TestCase):
+
+    def test_identity_and_gradient(self):
+        @tf.function
+        def func(x):
+            with tf.GradientTape() as tape:
+                tape.watch(x)
+                y = nvtx_tf.ops.mark(x * x, message='Square',
+                                     domain_name='Test', payload=1.5)
+            return y, tape.gradient(y, x)
+
+        x = tf.constant([1., 2., 3.])
+        y, grad = func(x)
+        np.testing.assert_allclose(y.numpy(), [1., 4., 9.])
+        np.testing.assert_allclose(grad.numpy(), [2., 4., 6.])
+
+        op_types = [op.type for op in
+                    func.get_concrete_function(x).graph.get_operations()]
+        self.assertEqual(op_types.count('NvtxMark'), 1)
+
+    def test_unconsumed_mark_is_kept(self):
+        @tf.function
+        def func(step):
+            nvtx_tf.mark('Rollover', payload=step)
+            return step + 1
+
+        step = tf.constant(1, dtype=tf.int64)
+        self.assertEqual(func(step).numpy(), 2)
+        graph = func.get_concrete_function(step).graph
+        self.assertIn('NvtxMark',
+                      [op.type for op in graph.control_outputs])
+
+    def test_identical_marks(self):
+        flight_recorder.enable(signal_number=None, dump_on_exception=False)
+        self.addCleanup(flight_recorder.disable)
+
+        @tf.function
+        def func(x):
+            nvtx_tf.mark('Rollover', domain_name='Test')
+            nvtx_tf.mark('Rollover', domain_name='Test')
+            return x + 1.
+
+        func(tf.constant(1.))
+        func(tf.constant(2.))
+        events = [event for event in flight_recorder.events()
+                  if event['ph'] == 'i' and event['name'] == 'Rollover']
+        self.assertEqual(len(events), 4)
+
+    def test_eager_mark(self):
+        self.assertIsNone(nvtx_tf.mark('Eager', payload=3))
+
+    def test_keras_layer(self):
+        inputs = tf.keras.layers.Input((4,))
+        x = NVTXMark(message='Input ready', payload=1)(inputs)
+        model = tf.keras.models.Model(inputs=inputs, outputs=x)
+
+        features = np.random.rand(2, 4).astype(np.float32)
+        np.testing.assert_allclose(model.predict(features), features)
+
+        config = model.layers[1].get_config()
+        self.assertEqual(config['message'], 'Input ready')
+        self.assertEqual(config['payload'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
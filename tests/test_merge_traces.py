@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from nvtx.plugins.tf.tools.merge_traces import SYNC_MARKER_PREFIX
+from nvtx.plugins.tf.tools.merge_traces import merge_traces
+
+
+class MergeTracesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def create_trace(self, name, events):
+        path = os.path.join(self.tmp_dir, name + ".sqlite")
+        conn = sqlite3.connect(path)
+        conn.execute(
+            "CREATE TABLE StringIds (id INTEGER PRIMARY KEY, value TEXT)")
+        conn.execute(
+            "CREATE TABLE NVTX_EVENTS (`start` INTEGER, `end` INTEGER, "
+            "eventType INTEGER, `text` TEXT, textId INTEGER, "
+            "globalTid INTEGER, domainId INTEGER)")
+        for idx, (start, end, text) in enumerate(events):
+            conn.execute("INSERT INTO StringIds VALUES (?, ?)", (idx, text))
+            conn.execute(
+                "INSERT INTO NVTX_EVENTS VALUES (?, ?, ?, NULL, ?, 1, 0)",
+                (start, end, 34 if end is None else 59, idx))
+        conn.commit()
+        conn.close()
+        return path
+
+    def test_clocks_are_aligned(self):
+        rank0 = self.create_trace("rank0", [
+            (100, 200, "batch 0"),
+            (210, None, SYNC_MARKER_PREFIX + "1"),
+            (220, 300, "batch 1"),
+            (310, None, SYNC_MARKER_PREFIX + "2"),
+        ])
+        # Same timeline shifted by 1000ns
+        rank1 = self.create_trace("rank1", [
+            (1100, 1200, "batch 0"),
+            (1210, None, SYNC_MARKER_PREFIX + "1"),
+            (1220, 1300, "batch 1"),
+            (1310, None, SYNC_MARKER_PREFIX + "2"),
+        ])
+        output = os.path.join(self.tmp_dir, "merged.sqlite")
+
+        self.assertEqual(merge_traces([rank0, rank1], output), [0, -1000])
+
+        conn = sqlite3.connect(output)
+        events = conn.execute(
+            "SELECT `start`, rank, `text` FROM NVTX_EVENTS").fetchall()
+        conn.close()
+
+        self.assertEqual(len(events), 8)
+        self.assertEqual([e[0] for e in events],
+                         sorted(e[0] for e in events))
+        self.assertEqual(events[:2], [(100, 0, "batch 0"),
+                                      (100, 1, "batch 0")])
+
+    def test_unaligned_trace(self):
+        rank0 = self.create_trace("rank0", [
+            (10, None, SYNC_MARKER_PREFIX + "1")])
+        rank1 = self.create_trace("rank1", [(5, 20, "batch 0")])
+        output = os.path.join(self.tmp_dir, "merged.sqlite")
+
+        self.assertEqual(merge_traces([rank0, rank1], output), [0, None])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import tensorflow as tf
+
+import nvtx.plugins.tf as nvtx_tf
+from nvtx.plugins.tf import naming
+
+
+class NamingTestCase(unittest.TestCase):
+
+    def test_scope_message(self):
+        with tf.Graph().as_default():
+            self.assertEqual(naming.scope_message(default='Default'),
+                             'Default')
+            with tf.name_scope('encoder'), tf.name_scope('block_1'):
+                self.assertEqual(naming.scope_message(), 'encoder/block_1')
+                self.assertEqual(naming.scope_message(skip_last=True),
+                                 'encoder')
+                self.assertEqual(naming.scope_domain(), 'encoder')
+
+    def test_function_message(self):
+        class Model(object):
+            def train_step(self):
+                pass
+
+        self.assertTrue(
+            naming.function_message(Model.train_step).endswith(
+                'Model.train_step'))
+
+    def test_intern_name(self):
+        name = ''.join(['dense', '_1'])
+        self.assertIs(naming.intern_name(name), naming.intern_name('dense_1'))
+
+    def test_shared_message_constants(self):
+        @tf.function
+        def func(x):
+            for _ in range(3):
+                with tf.name_scope('block'):
+                    x, nvtx_context = nvtx_tf.ops.start(x, message='Block',
+                                                        domain_name='Test')
+                    x = nvtx_tf.ops.end(x * 2., nvtx_context)
+            return x
+
+        self.assertEqual(func(tf.constant(1.)).numpy(), 8.)
+        graph = func.get_concrete_function(
+            tf.TensorSpec((), tf.float32)).graph
+        strings = [op.get_attr('value').string_val[0]
+                   for op in graph.get_operations()
+                   if op.type == 'Const' and
+                   op.get_attr('dtype') == tf.string]
+        # 'Block' and 'Test' are shared by the start and end ops
+        self.assertEqual(sorted(strings), [b'Block', b'Test'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+import warnings
+
+from unittest import mock
+
+from nvtx.plugins.tf import native
+
+
+class NativeFallbackTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._libnvtx = native._libnvtx
+        native._libnvtx = None
+
+    def tearDown(self):
+        native._libnvtx = self._libnvtx
+
+    def test_missing_library(self):
+        with mock.patch.object(native, '_load_op_library',
+                               return_value=None), \
+                mock.patch('ctypes.cdll.LoadLibrary',
+                           side_effect=OSError('libnvToolsExt.so not found')):
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                libnvtx = native.get_libnvtx()
+                self.assertIs(native.get_libnvtx(), libnvtx)
+
+        # Warned once
+        self.assertEqual(len(caught), 1)
+        self.assertIsInstance(libnvtx, native.NullNvtxLibrary)
+        self.assertFalse(libnvtx.available)
+
+        domain_handle = libnvtx.domain('Domain')
+        range_id = libnvtx.start('range', domain_handle, payload=1)
+        libnvtx.end(range_id, domain_handle)
+        libnvtx.push('range', domain_handle)
+        libnvtx.pop(domain_handle)
+        libnvtx.mark('mark', domain_handle)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import numpy as np
+import tensorflow as tf
+
+import nvtx.plugins.tf as nvtx_tf
+from nvtx.plugins.tf.keras.layers import NVTXWrap
+
+
+def _features():
+    return {
+        'ids': tf.constant([[1, 2], [3, 4]], dtype=tf.int64),
+        'dense': (tf.constant([[1., 2.], [3., 4.]]),
+                  tf.constant([0.5, 1.5], dtype=tf.float64)),
+        'mask': tf.constant([True, False]),
+    }
+
+
+class NestedInputsTestCase(unittest.TestCase):
+
+    def test_start_end(self):
+        @tf.function
+        def func(features):
+            features, nvtx_context = nvtx_tf.ops.start(
+                features, message='Features', domain_name='Test')
+            features['dense'] = (features['dense'][0] * 2.,
+                                 features['dense'][1])
+            return nvtx_tf.ops.end(features, nvtx_context)
+
+        features = _features()
+        outputs = func(features)
+        self.assertEqual(set(outputs), set(features))
+        np.testing.assert_array_equal(outputs['ids'].numpy(),
+                                      features['ids'].numpy())
+        np.testing.assert_allclose(outputs['dense'][0].numpy(),
+                                   [[2., 4.], [6., 8.]])
+        self.assertEqual(outputs['dense'][1].dtype, tf.float64)
+        self.assertEqual(outputs['mask'].dtype, tf.bool)
+
+        # The leaves are forwarded, not stacked
+        op_types = [op.type for op in
+                    func.get_concrete_function(features).graph.get_operations()]
+        self.assertEqual(op_types.count('NvtxStart'), 1)
+        self.assertEqual(op_types.count('NvtxEnd'), 1)
+        self.assertEqual(op_types.count('IdentityN'), 1)
+        self.assertNotIn('Pack', op_types)
+
+    def test_gradient(self):
+        @tf.function
+        def func(x, y):
+            with tf.GradientTape() as tape:
+                tape.watch([x, y])
+                (x, y), nvtx_context = nvtx_tf.ops.start(
+                    [x, y], message='Mul', domain_name='Test')
+                z = nvtx_tf.ops.end(x * y, nvtx_context)
+            return tape.gradient(z, [x, y])
+
+        grad_x, grad_y = func(tf.constant([1., 2.]), tf.constant([3., 4.]))
+        np.testing.assert_allclose(grad_x.numpy(), [3., 4.])
+        np.testing.assert_allclose(grad_y.numpy(), [1., 2.])
+
+    def test_push_pop_and_mark(self):
+        @tf.function
+        def func(features):
+            features, nvtx_context = nvtx_tf.ops.push(features,
+                                                      message='Features')
+            features = nvtx_tf.ops.mark(features, message='Ready')
+            return nvtx_tf.ops.pop(features, nvtx_context)
+
+        features = _features()
+        outputs = func(features)
+        tf.nest.assert_same_structure(outputs, features)
+
+    def test_no_tensor(self):
+        with self.assertRaises(ValueError):
+            nvtx_tf.ops.start({'a': 1}, message='Constant')
+
+    def test_wrap_dict_inputs(self):
+        inputs = {
+            'a': tf.keras.layers.Input((4,), name='a'),
+            'b': tf.keras.layers.Input((2,), name='b'),
+        }
+        concat = tf.keras.layers.Lambda(
+            lambda features: tf.concat([features['a'], features['b']], -1))
+        outputs = NVTXWrap(concat, message='Concat')(inputs)
+        model = tf.keras.models.Model(inputs=inputs, outputs=outputs)
+
+        features = {'a': np.ones((2, 4), np.float32),
+                    'b': np.zeros((2, 2), np.float32)}
+        np.testing.assert_allclose(model.predict(features),
+                                   [[1.] * 4 + [0.] * 2] * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import collections
+import unittest
+
+import numpy as np
+import tensorflow as tf
+
+import nvtx.plugins.tf as nvtx_tf
+from nvtx.plugins.tf import flight_recorder
+
+
+class PushPopTestCase(unittest.TestCase):
+
+    def test_identity_and_gradient(self):
+        @tf.function
+        def func(x):
+            with tf.GradientTape() as tape:
+                tape.watch(x)
+                y, nvtx_context = nvtx_tf.ops.push(x, message='Square',
+                                                   domain_name='Test')
+                y = y * y
+                y = nvtx_tf.ops.pop(y, nvtx_context)
+            return y, tape.gradient(y, x)
+
+        x = tf.constant([1., 2., 3.])
+        y, grad = func(x)
+        np.testing.assert_allclose(y.numpy(), [1., 4., 9.])
+        np.testing.assert_allclose(grad.numpy(), [2., 4., 6.])
+
+        op_types = [op.type for op in
+                    func.get_concrete_function(x).graph.get_operations()]
+        self.assertEqual(op_types.count('NvtxPush'), 2)
+        self.assertEqual(op_types.count('NvtxPop'), 2)
+        self.assertNotIn('NvtxStart', op_types)
+
+    def test_list_inputs(self):
+        x, y = tf.ones((2,)), tf.zeros((2,))
+        (x, y), nvtx_context = nvtx_tf.ops.push([x, y], message='Add')
+        z = nvtx_tf.ops.pop(x + y, nvtx_context)
+        np.testing.assert_allclose(z.numpy(), [1., 1.])
+
+    def test_inter_op_threads(self):
+        flight_recorder.enable(signal_number=None, dump_on_exception=False)
+        self.addCleanup(flight_recorder.disable)
+
+        with tf.Graph().as_default():
+            x = tf.compat.v1.placeholder(tf.float32, (64, 64))
+            branches = []
+            for i in range(8):
+                y, nvtx_context = nvtx_tf.ops.push(x, message='Branch %d' % i,
+                                                   domain_name='Test')
+                y = tf.matmul(y, y)
+                branches.append(nvtx_tf.ops.pop(y, nvtx_context))
+            total = tf.add_n(branches)
+
+            config = tf.compat.v1.ConfigProto(
+                inter_op_parallelism_threads=4)
+            features = np.ones((64, 64), dtype=np.float32)
+            with tf.compat.v1.Session(config=config) as sess:
+                for _ in range(20):
+                    np.testing.assert_allclose(
+                        sess.run(total, feed_dict={x: features}),
+                        8 * features.dot(features))
+
+        # A range is popped by the thread which pushed it, even when the pop
+        # op runs on another thread
+        pushed = collections.Counter()
+        popped = collections.Counter()
+        for event in flight_recorder.events():
+            if event['cat'] != 'Test':
+                continue
+            if event['ph'] == 'B':
+                pushed[event['tid']] += 1
+            elif event['ph'] == 'E':
+                popped[event['tid']] += 1
+        self.assertEqual(sum(pushed.values()), 8 * 20)
+        for thread_id, num_popped in popped.items():
+            self.assertLessEqual(num_popped, pushed[thread_id])
+
+
+if __name__ == '__main__':
+    unittest.main()
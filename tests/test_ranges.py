@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from unittest import mock
+
+import numpy as np
+import tensorflow as tf
+
+import nvtx.plugins.tf as nvtx_tf
+from nvtx.plugins.tf import flight_recorder
+from nvtx.plugins.tf import ranges
+
+
+class _LibNVTX(object):
+    """Records the ranges pushed and popped by nvtx.plugins.tf.range."""
+
+    available = True
+
+    def __init__(self):
+        self.events = []
+
+    def domain(self, domain_name):
+        return domain_name or None
+
+    def push(self, message, domain_handle=None, payload=None):
+        self.events.append(('push', message, domain_handle))
+
+    def pop(self, domain_handle=None):
+        self.events.append(('pop', domain_handle))
+
+
+def _control_output_types(func, *args):
+    graph = func.get_concrete_function(*args).graph
+    return [op.type for op in graph.control_outputs]
+
+
+def _recorded_events(phase, name):
+    return [event for event in flight_recorder.events()
+            if event['ph'] == phase and event['name'] == name]
+
+
+class RangesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.libnvtx = _LibNVTX()
+        patcher = mock.patch.object(ranges, 'get_libnvtx',
+                                    return_value=self.libnvtx)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_eager_context_manager(self):
+        with nvtx_tf.range('Outer', domain_name='Test'):
+            with nvtx_tf.range('Inner'):
+                pass
+
+        self.assertEqual(self.libnvtx.events, [
+            ('push', 'Outer', 'Test'),
+            ('push', 'Inner', None),
+            ('pop', None),
+            ('pop', 'Test'),
+        ])
+
+    def test_eager_decorator(self):
+        @nvtx_tf.range(domain_name='Test')
+        def train_step(x):
+            return x + 1.
+
+        self.assertEqual(train_step(tf.constant(1.)).numpy(), 2.)
+        self.assertEqual(len(self.libnvtx.events), 2)
+        self.assertTrue(self.libnvtx.events[0][1].endswith('train_step'))
+
+        with self.assertRaises(TypeError):
+            train_step('not a tensor')
+        self.assertEqual(self.libnvtx.events[-1], ('pop', 'Test'))
+
+    def test_disabled(self):
+        with nvtx_tf.range('Step', enabled=False):
+            pass
+        self.assertEqual(self.libnvtx.events, [])
+
+    def test_tf_function_context_manager(self):
+        @tf.function
+        def func(x):
+            with nvtx_tf.range('Step', domain_name='Test'):
+                y = x * 2.
+            return y + 1.
+
+        self.assertEqual(func(tf.constant(1.)).numpy(), 3.)
+        op_types = [op.type for op in func.get_concrete_function(
+            tf.TensorSpec((), tf.float32)).graph.get_operations()]
+        self.assertEqual(op_types.count('NvtxStart'), 1)
+        self.assertEqual(op_types.count('NvtxEnd'), 1)
+        # Graph ranges do not use the NVTX C API
+        self.assertEqual(self.libnvtx.events, [])
+
+    def test_tf_function_runs_kernels(self):
+        flight_recorder.enable(signal_number=None, dump_on_exception=False)
+        self.addCleanup(flight_recorder.disable)
+
+        @tf.function
+        def func(x):
+            # The inputs of the range ops are constants, they must not be
+            # folded or merged
+            with nvtx_tf.range('Step', domain_name='Test'):
+                pass
+            with nvtx_tf.range('Step', domain_name='Test'):
+                pass
+            return x + 1.
+
+        func(tf.constant(1.))
+        func(tf.constant(2.))
+        self.assertEqual(len(_recorded_events('b', 'Step')), 4)
+        self.assertEqual(len(_recorded_events('e', 'Step')), 4)
+
+    def test_tf_function_decorator(self):
+        @tf.function
+        @nvtx_tf.range('Dense')
+        def dense(x, w):
+            return tf.matmul(x, w)
+
+        x = np.random.rand(2, 3).astype(np.float32)
+        w = np.random.rand(3, 4).astype(np.float32)
+        np.testing.assert_allclose(dense(x, w).numpy(), x.dot(w), rtol=1e-5)
+
+    def test_pruning_guard(self):
+        variable = tf.Variable(0.)
+
+        @tf.function
+        def assign():
+            with nvtx_tf.range('Assign'):
+                variable.assign_add(1.)
+
+        @tf.function
+        @nvtx_tf.range('Assign')
+        def decorated():
+            variable.assign_add(1.)
+
+        assign()
+        decorated()
+        self.assertEqual(variable.numpy(), 2.)
+
+        # Nothing consumes the closing ops, they are kept as control outputs
+        self.assertIn('NvtxEnd', _control_output_types(assign))
+        self.assertIn('NvtxEnd', _control_output_types(decorated))
+
+    def test_tf1_graph(self):
+        with tf.Graph().as_default():
+            x = tf.compat.v1.placeholder(tf.float32, ())
+            with self.assertRaises(RuntimeError):
+                with nvtx_tf.range('Step'):
+                    pass
+
+            @nvtx_tf.range('Step')
+            def no_outputs():
+                tf.identity(x)
+
+            with self.assertRaises(RuntimeError):
+                no_outputs()
+
+            @nvtx_tf.range('Step')
+            def double(x):
+                return x * 2.
+
+            y = double(x)
+            with tf.compat.v1.Session() as sess:
+                self.assertEqual(sess.run(y, feed_dict={x: 2.}), 4.)
+
+
+if __name__ == '__main__':
+    unittest.main()
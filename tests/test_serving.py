@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+import pytest
+
+from tests.base import CustomTestCase
+
+
+class ServingTestCase(CustomTestCase):
+
+    JOB_NAME = "serving_example"
+
+    def test_execution(self):
+        self.assertTrue(self.run_command(ServingTestCase.JOB_NAME))
+
+    @pytest.mark.run(after='test_execution')
+    def test_report_is_compliant(self):
+
+        with self.open_db(ServingTestCase.JOB_NAME) as conn:
+
+            request_count, _ = self.query_report(conn, range_name="Request")
+            self.assertGreater(request_count, 500)
+
+            for range_name in ["Dense 1", "Dense 2"]:
+                count, _ = self.query_report(conn, range_name=range_name)
+                self.assertGreaterEqual(count, request_count - 1)
+                self.assertLessEqual(count, request_count + 1)
+
+            # Every range of a request carries the request id
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT count(DISTINCT `int64Value`) FROM NVTX_EVENTS "
+                "WHERE `text` IN ('Request', 'Dense 1', 'Dense 2') "
+                "AND `start` > 0"
+            )
+            distinct_ids = cur.fetchone()[0]
+            self.assertGreaterEqual(distinct_ids, request_count - 1)
+            self.assertLessEqual(distinct_ids, request_count + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
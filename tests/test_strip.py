@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import numpy as np
+import tensorflow as tf
+
+from tensorflow.keras.layers import Dense
+from tensorflow.keras.layers import Input
+from tensorflow.keras.models import Model
+
+import nvtx.plugins.tf as nvtx_tf
+from nvtx.plugins.tf.keras.layers import NVTXEnd
+from nvtx.plugins.tf.keras.layers import NVTXStart
+from nvtx.plugins.tf.keras.layers import NVTXWrap
+from nvtx.plugins.tf.strip import NVTX_OP_TYPES
+from nvtx.plugins.tf.strip import strip_graph_def
+from nvtx.plugins.tf.strip import strip_model
+
+
+def _nvtx_nodes(graph_def):
+    nodes = [node for node in graph_def.node if node.op in NVTX_OP_TYPES]
+    for function_def in graph_def.library.function:
+        nodes += [node for node in function_def.node_def
+                  if node.op in NVTX_OP_TYPES]
+    return nodes
+
+
+class StripTestCase(unittest.TestCase):
+
+    def test_strip_graph_def(self):
+        graph = tf.Graph()
+        with graph.as_default():
+            x = tf.compat.v1.placeholder(tf.float32, (None, 4), name='x')
+            y = tf.compat.v1.placeholder(tf.float32, (None, 4), name='y')
+            (x, y), nvtx_context = nvtx_tf.ops.start([x, y], message='Add',
+                                                     trainable=True)
+            z = tf.nn.relu(x + y)
+            z = nvtx_tf.ops.end(z, nvtx_context)
+            tf.identity(z, name='z')
+
+        stripped = strip_graph_def(graph.as_graph_def())
+        self.assertTrue(_nvtx_nodes(graph.as_graph_def()))
+        self.assertFalse(_nvtx_nodes(stripped))
+        self.assertFalse([node for node in stripped.node
+                          if node.op in ('Pack', 'Unpack')])
+
+        inputs = np.random.rand(2, 4).astype(np.float32)
+        with tf.Graph().as_default() as stripped_graph:
+            tf.compat.v1.import_graph_def(stripped, name='')
+            with tf.compat.v1.Session(graph=stripped_graph) as sess:
+                output = sess.run('z:0', {'x:0': inputs, 'y:0': inputs})
+        np.testing.assert_allclose(output, np.maximum(inputs * 2, 0))
+
+    def test_strip_model(self):
+        inputs = Input((8,))
+        x, marker_id, domain_id = NVTXStart(message='Dense',
+                                            trainable=True)(inputs)
+        x = Dense(4)(x)
+        x = NVTXEnd()([x, marker_id, domain_id])
+        model = Model(inputs=inputs, outputs=x)
+
+        stripped = strip_model(model)
+
+        features = np.random.rand(2, 8).astype(np.float32)
+        np.testing.assert_allclose(model.predict(features),
+                                   stripped.predict(features), rtol=1e-6)
+
+        concrete = tf.function(stripped).get_concrete_function(
+            tf.TensorSpec((None, 8), tf.float32))
+        self.assertFalse(_nvtx_nodes(concrete.graph.as_graph_def()))
+
+    def test_strip_wrapped_model(self):
+        inputs = Input((8,))
+        x = NVTXWrap(Dense(4), message='Dense')(inputs)
+        model = Model(inputs=inputs, outputs=x)
+
+        stripped = strip_model(model)
+
+        features = np.random.rand(2, 8).astype(np.float32)
+        np.testing.assert_allclose(model.predict(features),
+                                   stripped.predict(features), rtol=1e-6)
+
+        concrete = tf.function(stripped).get_concrete_function(
+            tf.TensorSpec((None, 8), tf.float32))
+        self.assertFalse(_nvtx_nodes(concrete.graph.as_graph_def()))
+
+
+if __name__ == '__main__':
+    unittest.main()
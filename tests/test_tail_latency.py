@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from unittest import mock
+
+from nvtx.plugins.tf.keras.callbacks import NVTXCallback
+from nvtx.plugins.tf.tail_latency import TailLatencyCapture
+
+
+class _Capture(object):
+    """Records the calls made by NVTXCallback."""
+
+    def __init__(self):
+        self.enabled = False
+
+    def step_begin(self):
+        self.enabled = True
+
+    def step_end(self, step, num_steps=1):
+        return False
+
+    def disable(self):
+        self.enabled = False
+
+
+class TailLatencyCaptureTestCase(unittest.TestCase):
+
+    def test_requires_threshold(self):
+        with self.assertRaises(ValueError):
+            TailLatencyCapture()
+        with self.assertRaises(ValueError):
+            TailLatencyCapture(percentile=100)
+
+    def test_threshold(self):
+        capture = TailLatencyCapture(threshold_ms=10.)
+        self.assertFalse(capture.is_slow(10.))
+        self.assertTrue(capture.is_slow(10.5))
+
+    def test_percentile(self):
+        capture = TailLatencyCapture(percentile=90, window=100, min_steps=10)
+        for latency_ms in range(1, 10):
+            capture._add_latency(float(latency_ms))
+        # Not enough steps yet
+        self.assertIsNone(capture.threshold())
+
+        capture._add_latency(10.)
+        self.assertEqual(capture.threshold(), 10.)
+        self.assertTrue(capture.is_slow(11.))
+        self.assertFalse(capture.is_slow(9.))
+
+    def test_window(self):
+        capture = TailLatencyCapture(percentile=50, window=4, min_steps=1)
+        for latency_ms in [100., 100., 1., 2., 3., 4.]:
+            capture._add_latency(latency_ms)
+        # The slow steps left the window
+        self.assertEqual(sorted(capture._latencies), [1., 2., 3., 4.])
+        self.assertEqual(capture.threshold(), 3.)
+
+    def test_threshold_or_percentile(self):
+        capture = TailLatencyCapture(threshold_ms=50., percentile=50,
+                                     min_steps=1)
+        capture._add_latency(100.)
+        self.assertEqual(capture.threshold(), 50.)
+
+    def test_callback_evaluation(self):
+        capture = _Capture()
+        callback = NVTXCallback(tail_latency=capture, step_counters=False)
+        # The batch hooks return early without libnvToolsExt
+        callback.libnvtx = mock.Mock(available=True)
+        callback.on_train_batch_begin(0)
+        callback.on_train_batch_end(0)
+        self.assertTrue(capture.enabled)
+
+        # The ranges of evaluation and prediction are not buffered
+        callback.on_test_begin()
+        self.assertFalse(capture.enabled)
+        callback.on_train_batch_begin(1)
+        self.assertTrue(capture.enabled)
+        callback.on_predict_begin()
+        self.assertFalse(capture.enabled)
+
+
+if __name__ == '__main__':
+    unittest.main()
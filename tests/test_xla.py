@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import numpy as np
+import tensorflow as tf
+
+import nvtx.plugins.tf as nvtx_tf
+from nvtx.plugins.tf.keras.layers import NVTXEnd
+from nvtx.plugins.tf.keras.layers import NVTXStart
+
+
+def _dense(x, w):
+    x, nvtx_context = nvtx_tf.ops.start(x, message='Dense',
+                                        domain_name='Forward',
+                                        grad_message='Dense grad',
+                                        grad_domain_name='Gradient')
+    y = tf.matmul(x, w)
+    return nvtx_tf.ops.end(y, nvtx_context)
+
+
+def _loss_and_grads(x, w):
+    with tf.GradientTape() as tape:
+        tape.watch([x, w])
+        loss = tf.reduce_sum(_dense(x, w))
+    return loss, tape.gradient(loss, [x, w])
+
+
+class XlaTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.x = tf.constant(np.random.rand(4, 3).astype(np.float32))
+        self.w = tf.constant(np.random.rand(3, 2).astype(np.float32))
+
+    def test_outputs_and_gradients(self):
+        compiled = tf.function(_loss_and_grads, jit_compile=True)
+        with tf.device('/CPU:0'):
+            loss, (grad_x, grad_w) = compiled(self.x, self.w)
+
+        expected = np.sum(self.x.numpy().dot(self.w.numpy()))
+        np.testing.assert_allclose(loss.numpy(), expected, rtol=1e-5)
+        np.testing.assert_allclose(
+            grad_x.numpy(), np.ones((4, 2)).dot(self.w.numpy().T), rtol=1e-5)
+        np.testing.assert_allclose(
+            grad_w.numpy(), self.x.numpy().T.dot(np.ones((4, 2))), rtol=1e-5)
+
+    def test_v2_ops(self):
+        compiled = tf.function(_dense, jit_compile=True)
+        graph = compiled.get_concrete_function(self.x, self.w).graph
+        ops_by_type = {}
+        for op in graph.get_operations():
+            ops_by_type.setdefault(op.type, []).append(op)
+
+        self.assertIn('NvtxStartV2', ops_by_type)
+        self.assertIn('NvtxEndV2', ops_by_type)
+        self.assertNotIn('NvtxStart', ops_by_type)
+        self.assertEqual(
+            ops_by_type['NvtxEndV2'][0].get_attr('domain_name'), b'Forward')
+
+    def test_layers(self):
+        inputs = tf.keras.layers.Input((3,))
+        x, marker_id, domain_id = NVTXStart(message='Dense',
+                                            domain_name='Forward')(inputs)
+        x = tf.keras.layers.Dense(2)(x)
+        x = NVTXEnd()([x, marker_id, domain_id])
+        model = tf.keras.models.Model(inputs=inputs, outputs=x)
+
+        compiled = tf.function(model, jit_compile=True)
+        with tf.device('/CPU:0'):
+            np.testing.assert_allclose(compiled(self.x).numpy(),
+                                       model(self.x).numpy(), rtol=1e-5)
+
+        # The domain of NVTXEnd is taken from NVTXStart
+        graph = compiled.get_concrete_function(self.x).graph
+        end_ops = [op for op in graph.get_operations()
+                   if op.type == 'NvtxEndV2']
+        self.assertEqual(end_ops[0].get_attr('domain_name'), b'Forward')
+
+
+if __name__ == '__main__':
+    unittest.main()